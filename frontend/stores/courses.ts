@@ -1,4 +1,4 @@
-import type { Course } from '~/types'
+import type { Course, Paginated } from '~/types'
 import axios from 'axios'
 
 export const useCoursesStore = defineStore('courses', () => {
@@ -8,12 +8,23 @@ export const useCoursesStore = defineStore('courses', () => {
 	const currentTopics = ref([])
 	const currentTasks = ref([])
 
+	// весь список, а не первая страница: первая — с params, дальше по ссылкам next
+	const getAllPages = <T>(url: string, params?: Record<string, unknown>) =>
+		fetchAllPages<T>(async next => {
+			const { data } = await axios.get<Paginated<T>>(next ?? url, {
+				params: next ? undefined : params,
+				headers: {
+					Authorization: `Bearer ${useAuthStore().accessToken}`,
+				},
+			})
+			return data
+		})
+
 	const getCourses = async () => {
 		try {
-			const { data } = await axios.get(
+			courses.value = await getAllPages<Course>(
 				'https://uchebnyicourse-k-n.ru/api/courses/'
 			)
-			courses.value = data as Course[]
 		} catch (error) {
 			console.error('Error fetching courses:', error)
 		}
@@ -21,17 +32,10 @@ export const useCoursesStore = defineStore('courses', () => {
 
 	const getMyCourses = async (id?: number) => {
 		try {
-			const { data } = await axios.get(
+			myCourses.value = await getAllPages<Course>(
 				'https://uchebnyicourse-k-n.ru/api/courses/',
-
-				{
-					params: { id: id },
-					headers: {
-						Authorization: `Bearer ${useAuthStore().accessToken}`,
-					},
-				}
+				{ id: id }
 			)
-			myCourses.value = data as Course[]
 		} catch (error) {
 			console.error('Error fetching my courses:', error)
 		}
@@ -56,16 +60,11 @@ export const useCoursesStore = defineStore('courses', () => {
 
 	const getTopics = async (id?: number) => {
 		try {
-			const { data } = await axios.get(
-				`https://uchebnyicourse-k-n.ru/api/topics/`,
-
-				{
-					headers: {
-						Authorization: `Bearer ${useAuthStore().accessToken}`,
-					},
-				}
+			// темы только этого курса, крупными страницами
+			currentTopics.value = await getAllPages<any>(
+				'https://uchebnyicourse-k-n.ru/api/topics/',
+				{ course: id, page_size: 500 }
 			)
-			currentTopics.value = data
 		} catch (error) {
 			console.error('Error fetching my courses:', error)
 		}
@@ -73,16 +72,10 @@ export const useCoursesStore = defineStore('courses', () => {
 
 	const getTasks = async (id?: number) => {
 		try {
-			const { data } = await axios.get(
-				`https://uchebnyicourse-k-n.ru/api/tasks/`,
-
-				{
-					headers: {
-						Authorization: `Bearer ${useAuthStore().accessToken}`,
-					},
-				}
+			currentTasks.value = await getAllPages<any>(
+				'https://uchebnyicourse-k-n.ru/api/tasks/',
+				{ topic__course: id, page_size: 500 }
 			)
-			currentTasks.value = data
 		} catch (error) {
 			console.error('Error fetching my courses:', error)
 		}
@@ -20,3 +20,10 @@ export interface Course {
 	date: string
 	info_file: string
 }
+
+// ответ списков API: курсорная пагинация
+export interface Paginated<T> {
+	next: string | null
+	previous: string | null
+	results: T[]
+}
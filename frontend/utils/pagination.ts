@@ -0,0 +1,16 @@
+import type { Paginated } from '~/types'
+
+// Собирает все страницы курсорной пагинации: fetchPage(null) — первая
+// страница с параметрами запроса, дальше — готовые ссылки next с сервера
+export async function fetchAllPages<T>(
+	fetchPage: (next: string | null) => Promise<Paginated<T>>
+): Promise<T[]> {
+	const results: T[] = []
+	let next: string | null = null
+	do {
+		const page: Paginated<T> = await fetchPage(next)
+		results.push(...page.results)
+		next = page.next
+	} while (next)
+	return results
+}
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from core.models import CustomUser, Course, Task, TeacherSchedule, Submission, DefenseQueue, Topic, Appointment
+from core.models import CustomUser, Course, Task, TeacherSchedule, Submission, DefenseQueue, Topic, Appointment, ScheduleRecurrence, UploadSession
 
 admin.site.register(CustomUser)
 admin.site.register(Course)
@@ -10,3 +10,5 @@ admin.site.register(Submission)
 admin.site.register(DefenseQueue)
 admin.site.register(Topic)
 admin.site.register(Appointment)
+admin.site.register(ScheduleRecurrence)
+admin.site.register(UploadSession)
@@ -0,0 +1,230 @@
+"""
+Очередь допуска для записи в окна в момент их открытия.
+
+Запросы на запись не идут в БД каждый своей транзакцией: они попадают в очередь,
+единственный писатель забирает их пачками, раздаёт позиции в порядке прихода
+и создаёт Appointment одним bulk_create на пачку. Результат по каждому
+запросу (тикету) кладётся в кэш Django (APPOINTMENT_ADMISSION_CACHE),
+так что его можно забрать синхронно (signup ждёт до APPOINTMENT_ADMISSION_WAIT
+секунд) или позже по тикету.
+
+Бэкенд задаётся APPOINTMENT_ADMISSION_BACKEND (путь к классу). Здесь есть
+LocalAdmissionQueue — очередь и писатель внутри процесса; внешняя очередь
+(Redis и т.п.) реализует тот же интерфейс submit()/wait().
+"""
+import logging
+import queue
+import threading
+import uuid
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .models import Appointment, TeacherSchedule
+
+logger = logging.getLogger(__name__)
+
+TICKET_TTL = 60 * 60
+
+
+def _ticket_key(ticket_id):
+    return f"admission:ticket:{ticket_id}"
+
+
+def _cache():
+    return caches[getattr(settings, 'APPOINTMENT_ADMISSION_CACHE', 'default')]
+
+
+def get_ticket(ticket_id):
+    return _cache().get(_ticket_key(ticket_id))
+
+
+def _set_ticket(ticket_id, data):
+    _cache().set(_ticket_key(ticket_id), data, TICKET_TTL)
+
+
+class _Conflict(Exception):
+    """Счётчик окна изменился параллельно (другой процесс) — пачку нужно повторить."""
+
+
+class LocalAdmissionQueue:
+
+    def __init__(self, batch_size=None, batch_wait=None):
+        self.batch_size = batch_size or getattr(settings, 'APPOINTMENT_ADMISSION_BATCH', 200)
+        self.batch_wait = batch_wait or getattr(settings, 'APPOINTMENT_ADMISSION_BATCH_WAIT', 0.05)
+        self._queue = queue.Queue()
+        self._events = {}
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def submit(self, schedule_id, student_id):
+        ticket_id = str(uuid.uuid4())
+        _set_ticket(ticket_id, {
+            'status': 'queued', 'schedule': schedule_id, 'student': student_id,
+        })
+        with self._lock:
+            self._events[ticket_id] = threading.Event()
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(
+                    target=self._run, name='admission-writer', daemon=True
+                )
+                self._writer.start()
+        self._queue.put((ticket_id, schedule_id, student_id))
+        return ticket_id
+
+    def wait(self, ticket_id, timeout):
+        event = self._events.get(ticket_id)
+        if event is not None:
+            event.wait(timeout)
+        return get_ticket(ticket_id)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # добираем пачку: всё, что пришло за batch_wait, но не больше batch_size
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get(timeout=self.batch_wait))
+            except queue.Empty:
+                pass
+            try:
+                self._process(batch)
+            except Exception:
+                logger.exception("Ошибка при обработке пачки записей")
+                for ticket_id, schedule_id, student_id in batch:
+                    self._finish(ticket_id, {
+                        'status': 'error', 'schedule': schedule_id, 'student': student_id,
+                        'detail': "Не удалось обработать запись, попробуйте ещё раз.",
+                    })
+            finally:
+                close_old_connections()
+
+    def _finish(self, ticket_id, data):
+        _set_ticket(ticket_id, data)
+        event = self._events.pop(ticket_id, None)
+        if event is not None:
+            event.set()
+
+    def _process(self, batch, attempts=3):
+        for attempt in range(attempts):
+            try:
+                results = self._admit(batch)
+                break
+            except _Conflict:
+                if attempt == attempts - 1:
+                    raise
+        for ticket_id, data in results.items():
+            self._finish(ticket_id, data)
+
+    def _admit(self, batch):
+        by_schedule = OrderedDict()
+        for item in batch:
+            by_schedule.setdefault(item[1], []).append(item)
+        results = {}
+
+        with transaction.atomic():
+            schedules = TeacherSchedule.objects.select_for_update().in_bulk(list(by_schedule))
+            existing = dict(
+                ((a.schedule_id, a.student_id), a)
+                for a in Appointment.objects.filter(
+                    schedule_id__in=list(by_schedule),
+                    student_id__in={item[2] for item in batch},
+                )
+            )
+            to_create = []
+            for schedule_id, items in by_schedule.items():
+                sched = schedules.get(schedule_id)
+                free = sched.capacity - sched.booked if sched else 0
+                for ticket_id, _, student_id in items:
+                    base = {'schedule': schedule_id, 'student': student_id}
+                    key = (schedule_id, student_id)
+                    if sched is None:
+                        results[ticket_id] = {**base, 'status': 'error', 'detail': "Окно не найдено."}
+                    elif key in existing:
+                        # повторная заявка — отдаём уже выданное место
+                        results[ticket_id] = {**base, 'status': 'duplicate', 'appointment': existing[key]}
+                    elif free <= 0:
+                        results[ticket_id] = {**base, 'status': 'full', 'detail': "В этом окне нет свободных мест."}
+                    else:
+                        free -= 1
+                        appt = Appointment(schedule_id=schedule_id, student_id=student_id)
+                        existing[key] = appt
+                        to_create.append((ticket_id, appt))
+                        results[ticket_id] = {**base, 'status': 'booked', 'appointment': appt}
+
+            for ticket_id in self._insert(to_create):
+                data = results[ticket_id]
+                # студента записали мимо очереди, пока пачка собиралась
+                appt = Appointment.objects.filter(
+                    schedule_id=data['schedule'], student_id=data['student']
+                ).first()
+                if appt is not None:
+                    data.update(status='duplicate', appointment=appt)
+                else:
+                    del data['appointment']
+                    data.update(status='error', detail="Не удалось обработать запись, попробуйте ещё раз.")
+
+            # позиции раздаются в порядке прихода в очередь, по реально созданным записям
+            added = Counter()
+            for ticket_id, appt in to_create:
+                data = results[ticket_id]
+                if data['status'] == 'booked':
+                    added[appt.schedule_id] += 1
+                    data['position'] = schedules[appt.schedule_id].booked + added[appt.schedule_id]
+            for schedule_id, count in added.items():
+                # bulk_create минует Appointment.save(), поэтому счётчик двигаем сами;
+                # условие на старое значение ловит параллельного писателя
+                updated = TeacherSchedule.objects.filter(
+                    pk=schedule_id, booked=schedules[schedule_id].booked
+                ).update(booked=F('booked') + count)
+                if not updated:
+                    raise _Conflict()
+
+        for data in results.values():
+            appt = data.pop('appointment', None)
+            if appt is not None:
+                data['appointment'] = appt.pk
+                if 'position' not in data:
+                    data['position'] = appt.get_position()
+        return results
+
+    def _insert(self, to_create):
+        """
+        Создаёт записи пачки одним bulk_create. Если какая-то пара (окно, студент)
+        уже занята, пачка не пропадает: записи вставляются по одной, и
+        возвращаются тикеты только конфликтных.
+        """
+        try:
+            with transaction.atomic():
+                Appointment.objects.bulk_create([appt for _, appt in to_create])
+            return []
+        except IntegrityError:
+            pass
+        conflicts = []
+        for ticket_id, appt in to_create:
+            try:
+                with transaction.atomic():
+                    Appointment.objects.bulk_create([appt])
+            except IntegrityError:
+                conflicts.append(ticket_id)
+        return conflicts
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_admission_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                backend = getattr(
+                    settings, 'APPOINTMENT_ADMISSION_BACKEND', 'core.admission.LocalAdmissionQueue'
+                )
+                _queue = import_string(backend)()
+    return _queue
@@ -1,6 +1,14 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        # каталог загрузок (FILE_UPLOAD_TEMP_DIR) должен существовать до проверок Django
+        os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
\ No newline at end of file
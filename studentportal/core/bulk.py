@@ -0,0 +1,168 @@
+"""
+Массовый импорт окон расписания и задач.
+
+Строки приходят JSON-списком или файлом (CSV, XLSX при установленном openpyxl),
+валидируются за один проход, права проверяются один раз на тему,
+пересечения окон ищутся разверткой по времени, а сохранение — один
+bulk_create в транзакции. Ошибки строк — исключение RowErrors: вьюха отдаёт
+их 400-м ответом {"rows": [{"row": 1, "errors": [...]}]}, номер строки — число.
+"""
+import csv
+import datetime
+import io
+
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from .models import TeacherSchedule, Task, Topic
+
+
+class RowErrors(Exception):
+    """Ошибки по строкам импорта: [{'row': номер с 1, 'errors': ...}]."""
+
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.rows = rows
+
+
+class ScheduleRowSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TeacherSchedule
+        fields = ('title', 'date', 'start_time', 'end_time')
+
+    def validate(self, attrs):
+        if attrs['start_time'] >= attrs['end_time']:
+            raise serializers.ValidationError("Время начала должно быть раньше времени окончания.")
+        return attrs
+
+
+class TaskRowSerializer(serializers.ModelSerializer):
+    # id темы без запроса на каждую строку — темы грузятся одним запросом
+    topic = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = Task
+        fields = ('topic', 'title', 'description', 'min_words', 'expected_defense_time')
+
+
+def _normalize_cell(value):
+    # XLSX отдаёт даты как datetime, а DateField ждёт date
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if value is None:
+        return ''
+    return value
+
+
+def read_rows(request):
+    """
+    Строки импорта: JSON-список в теле запроса или файл в поле file
+    (CSV с заголовком либо XLSX с заголовком в первой строке).
+    """
+    rows = _read_rows(request)
+    if not rows:
+        raise ValidationError({'detail': "Нет строк для импорта."})
+    return rows
+
+
+def _read_rows(request):
+    upload = request.FILES.get('file')
+    if upload is None:
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError({'detail': "Ожидается список строк или файл в поле file."})
+        return rows
+
+    name = upload.name.lower()
+    if name.endswith('.csv'):
+        text = io.TextIOWrapper(upload.file, encoding='utf-8-sig')
+        return [dict(row) for row in csv.DictReader(text)]
+    if name.endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValidationError({'file': "Импорт XLSX недоступен: не установлен openpyxl."})
+        sheet = load_workbook(upload, read_only=True, data_only=True).active
+        values = sheet.iter_rows(values_only=True)
+        header = [str(h).strip() for h in next(values, ())]
+        return [
+            {key: _normalize_cell(cell) for key, cell in zip(header, row)}
+            for row in values if any(cell is not None for cell in row)
+        ]
+    raise ValidationError({'file': "Поддерживаются файлы .csv и .xlsx."})
+
+
+def _validate_rows(serializer_class, rows):
+    serializer = serializer_class(data=rows, many=True)
+    if not serializer.is_valid():
+        raise RowErrors([
+            {'row': i, 'errors': errors}
+            for i, errors in enumerate(serializer.errors, start=1) if errors
+        ])
+    return serializer.validated_data
+
+
+def find_overlaps(windows):
+    """
+    Развёртка по времени: windows — список (key, date, start, end) в любом порядке. Возвращает пары ключей пересекающихся окон одного дня.
+    """
+    overlaps = []
+    ordered = sorted(windows, key=lambda w: (w[1], w[2], w[3]))
+    current_day, last_key, last_end = None, None, None
+    for key, day, start, end in ordered:
+        if day == current_day and start < last_end:
+            overlaps.append((last_key, key))
+        if day != current_day or end > last_end:
+            current_day, last_key, last_end = day, key, end
+    return overlaps
+
+
+def import_schedules(teacher, rows):
+    data = _validate_rows(ScheduleRowSerializer, rows)
+
+    windows = [
+        (i, row['date'], row['start_time'], row['end_time'])
+        for i, row in enumerate(data, start=1)
+    ]
+    # уже существующие окна преподавателя на эти даты — одним запросом
+    existing = TeacherSchedule.objects.filter(
+        teacher=teacher, date__in={row['date'] for row in data}
+    ).values_list('id', 'date', 'start_time', 'end_time')
+    windows += [(f"id={pk}", day, start, end) for pk, day, start, end in existing]
+
+    errors = []
+    for a, b in find_overlaps(windows):
+        # два существующих окна между собой импорт не касаются
+        if not (isinstance(a, int) or isinstance(b, int)):
+            continue
+        row, other = (a, b) if isinstance(a, int) else (b, a)
+        other = f"с окном {other}" if isinstance(other, str) else f"со строкой {other}"
+        errors.append({'row': row, 'errors': [f"Окно пересекается {other}."]})
+    if errors:
+        raise RowErrors(sorted(errors, key=lambda e: e['row']))
+
+    objs = [TeacherSchedule(teacher=teacher, **row) for row in data]
+    for obj in objs:
+        # bulk_create минует save(), вместимость считаем сами
+        obj.capacity = obj.compute_capacity()
+    with transaction.atomic():
+        return TeacherSchedule.objects.bulk_create(objs)
+
+
+def import_tasks(teacher, rows):
+    data = _validate_rows(TaskRowSerializer, rows)
+
+    topic_ids = {row['topic'] for row in data}
+    topics = Topic.objects.select_related('course').in_bulk(topic_ids)
+    missing = topic_ids - set(topics)
+    if missing:
+        raise ValidationError({'topic': f"Темы не найдены: {sorted(missing)}."})
+    # права — один раз на тему, а не на каждую строку
+    foreign = sorted(pk for pk, topic in topics.items() if topic.course.teacher_id != teacher.pk)
+    if foreign:
+        raise PermissionDenied(f"Нельзя создавать задачи не в своих темах: {foreign}.")
+
+    objs = [Task(**{**row, 'topic': topics[row['topic']]}) for row in data]
+    with transaction.atomic():
+        return Task.objects.bulk_create(objs)
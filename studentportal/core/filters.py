@@ -1,7 +1,7 @@
 # yourapp/filters.py
 import django_filters
 from django.contrib.auth import get_user_model
-from .models import Course
+from .models import Course, TeacherSchedule
 
 User = get_user_model()
 
@@ -18,3 +18,19 @@ class CourseFilter(django_filters.FilterSet):
         model = Course
         # сюда попадут все фильтры по полям модели + наши доп. min_hours/max_hours
         fields = ['title', 'description', 'hours', 'teacher']
+
+
+class TeacherScheduleFilter(django_filters.FilterSet):
+    has_free_slots = django_filters.BooleanFilter(method='filter_has_free_slots')
+    date_from = django_filters.DateFilter(field_name='date', lookup_expr='gte')
+    date_to = django_filters.DateFilter(field_name='date', lookup_expr='lte')
+
+    class Meta:
+        model = TeacherSchedule
+        fields = ['teacher', 'date']
+
+    def filter_has_free_slots(self, queryset, name, value):
+        # available_slots — аннотация из TeacherSchedule.objects.with_capacity()
+        if value:
+            return queryset.filter(available_slots__gt=0)
+        return queryset.filter(available_slots__lte=0)
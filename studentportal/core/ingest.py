@@ -0,0 +1,96 @@
+"""
+Однопроходный разбор загруженных документов.
+
+.docx читается потоково прямо из zip-архива (word/document.xml через iterparse),
+без построения полного DOM python-docx и без временной копии файла:
+достаточно пути или любого seekable файлового объекта (UploadedFile Django).
+Результат — ParsedDocument, который принимают check_file_basic и проверка
+документов в neurocheck (подсчёт слов, ключевые слова, промпты LLM).
+"""
+import re
+import zipfile
+from functools import cached_property
+from xml.etree import ElementTree
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_P, _T, _TAB, _BR, _CR = _W + 'p', _W + 't', _W + 'tab', _W + 'br', _W + 'cr'
+
+TOKEN_RE = re.compile(r'\b\w+\b')
+
+
+class DocumentError(ValueError):
+    """Файл не удаётся прочитать как документ."""
+
+
+def _paragraph_text(elem):
+    parts = []
+    for node in elem.iter():
+        if node.tag == _T:
+            parts.append(node.text or '')
+        elif node.tag == _TAB:
+            parts.append('\t')
+        elif node.tag in (_BR, _CR):
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def iter_docx_paragraphs(source):
+    """Потоково отдаёт текст абзацев .docx (путь или файловый объект)."""
+    try:
+        with zipfile.ZipFile(source) as zf, zf.open('word/document.xml') as xml:
+            for _, elem in ElementTree.iterparse(xml, events=('end',)):
+                if elem.tag == _P:
+                    yield _paragraph_text(elem)
+                    # разобранный абзац больше не нужен — освобождаем память
+                    elem.clear()
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        raise DocumentError(f"Не удалось прочитать .docx: {e}")
+
+
+def iter_text_paragraphs(source, encoding='utf-8'):
+    """Абзацы обычного текстового файла (путь или файловый объект)."""
+    if isinstance(source, str):
+        with open(source, 'r', encoding=encoding, errors='ignore') as f:
+            yield from f
+    else:
+        for line in source:
+            yield line.decode(encoding, errors='ignore') if isinstance(line, bytes) else line
+
+
+class ParsedDocument:
+    """
+    Документ, разобранный один раз: непустые абзацы и число слов.
+    Склеенный текст и поток токенов строятся лениво по запросу.
+    """
+
+    def __init__(self, paragraphs):
+        self.paragraphs = []
+        self.word_count = 0
+        for para in paragraphs:
+            para = para.strip()
+            if para:
+                self.paragraphs.append(para)
+                self.word_count += len(para.split())
+
+    @cached_property
+    def text(self):
+        return "\n".join(self.paragraphs)
+
+    def iter_tokens(self):
+        """Токены в нижнем регистре, абзац за абзацем."""
+        for para in self.paragraphs:
+            yield from TOKEN_RE.findall(para.lower())
+
+
+def parse_document(source, name=None):
+    """
+    Разбирает .docx или текстовый файл в ParsedDocument.
+    source — путь или файловый объект; тип определяется по расширению name/пути.
+    """
+    if isinstance(source, ParsedDocument):
+        return source
+    if name is None:
+        name = source if isinstance(source, str) else getattr(source, 'name', '') or ''
+    if str(name).lower().endswith('.docx'):
+        return ParsedDocument(iter_docx_paragraphs(source))
+    return ParsedDocument(iter_text_paragraphs(source))
@@ -0,0 +1,183 @@
+"""
+Проверка планов горячих запросов на PostgreSQL.
+
+    python manage.py check_query_plans [--scale 1] [--keep]
+
+В транзакции наполняет базу объёмом, близким к семестру вуза (преподаватели,
+курсы, задачи, сдачи, окна, записи, защиты), делает ANALYZE, выполняет
+основные запросы вьюсетов и поиска слота так же, как это делает API,
+и для каждого SQL смотрит EXPLAIN: Seq Scan по большим таблицам считается
+регрессией. В конце транзакция откатывается (без --keep).
+Код выхода 1, если хоть один план деградировал.
+"""
+import datetime
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.models import (
+    Appointment, Course, CustomUser, DefenseQueue, Submission, Task,
+    TeacherSchedule, Topic,
+)
+from core.services import find_nearest_defense_slot
+
+# маленькие таблицы планировщик вправе читать целиком —
+# Seq Scan считается регрессией только начиная с такого числа строк
+MIN_ROWS = 10000
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _large_tables():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND reltuples >= %s",
+            [MIN_ROWS],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _seq_scans(plan, tables):
+    """Имена больших таблиц, которые план читает Seq Scan-ом."""
+    found = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') in tables:
+            found.append(node['Relation Name'])
+        stack.extend(node.get('Plans', []))
+    return found
+
+
+class Command(BaseCommand):
+    help = "Наполняет БД в транзакции и проверяет, что горячие запросы идут по индексам."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1, help="Множитель объёма данных")
+        parser.add_argument('--keep', action='store_true', help="Не откатывать данные")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Планы запросов проверяются только на PostgreSQL.")
+        random.seed(0)
+        failures = []
+        try:
+            with transaction.atomic():
+                users = self.seed(options['scale'])
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                self.large_tables = _large_tables()
+                for name, user, run in self.cases(*users):
+                    failures += self.check_case(name, user, run)
+                if not options['keep']:
+                    raise _Rollback()
+        except _Rollback:
+            pass
+        if failures:
+            raise CommandError(f"Деградировавших планов: {len(failures)}")
+        self.stdout.write(self.style.SUCCESS("Все планы используют индексы."))
+
+    def seed(self, scale):
+        teachers = CustomUser.objects.bulk_create([
+            CustomUser(username=f'plan_teacher_{i}', role='teacher') for i in range(200 * scale)
+        ])
+        students = CustomUser.objects.bulk_create([
+            CustomUser(username=f'plan_student_{i}', role='student') for i in range(5000 * scale)
+        ])
+        courses = Course.objects.bulk_create([
+            Course(teacher=teachers[i % len(teachers)], title=f'Курс {i}') for i in range(600 * scale)
+        ])
+        topics = Topic.objects.bulk_create([
+            Topic(course=courses[i % len(courses)], title=f'Тема {i}', order=i) for i in range(3000 * scale)
+        ])
+        tasks = Task.objects.bulk_create([
+            Task(topic=topics[i % len(topics)], title=f'Задача {i}') for i in range(6000 * scale)
+        ], batch_size=2000)
+        course_by_id = {course.pk: course for course in courses}
+        submissions = []
+        for _ in range(60000 * scale):
+            task = random.choice(tasks)
+            course = course_by_id[task.topic.course_id]
+            submissions.append(Submission(
+                task=task, student=random.choice(students),
+                # bulk_create минует save(), владельца проставляем сами
+                course=course, teacher_id=course.teacher_id,
+                status=random.choice(('waiting_for_check', 'approved', 'approved', 'rejected')),
+            ))
+        submissions = Submission.objects.bulk_create(submissions, batch_size=5000)
+
+        today = datetime.date.today()
+        schedules = TeacherSchedule.objects.bulk_create([
+            TeacherSchedule(
+                teacher=teachers[i % len(teachers)],
+                date=today + datetime.timedelta(days=i // len(teachers) // 4 - 10),
+                start_time=datetime.time(9 + i % 4 * 2), end_time=datetime.time(10 + i % 4 * 2),
+                capacity=4,
+            )
+            for i in range(20000 * scale)
+        ], batch_size=5000)
+        appointments = []
+        for sched in schedules:
+            for student in random.sample(students, 3):
+                appointments.append(Appointment(schedule=sched, student=student))
+        Appointment.objects.bulk_create(appointments, batch_size=5000)
+        DefenseQueue.objects.bulk_create([
+            DefenseQueue(
+                submission=sub, teacher=teachers[i % len(teachers)],
+                defense_date=today + datetime.timedelta(days=i % 120 - 60),
+                defense_time=datetime.time(9 + i % 8),
+            )
+            for i, sub in enumerate(submissions[:20000 * scale])
+        ], batch_size=5000)
+        return teachers[0], students[0], schedules[0]
+
+    def cases(self, teacher, student, schedule):
+        def get(path, **params):
+            def run(client):
+                response = client.get(path, params)
+                assert response.status_code == 200, (path, response.status_code)
+            return run
+
+        return [
+            ('submissions: студент', student, get('/api/submissions/')),
+            ('submissions: студент ?task=', student, get('/api/submissions/', task=Submission.objects.filter(student=student).values('task_id')[:1].get()['task_id'])),
+            ('submissions: преподаватель', teacher, get('/api/submissions/')),
+            ('submissions: входящие', teacher, get('/api/submissions/inbox/')),
+            ('teacher-schedules: преподаватель', teacher, get('/api/teacher-schedules/')),
+            ('teacher-schedules: окно', teacher, get(f'/api/teacher-schedules/{schedule.pk}/appointments/')),
+            ('appointments: студент', student, get('/api/appointments/')),
+            ('appointments: преподаватель', teacher, get('/api/appointments/')),
+            ('defense: преподаватель', teacher, get('/api/defense/')),
+            ('courses: мои', teacher, get('/api/courses/me/')),
+            ('поиск слота', teacher, lambda client: find_nearest_defense_slot(teacher, 30)),
+        ]
+
+    def check_case(self, name, user, run):
+        client = APIClient()
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as captured:
+            run(client)
+        failures = []
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = _seq_scans(plan[0]['Plan'], self.large_tables)
+            if scans:
+                failures.append((name, scans, sql))
+                self.stdout.write(self.style.ERROR(f"✗ {name}: Seq Scan по {', '.join(sorted(set(scans)))}"))
+                self.stdout.write(f"    {sql[:300]}")
+        if not failures:
+            self.stdout.write(self.style.SUCCESS(f"✓ {name} ({len(captured.captured_queries)} запр.)"))
+        return failures
@@ -0,0 +1,51 @@
+"""
+Уборка брошенных загрузок.
+
+    python manage.py cleanup_uploads [--hours 24]
+
+Удаляет UploadSession, которые не менялись дольше UPLOAD_SESSION_TTL_HOURS
+(вместе с .part), и файлы в UPLOAD_TEMP_DIR такого же возраста без сессии —
+например, временные файлы multipart-загрузок процесса, который упал.
+Запускать по cron.
+"""
+import datetime
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = "Удаляет незавершённые и неприкреплённые загрузки старше TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=float,
+            default=getattr(settings, 'UPLOAD_SESSION_TTL_HOURS', 24),
+            help="Возраст, после которого загрузка считается брошенной",
+        )
+
+    def handle(self, *args, **options):
+        ttl = datetime.timedelta(hours=options['hours'])
+        sessions = 0
+        # по одной: post_delete удаляет .part каждой сессии
+        for session in UploadSession.objects.filter(updated_at__lt=timezone.now() - ttl).iterator():
+            session.delete()
+            sessions += 1
+
+        files = 0
+        directory = settings.UPLOAD_TEMP_DIR
+        if os.path.isdir(directory):
+            live = {f'{pk}.part' for pk in UploadSession.objects.values_list('pk', flat=True)}
+            deadline = time.time() - ttl.total_seconds()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name not in live and entry.stat().st_mtime < deadline:
+                        os.remove(entry.path)
+                        files += 1
+
+        self.stdout.write(f"Удалено загрузок: {sessions}, осиротевших файлов: {files}.")
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:00
+
+from datetime import date, datetime
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_capacity(apps, schema_editor):
+    TeacherSchedule = apps.get_model('core', 'TeacherSchedule')
+    schedules = TeacherSchedule.objects.annotate(cnt=Count('appointments'))
+    for sched in schedules.iterator():
+        start_dt = datetime.combine(date.today(), sched.start_time)
+        end_dt = datetime.combine(date.today(), sched.end_time)
+        sched.capacity = max(int((end_dt - start_dt).total_seconds() // 60 // 15), 0)
+        sched.booked = sched.cnt
+        sched.save(update_fields=['capacity', 'booked'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_appointment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacherschedule',
+            name='booked',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='teacherschedule',
+            name='capacity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_capacity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 02:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_teacherschedule_capacity_booked'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleRecurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('weekdays', models.JSONField(default=list)),
+                ('interval', models.PositiveSmallIntegerField(default=1, help_text='Каждые N недель')),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('start_date', models.DateField()),
+                ('until', models.DateField(blank=True, null=True)),
+                ('exdates', models.JSONField(blank=True, default=list)),
+                ('teacher', models.ForeignKey(limit_choices_to={'role': 'teacher'}, on_delete=django.db.models.deletion.CASCADE, related_name='recurrences', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['start_date', 'start_time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='teacherschedule',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='core.schedulerecurrence'),
+        ),
+        migrations.AddConstraint(
+            model_name='teacherschedule',
+            constraint=models.UniqueConstraint(fields=('recurrence', 'date'), name='unique_recurrence_occurrence'),
+        ),
+    ]
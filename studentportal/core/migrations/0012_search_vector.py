@@ -0,0 +1,75 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:00
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# таблицы с полнотекстовым поиском: title — вес A, description — вес B
+SEARCH_TABLES = ('core_course', 'core_topic', 'core_task')
+
+
+def create_search_triggers(apps, schema_editor):
+    # только PostgreSQL: на SQLite поиск идёт через icontains (core/search.py)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(f"""
+            CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector :=
+                    setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+                    setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B');
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql;
+        """)
+        schema_editor.execute(f"""
+            CREATE TRIGGER {table}_search_vector_trigger
+            BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update();
+        """)
+        # заполняем вектор у существующих строк
+        schema_editor.execute(f"UPDATE {table} SET title = title;")
+        schema_editor.execute(
+            f"CREATE INDEX {table}_search_vector_gin ON {table} USING gin (search_vector);"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX {table}_title_trgm ON {table} USING gin (title gin_trgm_ops);"
+        )
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_title_trgm;")
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_search_vector_gin;")
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table};")
+        schema_editor.execute(f"DROP FUNCTION IF EXISTS {table}_search_vector_update();")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_schedulerecurrence'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='course',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-date', '-id'], name='course_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_course_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['schedule', 'created_at', 'id'], name='appointment_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='defensequeue',
+            index=models.Index(fields=['teacher', 'defense_date', 'defense_time'], name='defense_teacher_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['task', 'student'], name='submission_task_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['student', '-id'], name='submission_student_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teacherschedule',
+            index=models.Index(fields=['teacher', 'date', 'start_time'], name='schedule_teacher_date_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_owner(apps, schema_editor):
+    # одним UPDATE, без обхода сдач в Python
+    Submission = apps.get_model('core', 'Submission')
+    Task = apps.get_model('core', 'Task')
+    task = Task.objects.filter(pk=OuterRef('task_id'))
+    Submission.objects.update(
+        course_id=Subquery(task.values('topic__course_id')[:1]),
+        teacher_id=Subquery(task.values('topic__course__teacher_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='course',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to='core.course'),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='teacher',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inbox_submissions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_owner, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['teacher', '-id'], name='submission_teacher_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('status', 'waiting_for_check')), fields=['teacher', 'created_at', 'id'], name='submission_inbox_idx'),
+        ),
+    ]
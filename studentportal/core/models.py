@@ -1,6 +1,13 @@
-from django.db import models
+import os
+import uuid
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import RowNumber
 from django.contrib.auth.models import AbstractUser
-from datetime import datetime, date
+from django.contrib.postgres.search import SearchVectorField
+from datetime import datetime, date, timedelta
 from django.core.exceptions import ValidationError
 
 class StudentGroup(models.Model):
@@ -54,6 +61,14 @@ class Course(models.Model):
         related_name='courses'
     )
     date = models.DateField(auto_now_add=True, blank=True)
+    # заполняется триггером в PostgreSQL (см. core/search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # список курсов и курсорная пагинация: ORDER BY date DESC, id DESC
+            models.Index(fields=['-date', '-id'], name='course_date_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -78,6 +93,7 @@ class Topic(models.Model):
         default=0,
         help_text="Порядок темы внутри курса"
     )
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['order']
@@ -98,12 +114,118 @@ class Task(models.Model):
     min_words = models.PositiveIntegerField(default=100)
     expected_defense_time = models.PositiveIntegerField(default=10)
     file = models.FileField(upload_to='tasks/')
+    search_vector = SearchVectorField(null=True, editable=False)
+
     class Meta:
         ordering = ['id']  # или по своему полю order, если добавите
 
     def __str__(self):
         return f"{self.title} | {self.topic.title}"
 
+SLOT_MINUTES = 15  # длительность одного места в окне записи
+
+
+class DurationMinutes(models.Func):
+    """
+    Целое число минут между двумя TimeField: DurationMinutes('end_time', 'start_time').
+    """
+    arity = 2
+    output_field = models.IntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # PostgreSQL: time - time = interval
+        return super().as_sql(
+            compiler, connection,
+            template='FLOOR(EXTRACT(EPOCH FROM (%(expressions)s)) / 60)::integer',
+            arg_joiner=' - ',
+            **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite хранит время строкой 'HH:MM:SS', strftime('%s') переводит её в секунды
+        end, start = self.get_source_expressions()
+        end_sql, end_params = compiler.compile(end)
+        start_sql, start_params = compiler.compile(start)
+        return (
+            f"CAST((strftime('%%s', {end_sql}) - strftime('%%s', {start_sql})) / 60 AS integer)",
+            (*end_params, *start_params),
+        )
+
+
+class TeacherScheduleQuerySet(models.QuerySet):
+
+    def with_capacity(self):
+        """
+        Аннотирует окна duration_minutes, max_slots, appointments_count
+        и available_slots, чтобы по ним можно было фильтровать и сортировать в БД.
+        """
+        return self.annotate(
+            duration_minutes=DurationMinutes('end_time', 'start_time'),
+            max_slots=F('capacity'),
+            appointments_count=F('booked'),
+            available_slots=F('capacity') - F('booked'),
+        )
+
+
+class ScheduleRecurrence(models.Model):
+    """
+    Повторяющееся окно (в духе RRULE FREQ=WEEKLY): дни недели, шаг в неделях,
+    период действия и даты-исключения. Вхождения не хранятся — они
+    разворачиваются по запросу, а TeacherSchedule создаётся только
+    при первой записи студента на конкретную дату.
+    """
+    teacher = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        limit_choices_to={'role': 'teacher'},
+        related_name='recurrences'
+    )
+    title = models.CharField(max_length=255, blank=True)
+    # дни недели: 0 — понедельник, ..., 6 — воскресенье
+    weekdays = models.JSONField(default=list)
+    interval = models.PositiveSmallIntegerField(default=1, help_text="Каждые N недель")
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    start_date = models.DateField()
+    until = models.DateField(null=True, blank=True)
+    # отменённые даты в формате YYYY-MM-DD
+    exdates = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        ordering = ['start_date', 'start_time']
+
+    def __str__(self):
+        return f"Recurrence {self.teacher.username} from {self.start_date}"
+
+    def occurs_on(self, day):
+        if day < self.start_date or (self.until and day > self.until):
+            return False
+        if day.weekday() not in self.weekdays or day.isoformat() in self.exdates:
+            return False
+        # недели считаются от понедельника недели start_date
+        anchor = self.start_date - timedelta(days=self.start_date.weekday())
+        return ((day - anchor).days // 7) % max(self.interval, 1) == 0
+
+    def iter_occurrences(self, start, end):
+        """Лениво отдаёт даты вхождений в диапазоне [start, end]."""
+        day = max(start, self.start_date)
+        if self.until:
+            end = min(end, self.until)
+        while day <= end:
+            if self.occurs_on(day):
+                yield day
+            day += timedelta(days=1)
+
+    def to_schedule(self, day):
+        """Несохранённое окно на дату — для материализации и расчёта вместимости."""
+        schedule = TeacherSchedule(
+            teacher_id=self.teacher_id, recurrence=self, title=self.title,
+            date=day, start_time=self.start_time, end_time=self.end_time,
+        )
+        schedule.capacity = schedule.compute_capacity()
+        return schedule
+
+
 class TeacherSchedule(models.Model):
     teacher = models.ForeignKey(
         CustomUser,
@@ -116,9 +238,58 @@ class TeacherSchedule(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
 
+    # денормализованная вместимость: booked меняется только условным UPDATE
+    # (см. Appointment.save) и сигналом удаления записи
+    capacity = models.PositiveIntegerField(default=0, editable=False)
+    booked = models.PositiveIntegerField(default=0, editable=False)
+
+    # окно, созданное из повторяющегося шаблона при первой записи
+    recurrence = models.ForeignKey(
+        ScheduleRecurrence,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='occurrences'
+    )
+
+    objects = TeacherScheduleQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # окна преподавателя по порядку: список, поиск слота
+            models.Index(fields=['teacher', 'date', 'start_time'], name='schedule_teacher_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recurrence', 'date'], name='unique_recurrence_occurrence'
+            ),
+        ]
+
     def __str__(self):
         return f"Schedule {self.teacher.username} on {self.date}"
 
+    def compute_capacity(self):
+        start_dt = datetime.combine(date.today(), self.start_time)
+        end_dt = datetime.combine(date.today(), self.end_time)
+        total_min = (end_dt - start_dt).total_seconds() / 60
+        return max(int(total_min // SLOT_MINUTES), 0)
+
+    def save(self, *args, **kwargs):
+        self.capacity = self.compute_capacity()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = {*update_fields, 'capacity'}
+        elif not self._state.adding:
+            update_fields = {f.name for f in self._meta.concrete_fields if not f.primary_key}
+        if not self._state.adding:
+            # booked в памяти мог устареть: его меняют только условные UPDATE
+            # записей, полное сохранение окна не должно их перетирать
+            update_fields.discard('booked')
+        if update_fields is not None:
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
 
 class Submission(models.Model):
     task = models.ForeignKey(
@@ -136,9 +307,91 @@ class Submission(models.Model):
     ai_check_passed = models.BooleanField(default=False)
     status = models.CharField(max_length=20, default='pending')  
 
+    # денормализация task.topic.course(.teacher): входящие преподавателя без
+    # тройного JOIN. Заполняется в save(), при переносе задачи/темы/курса
+    # поддерживается сигналами (core/signals.py)
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name='submissions',
+        null=True, editable=False
+    )
+    teacher = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='inbox_submissions',
+        null=True, editable=False
+    )
+
+    class Meta:
+        indexes = [
+            # ?task= в списке сдач и проверка «уже сдавал ли студент»
+            models.Index(fields=['task', 'student'], name='submission_task_student_idx'),
+            # сдачи студента, новые первыми (курсорная пагинация по -id)
+            models.Index(fields=['student', '-id'], name='submission_student_id_idx'),
+            # все сдачи преподавателя, новые первыми
+            models.Index(fields=['teacher', '-id'], name='submission_teacher_id_idx'),
+            # входящие: только ждущие проверки, старые первыми
+            models.Index(
+                fields=['teacher', 'created_at', 'id'],
+                name='submission_inbox_idx',
+                condition=Q(status='waiting_for_check'),
+            ),
+        ]
+
     def __str__(self):
         return f"Submission #{self.id} by {self.student.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._synced_task_id = instance.__dict__.get('task_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # пересчитываем владельца только для новой сдачи или при смене задачи
+        update_fields = kwargs.get('update_fields')
+        task_changed = self.task_id != getattr(self, '_synced_task_id', None)
+        if task_changed and (update_fields is None or 'task' in update_fields):
+            self.sync_owner()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'course', 'teacher'}
+        super().save(*args, **kwargs)
+        self._synced_task_id = self.task_id
+
+    def sync_owner(self):
+        """Подтягивает course/teacher от задачи (один запрос)."""
+        self.course_id, self.teacher_id = Task.objects.filter(pk=self.task_id).values_list(
+            'topic__course_id', 'topic__course__teacher_id'
+        ).get()
+
+
+class UploadSession(models.Model):
+    """
+    Докачиваемая загрузка файла кусками (см. core.uploads). Пока файл ни к чему
+    не прикреплён, байты лежат в UPLOAD_TEMP_DIR/<id>.part.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name='upload_sessions'
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    # checksum — SHA-256 от клиента (необязательно), sha256 — посчитанный у нас
+    checksum = models.CharField(max_length=64, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    completed = models.BooleanField(default=False)
+    # пока кусок пишется, сессия занята до этого времени (см. append_chunk)
+    locked_until = models.DateTimeField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.received}/{self.size})"
+
+    @property
+    def part_path(self):
+        return os.path.join(settings.UPLOAD_TEMP_DIR, f'{self.pk}.part')
+
 
 class DefenseQueue(models.Model):
     submission = models.OneToOneField(
@@ -155,11 +408,50 @@ class DefenseQueue(models.Model):
 
     is_occupied = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # занятые защиты преподавателя по времени (find_nearest_defense_slot)
+            models.Index(
+                fields=['teacher', 'defense_date', 'defense_time'], name='defense_teacher_date_idx'
+            ),
+        ]
+
     def __str__(self):
         return f"Defense slot for submission {self.submission.id}"
 
 
 
+class AppointmentQuerySet(models.QuerySet):
+
+    def with_position(self, partial=False):
+        """
+        Добавляет каждой записи поле position — номер в очереди своего окна.
+        По умолчанию считается одним ROW_NUMBER() OVER (PARTITION BY schedule_id
+        ORDER BY created_at), поэтому в выборке должны быть все записи окна.
+        Если выборка урезана (например, только записи одного студента),
+        передайте partial=True — позиция посчитается подзапросом по всей таблице.
+        """
+        if not partial:
+            return self.annotate(position=Window(
+                expression=RowNumber(),
+                partition_by=[F('schedule_id')],
+                order_by=[F('created_at').asc(), F('id').asc()],
+            ))
+        ahead = (
+            Appointment.objects
+            .filter(schedule_id=OuterRef('schedule_id'))
+            .filter(
+                Q(created_at__lt=OuterRef('created_at'))
+                | Q(created_at=OuterRef('created_at'), id__lte=OuterRef('id'))
+            )
+            .order_by()
+            .values('schedule_id')
+            .annotate(cnt=Count('id'))
+            .values('cnt')
+        )
+        return self.annotate(position=Subquery(ahead, output_field=models.IntegerField()))
+
+
 class Appointment(models.Model):
     """
     Запись студента на конкретное расписание.
@@ -178,21 +470,44 @@ class Appointment(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = AppointmentQuerySet.as_manager()
+
     class Meta:
         # нельзя дважды записаться на одно и то же окно
         unique_together = ('schedule', 'student')
         ordering = ['created_at']
+        indexes = [
+            # позиция в очереди: ROW_NUMBER() по окну и подсчёт «кто раньше»
+            models.Index(fields=['schedule', 'created_at', 'id'], name='appointment_queue_idx'),
+        ]
 
     def clean(self):
-        # проверяем, что не превысили число слотов
-        slot_minutes = 15
-        start_dt = datetime.combine(date.today(), self.schedule.start_time)
-        end_dt = datetime.combine(date.today(), self.schedule.end_time)
-        total_min = (end_dt - start_dt).total_seconds() / 60
-        max_slots = int(total_min // slot_minutes)
-        if self.schedule.appointments.count() >= max_slots:
+        # проверяем, что не превысили число слотов (для форм; окончательно
+        # место резервируется атомарно в save())
+        if self._state.adding and self.schedule.booked >= self.schedule.capacity:
             raise ValidationError("В этом окне нет свободных мест.")
 
+    def get_position(self):
+        """Позиция в очереди для записи без аннотации (один COUNT-запрос)."""
+        position = getattr(self, 'position', None)
+        if position is None:
+            position = Appointment.objects.filter(
+                Q(created_at__lt=self.created_at)
+                | Q(created_at=self.created_at, id__lte=self.id),
+                schedule_id=self.schedule_id,
+            ).count()
+        return position
+
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        # резервируем место и создаём запись в одной транзакции:
+        # UPDATE ... SET booked = booked + 1 WHERE booked < capacity
+        # не даёт переполнить окно даже при параллельных записях
+        with transaction.atomic():
+            reserved = TeacherSchedule.objects.filter(
+                pk=self.schedule_id, booked__lt=F('capacity')
+            ).update(booked=F('booked') + 1)
+            if not reserved:
+                raise ValidationError("В этом окне нет свободных мест.")
+            super().save(*args, **kwargs)
\ No newline at end of file
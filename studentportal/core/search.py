@@ -0,0 +1,100 @@
+"""
+Полнотекстовый поиск по курсам, темам и задачам.
+
+На PostgreSQL — колонка search_vector (tsvector, конфигурация russian, заголовок
+с весом A, описание — B), которую поддерживает триггер (см. миграцию 0012),
+GIN-индекс по ней и триграммный индекс по title для опечаток и неполных слов.
+Результаты сортируются по релевантности (search_rank).
+На остальных БД (SQLite в локальной разработке) — icontains по словам запроса
+с простым ранжированием: совпадение в заголовке весит больше, чем в описании.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from rest_framework.filters import BaseFilterBackend
+
+SEARCH_CONFIG = 'russian'
+# вклад триграммной похожести заголовка в ранг (опечатки, неполные слова)
+TRIGRAM_WEIGHT = 0.5
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def _terms(query):
+    return _WORD_RE.findall(query.lower())[:10]
+
+
+def _tsquery(terms):
+    # все слова обязательны, последнее — как префикс: запрос набирается на лету
+    return ' & '.join(terms[:-1] + [terms[-1] + ':*'])
+
+
+def search(queryset, query, fields=('title', 'description')):
+    """
+    Фильтрует queryset по запросу и аннотирует search_rank (больше — релевантнее).
+    fields используются только в fallback без PostgreSQL.
+    """
+    terms = _terms(query)
+    if not terms:
+        return queryset
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(queryset, query, terms)
+    return _search_fallback(queryset, terms, fields)
+
+
+def _search_postgresql(queryset, query, terms):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+
+    ts_query = SearchQuery(_tsquery(terms), config=SEARCH_CONFIG, search_type='raw')
+    return (
+        queryset
+        # оба условия обслуживаются GIN-индексами (BitmapOr), без seq scan
+        .filter(Q(search_vector=ts_query) | Q(title__trigram_similar=query))
+        .annotate(search_rank=(
+            SearchRank(F('search_vector'), ts_query)
+            + TrigramSimilarity('title', query) * TRIGRAM_WEIGHT
+        ))
+    )
+
+
+def _search_fallback(queryset, terms, fields):
+    title = fields[0]
+    condition = Q()
+    rank = Value(0)
+    for term in terms:
+        # LIKE в SQLite не приводит к одному регистру кириллицу —
+        # проверяем и слово с заглавной буквы (начало заголовка)
+        variants = {term, term.capitalize()}
+        term_q = Q()
+        title_q = Q()
+        for variant in variants:
+            title_q |= Q(**{f'{title}__icontains': variant})
+            for field in fields:
+                term_q |= Q(**{f'{field}__icontains': variant})
+        condition &= term_q
+        rank = rank + Case(
+            When(title_q, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    return queryset.filter(condition).annotate(search_rank=rank)
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    Замена rest_framework SearchFilter: ?search=<запрос>.
+    Без явного ?ordering= выдача сортируется по релевантности, поэтому
+    в filter_backends бэкенд ставится после OrderingFilter.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        fields = getattr(view, 'search_fields', ('title', 'description'))
+        queryset = search(queryset, query, fields)
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get('ordering'):
+            queryset = queryset.order_by('-search_rank', '-pk')
+        return queryset
@@ -1,39 +1,88 @@
+import re
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from .models import (
     Course, Task, TeacherSchedule,
-    Submission, DefenseQueue, Topic, Appointment
+    Submission, DefenseQueue, Topic, Appointment, ScheduleRecurrence, UploadSession, SLOT_MINUTES
 )
+from .uploads import CompletedUpload, claim_upload
 from datetime import datetime, date
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+FIELDS_QUERY_PARAM = 'fields'
+
+
+def requested_fields(request):
+    """Множество имён из ?fields=a,b,c (только для GET) или None, если параметра нет."""
+    if request is None or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        return None
+    value = request.query_params.get(FIELDS_QUERY_PARAM)
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetsMixin:
+    """
+    ?fields=id,title — в ответе только перечисленные поля. Действует лишь на
+    корневой сериализатор ответа (вложенные отдаются целиком), неизвестные
+    имена игнорируются. Невыбранные SerializerMethodField не вычисляются.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is None:
+            requested = requested_fields(self.context.get('request'))
+            if requested:
+                fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+class UserPublicSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    """
+    Компактное представление пользователя для вложения в курсы, окна и сдачи:
+    без groups/user_permissions, чтобы не тянуть M2M на каждую строку.
+    """
     class Meta:
         model = User
-        fields = '__all__'
+        fields = (
+            'id', 'username', 'email', 'first_name', 'last_name',
+            'phone', 'role', 'date_joined',
+        )
+        read_only_fields = fields
+
+
+class UserProfileSerializer(UserPublicSerializer):
+    """Правка своего профиля: только контактные поля, роль и логин не меняются."""
+    class Meta(UserPublicSerializer.Meta):
+        read_only_fields = ('id', 'username', 'role', 'date_joined')
 
 
-class CourseSerializer(serializers.ModelSerializer):
-    teacher = UserSerializer(read_only=True)
+class CourseSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    teacher = UserPublicSerializer(read_only=True)
 
     class Meta:
         model = Course
-        fields = '__all__'
+        exclude = ('search_vector',)
 
 
-class TopicSerializer(serializers.ModelSerializer):
+class TopicSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = Topic
-        fields = '__all__'
+        exclude = ('search_vector',)
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = Task
-        fields = '__all__'
+        exclude = ('search_vector',)
 
-class AppointmentInfoSerializer(serializers.ModelSerializer):
+class AppointmentInfoSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     first_name = serializers.CharField(source='student.first_name', read_only=True)
     last_name  = serializers.CharField(source='student.last_name',  read_only=True)
     position   = serializers.SerializerMethodField()
@@ -43,12 +92,11 @@ class AppointmentInfoSerializer(serializers.ModelSerializer):
         fields = ('id', 'first_name', 'last_name', 'created_at', 'position')
 
     def get_position(self, obj):
-        # Берём свежий QuerySet из БД, чтобы в нём был и только что созданный апойнтмент
-        qs = Appointment.objects.filter(schedule=obj.schedule).order_by('created_at')
-        return list(qs).index(obj) + 1
+        # позиция приходит аннотацией из Appointment.objects.with_position()
+        return obj.get_position()
     
-class TeacherScheduleSerializer(serializers.ModelSerializer):
-    teacher = UserSerializer(read_only=True)
+class TeacherScheduleSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    teacher = UserPublicSerializer(read_only=True)
     appointments_count  = serializers.SerializerMethodField()
     max_slots           = serializers.SerializerMethodField()
     available_slots     = serializers.SerializerMethodField()
@@ -61,33 +109,169 @@ class TeacherScheduleSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'date', 'start_time', 'end_time',
             'duration_minutes', 'max_slots', 'appointments_count', 'available_slots', 'teacher', 
-            'appointments',
+            'appointments', 'recurrence',
         ]
 
+    def check_capacity(self, instance, attrs, booked):
+        window = TeacherSchedule(
+            start_time=attrs.get('start_time', instance.start_time),
+            end_time=attrs.get('end_time', instance.end_time),
+        )
+        if window.compute_capacity() < booked:
+            raise serializers.ValidationError(
+                f"В окне уже {booked} записей: нельзя сократить его меньше, чем до {booked} мест."
+            )
+
+    def validate(self, attrs):
+        if self.instance is not None:
+            # booked у объекта мог устареть — берём текущий из БД
+            booked = TeacherSchedule.objects.values_list('booked', flat=True).get(pk=self.instance.pk)
+            self.check_capacity(self.instance, attrs, booked)
+        return attrs
+
+    def update(self, instance, validated_data):
+        # строка окна заблокирована до конца сохранения: параллельная запись
+        # дождётся новой вместимости, а не займёт место, которого уже нет
+        with transaction.atomic():
+            booked = (
+                TeacherSchedule.objects.select_for_update()
+                .values_list('booked', flat=True).get(pk=instance.pk)
+            )
+            self.check_capacity(instance, validated_data, booked)
+            return super().update(instance, validated_data)
+
+    # значения приходят аннотациями из TeacherSchedule.objects.with_capacity();
+    # для свежесозданного окна без аннотаций считаем их на месте
+
     def get_duration_minutes(self, obj):
-        start_dt = datetime.combine(date.today(), obj.start_time)
-        end_dt   = datetime.combine(date.today(), obj.end_time)
-        return int((end_dt - start_dt).total_seconds() // 60)
+        value = getattr(obj, 'duration_minutes', None)
+        if value is None:
+            start_dt = datetime.combine(date.today(), obj.start_time)
+            end_dt   = datetime.combine(date.today(), obj.end_time)
+            value = int((end_dt - start_dt).total_seconds() // 60)
+        return value
 
     def get_max_slots(self, obj):
-        return self.get_duration_minutes(obj) // 15
+        value = getattr(obj, 'max_slots', None)
+        if value is None:
+            value = self.get_duration_minutes(obj) // SLOT_MINUTES
+        return value
 
     def get_appointments_count(self, obj):
-        return obj.appointments.count()
+        value = getattr(obj, 'appointments_count', None)
+        if value is None:
+            value = obj.appointments.count()
+        return value
 
     def get_available_slots(self, obj):
-        return self.get_max_slots(obj) - self.get_appointments_count(obj)
+        value = getattr(obj, 'available_slots', None)
+        if value is None:
+            value = self.get_max_slots(obj) - self.get_appointments_count(obj)
+        return value
+
+
+class ScheduleRecurrenceSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    teacher = UserPublicSerializer(read_only=True)
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6), allow_empty=False
+    )
+    exdates = serializers.ListField(child=serializers.DateField(), required=False)
 
-class SubmissionSerializer(serializers.ModelSerializer):
-    student = UserSerializer(read_only=True)
+    class Meta:
+        model = ScheduleRecurrence
+        fields = [
+            'id', 'title', 'weekdays', 'interval', 'start_time', 'end_time',
+            'start_date', 'until', 'exdates', 'teacher',
+        ]
+
+    def validate_weekdays(self, value):
+        return sorted(set(value))
+
+    def validate_exdates(self, value):
+        # в JSONField храним строками YYYY-MM-DD
+        return sorted({day.isoformat() for day in value})
+
+    def validate(self, attrs):
+        start = attrs.get('start_time', getattr(self.instance, 'start_time', None))
+        end = attrs.get('end_time', getattr(self.instance, 'end_time', None))
+        if start and end and start >= end:
+            raise serializers.ValidationError("Время начала должно быть раньше времени окончания.")
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        until = attrs.get('until', getattr(self.instance, 'until', None))
+        if start_date and until and until < start_date:
+            raise serializers.ValidationError("Дата окончания раньше даты начала.")
+        return attrs
+
+
+class OccurrenceSerializer(SparseFieldsetsMixin, serializers.Serializer):
+    """Вхождение шаблона: schedule = null, пока на него никто не записался."""
+    recurrence = serializers.IntegerField()
+    schedule = serializers.IntegerField(allow_null=True)
+    teacher = serializers.IntegerField()
+    title = serializers.CharField()
+    date = serializers.DateField()
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+    max_slots = serializers.IntegerField()
+    available_slots = serializers.IntegerField()
+
+class UploadFieldMixin:
+    """
+    Файл можно передать как обычно (file) или id завершённой докачиваемой
+    загрузки (upload, см. core.uploads) — тогда .part переносится на место.
+    """
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        upload = attrs.pop('upload', None)
+        if upload is not None:
+            if attrs.get('file'):
+                raise serializers.ValidationError("Передайте либо file, либо upload.")
+            attrs['file'] = claim_upload(self.context['request'].user, upload)
+        elif not attrs.get('file') and (self.instance is None or 'file' in attrs):
+            raise serializers.ValidationError({'file': "Нужен file или upload."})
+        return attrs
+
+    def create(self, validated_data):
+        file = validated_data.get('file')
+        instance = super().create(validated_data)
+        if isinstance(file, CompletedUpload):
+            file.release()
+        return instance
+
+    def update(self, instance, validated_data):
+        file = validated_data.get('file')
+        instance = super().update(instance, validated_data)
+        if isinstance(file, CompletedUpload):
+            file.release()
+        return instance
+
+
+class SubmissionSerializer(UploadFieldMixin, SparseFieldsetsMixin, serializers.ModelSerializer):
+    student = UserPublicSerializer(read_only=True)
+    upload = serializers.UUIDField(write_only=True, required=False)
 
     class Meta:
         model = Submission
         fields = '__all__'
         read_only_fields = ['student', 'ai_check_passed']
+        extra_kwargs = {'file': {'required': False}}
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'filename', 'size', 'checksum', 'received', 'completed', 'sha256', 'created_at')
+        read_only_fields = ('received', 'completed', 'sha256', 'created_at')
+        extra_kwargs = {'size': {'min_value': 1}}
+
+    def validate_checksum(self, value):
+        if value and not re.fullmatch(r'[0-9a-fA-F]{64}', value):
+            raise serializers.ValidationError("Ожидается SHA-256 в hex.")
+        return value.lower()
 
 
-class DefenseQueueSerializer(serializers.ModelSerializer):
+class DefenseQueueSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     class Meta:
         model = DefenseQueue
         fields = '__all__'
@@ -123,7 +307,7 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     student = serializers.ReadOnlyField(source='student.username')
     position = serializers.SerializerMethodField()
 
@@ -132,5 +316,5 @@ class AppointmentSerializer(serializers.ModelSerializer):
         fields = ('id', 'student', 'created_at', 'position')
 
     def get_position(self, obj):
-        qs = Appointment.objects.filter(schedule=obj.schedule).order_by('created_at')
-        return list(qs).index(obj) + 1
\ No newline at end of file
+        # позиция приходит аннотацией из Appointment.objects.with_position()
+        return obj.get_position()
\ No newline at end of file
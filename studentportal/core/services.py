@@ -1,24 +1,37 @@
 import datetime
+import heapq
+from bisect import bisect_right
 from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from django.db.models import Q
+from .ingest import DocumentError, ParsedDocument, parse_document
 from .models import (
-    TeacherSchedule, DefenseQueue, Submission
+    TeacherSchedule, DefenseQueue, Submission, Appointment, ScheduleRecurrence
 )
 
-def check_file_basic(file_path, min_words, required_keywords):
-    text = ""
+
+def recurrence_horizon():
+    """На сколько дней вперёд разворачиваются повторяющиеся окна."""
+    return getattr(settings, 'SCHEDULE_RECURRENCE_HORIZON_DAYS', 180)
+
+def check_file_basic(document, min_words, required_keywords):
+    """
+    document — путь к файлу (.docx или текст), файловый объект
+    или уже разобранный ingest.ParsedDocument.
+    """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-    except:
-        pass  
+        document = parse_document(document)
+    except (OSError, DocumentError):
+        document = ParsedDocument([])
 
-    words = text.split()
-    word_count = len(words)
+    word_count = document.word_count
+    text = document.text.lower()
 
     missing_keywords = []
     for kw in required_keywords:
-        if kw.lower() not in text.lower():
+        if kw.lower() not in text:
             missing_keywords.append(kw)
 
     if word_count < min_words or missing_keywords:
@@ -26,36 +39,156 @@ def check_file_basic(file_path, min_words, required_keywords):
     return True
 
 
+def _load_busy_intervals(teacher, from_date):
+    """
+    Одним запросом загружает занятые защиты преподавателя начиная с from_date
+    и возвращает {дата: (starts, ends)} — отсортированные и слитые интервалы.
+    """
+    rows = (
+        DefenseQueue.objects
+        .filter(teacher=teacher, defense_date__gte=from_date)
+        .values_list('defense_date', 'defense_time', 'submission__task__expected_defense_time')
+        .order_by('defense_date', 'defense_time')
+    )
+    by_date = {}
+    for day, time, minutes in rows:
+        start = datetime.datetime.combine(day, time)
+        end = start + timedelta(minutes=minutes or 0)
+        intervals = by_date.setdefault(day, [])
+        # строки уже отсортированы по началу — сливаем пересекающиеся на лету
+        if intervals and start <= intervals[-1][1]:
+            intervals[-1][1] = max(intervals[-1][1], end)
+        else:
+            intervals.append([start, end])
+    return {
+        day: ([i[0] for i in intervals], [i[1] for i in intervals])
+        for day, intervals in by_date.items()
+    }
+
+
+def _earliest_gap(starts, ends, window_start, window_end, delta):
+    """
+    Ищет самое раннее начало отрезка длиной delta внутри окна,
+    не пересекающееся с занятыми интервалами (starts/ends слиты и отсортированы).
+    """
+    candidate = window_start
+    # первый интервал, который заканчивается позже начала окна
+    idx = bisect_right(ends, candidate)
+    while idx < len(starts) and starts[idx] < candidate + delta:
+        candidate = max(candidate, ends[idx])
+        idx += 1
+    if candidate + delta <= window_end:
+        return candidate
+    return None
+
+
+def _virtual_windows(recurrence, from_date, to_date, taken):
+    for day in recurrence.iter_occurrences(from_date, to_date):
+        if (recurrence.pk, day) not in taken:
+            yield (day, recurrence.start_time, recurrence.end_time)
+
+
+def _iter_teacher_windows(teacher, from_date):
+    """
+    Окна преподавателя (date, start_time, end_time) по возрастанию: сохранённые
+    TeacherSchedule и ещё не материализованные вхождения шаблонов до горизонта.
+    """
+    schedules = (
+        TeacherSchedule.objects
+        .filter(teacher=teacher, date__gte=from_date)
+        .order_by('date', 'start_time')
+        .values_list('date', 'start_time', 'end_time')
+    )
+    recurrences = ScheduleRecurrence.objects.filter(
+        Q(until__isnull=True) | Q(until__gte=from_date), teacher=teacher
+    )
+    taken = set(
+        TeacherSchedule.objects
+        .filter(teacher=teacher, date__gte=from_date, recurrence__isnull=False)
+        .values_list('recurrence_id', 'date')
+    )
+    to_date = from_date + timedelta(days=recurrence_horizon())
+    return heapq.merge(
+        schedules.iterator(),
+        *(_virtual_windows(rec, from_date, to_date, taken) for rec in recurrences),
+    )
+
+
 def find_nearest_defense_slot(teacher, expected_time_minutes):
 
     now_date = datetime.date.today()
 
-    schedules = TeacherSchedule.objects.filter(
-        teacher=teacher,
-        date__gte=now_date
-    ).order_by('date', 'start_time')
-
-    for sched in schedules:
-        start = datetime.datetime.combine(sched.date, sched.start_time)
-        end = datetime.datetime.combine(sched.date, sched.end_time)
-        delta = timedelta(minutes=expected_time_minutes)
-
-        current = start
-        while current + delta <= end:
-            candidate_time = current.time()
-            busy = DefenseQueue.objects.filter(
-                teacher=teacher,
-                defense_date=sched.date,
-                defense_time=candidate_time
-            ).exists()
-            if not busy:
-                return (sched.date, candidate_time)
-
-            current += delta
+    busy = _load_busy_intervals(teacher, now_date)
+    delta = timedelta(minutes=expected_time_minutes)
+
+    for day, start_time, end_time in _iter_teacher_windows(teacher, now_date):
+        start = datetime.datetime.combine(day, start_time)
+        end = datetime.datetime.combine(day, end_time)
+        starts, ends = busy.get(day, ([], []))
+
+        slot = _earliest_gap(starts, ends, start, end, delta)
+        if slot is not None:
+            return (day, slot.time())
 
     return None
 
 
+def expand_occurrences(recurrences, date_from, date_to):
+    """
+    Разворачивает шаблоны в окна за [date_from, date_to] без записи в БД.
+    Уже материализованные даты подтягиваются одним запросом (с реальной
+    занятостью), остальные отдаются виртуальными — schedule = None.
+    """
+    recurrences = list(recurrences)
+    materialized = {
+        (s.recurrence_id, s.date): s
+        for s in TeacherSchedule.objects.filter(
+            recurrence__in=recurrences, date__range=(date_from, date_to)
+        )
+    }
+    items = []
+    for rec in recurrences:
+        days = set(rec.iter_occurrences(date_from, date_to))
+        # окно с записями остаётся, даже если дату потом исключили из шаблона
+        days.update(day for rec_id, day in materialized if rec_id == rec.pk)
+        for day in days:
+            sched = materialized.get((rec.pk, day))
+            window = sched or rec.to_schedule(day)
+            items.append({
+                'recurrence': rec.pk,
+                'schedule': sched.pk if sched else None,
+                'teacher': rec.teacher_id,
+                'title': window.title,
+                'date': day,
+                'start_time': window.start_time,
+                'end_time': window.end_time,
+                'max_slots': window.capacity,
+                'available_slots': window.capacity - window.booked,
+            })
+    items.sort(key=lambda item: (item['date'], item['start_time'], item['recurrence']))
+    return items
+
+
+def materialize_occurrence(recurrence, day):
+    """
+    Окно TeacherSchedule для вхождения шаблона: создаётся при первой записи,
+    дальше возвращается существующее (уникальность recurrence + date).
+    """
+    existing = TeacherSchedule.objects.filter(recurrence=recurrence, date=day).first()
+    if existing is not None:
+        return existing
+    if not recurrence.occurs_on(day):
+        raise ValidationError("В этот день окна по шаблону нет.")
+    try:
+        with transaction.atomic():
+            schedule = recurrence.to_schedule(day)
+            schedule.save()
+            return schedule
+    except IntegrityError:
+        # параллельная запись успела создать окно раньше
+        return TeacherSchedule.objects.get(recurrence=recurrence, date=day)
+
+
 def calculate_max_students_per_day(teacher, date):
     schedule_qs = TeacherSchedule.objects.filter(
         teacher=teacher, date=date
@@ -73,3 +206,23 @@ def calculate_max_students_per_day(teacher, date):
     average_defense_time = 10
     max_students = total_minutes // average_defense_time
     return max_students
+
+
+def book_appointment(schedule, student):
+    """
+    Записывает студента в окно. Идемпотентно: повторный запрос (в том числе
+    параллельный) возвращает уже существующую запись.
+    Возвращает (appointment, created); если мест нет — django ValidationError.
+    """
+    existing = Appointment.objects.filter(schedule=schedule, student=student).first()
+    if existing is not None:
+        return existing, False
+    try:
+        with transaction.atomic():
+            appt = Appointment(schedule=schedule, student=student)
+            appt.save()
+    except IntegrityError:
+        # такой же запрос успел раньше: уникальность (schedule, student)
+        # откатила и вставку, и увеличение booked
+        return Appointment.objects.get(schedule=schedule, student=student), False
+    return appt, True
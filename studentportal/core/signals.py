@@ -0,0 +1,68 @@
+import os
+
+from django.db.models import F, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Appointment, Course, Submission, Task, TeacherSchedule, Topic, UploadSession
+
+
+@receiver(post_delete, sender=Appointment)
+def release_appointment_slot(sender, instance, **kwargs):
+    # срабатывает и на каскадное/массовое удаление, в отличие от Model.delete()
+    TeacherSchedule.objects.filter(
+        pk=instance.schedule_id, booked__gt=0
+    ).update(booked=F('booked') - 1)
+
+
+@receiver(post_delete, sender=UploadSession)
+def remove_upload_part(sender, instance, **kwargs):
+    # после прикрепления .part уже перенесён на место — тогда удалять нечего
+    try:
+        os.remove(instance.part_path)
+    except FileNotFoundError:
+        pass
+
+
+# Submission.course/teacher — копия task.topic.course(.teacher). При переносе
+# задачи в другую тему, темы в другой курс или курса другому преподавателю
+# обновляем сдачи одним UPDATE; если ничего не переехало, он ничего не трогает.
+# QuerySet.update() по задачам/темам/курсам сигналов не шлёт — после такого
+# нужно вызвать Submission.sync_owner() или повторить миграцию 0015.
+
+def _resync_submissions(submissions, course):
+    """course — queryset из одного курса, которому теперь принадлежат сдачи."""
+    course_id = Subquery(course.values('pk'))
+    teacher_id = Subquery(course.values('teacher_id'))
+    submissions.exclude(course_id=course_id, teacher_id=teacher_id).update(
+        course_id=course_id, teacher_id=teacher_id
+    )
+
+
+@receiver(post_save, sender=Task)
+def sync_task_submissions(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    _resync_submissions(
+        Submission.objects.filter(task=instance),
+        Course.objects.filter(topics=instance.topic_id),
+    )
+
+
+@receiver(post_save, sender=Topic)
+def sync_topic_submissions(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    _resync_submissions(
+        Submission.objects.filter(task__topic=instance),
+        Course.objects.filter(pk=instance.course_id),
+    )
+
+
+@receiver(post_save, sender=Course)
+def sync_course_submissions(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    Submission.objects.filter(course=instance).exclude(
+        teacher_id=instance.teacher_id
+    ).update(teacher_id=instance.teacher_id)
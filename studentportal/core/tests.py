@@ -1,3 +1,882 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from unittest import skipUnless
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .admission import LocalAdmissionQueue
+from .ingest import DocumentError, ParsedDocument, parse_document
+from .models import (
+    Appointment, Course, CustomUser, DefenseQueue, ScheduleRecurrence, Submission, Task,
+    TeacherSchedule, Topic, UploadSession,
+)
+from .services import (
+    _earliest_gap, _iter_teacher_windows, book_appointment, check_file_basic, expand_occurrences,
+    find_nearest_defense_slot, materialize_occurrence,
+)
+
+
+def make_teacher(username='teacher'):
+    return CustomUser.objects.create(username=username, role='teacher')
+
+
+def make_students(count, prefix='student'):
+    CustomUser.objects.bulk_create(
+        CustomUser(username=f'{prefix}{i}', role='student') for i in range(count)
+    )
+    return list(CustomUser.objects.filter(username__startswith=prefix).order_by('id'))
+
+
+def make_window(teacher, day=None, start=(9, 0), end=(18, 0), **kwargs):
+    return TeacherSchedule.objects.create(
+        teacher=teacher, date=day or datetime.date(2026, 1, 12),
+        start_time=datetime.time(*start), end_time=datetime.time(*end), **kwargs
+    )
+
+
+def make_defense(teacher, day, start, minutes):
+    """Занятая защита длительностью minutes (expected_defense_time задачи)."""
+    course = Course.objects.create(title='Курс', teacher=teacher)
+    topic = Topic.objects.create(course=course, title='Тема')
+    task = Task.objects.create(topic=topic, title='Задача', file='tasks/t.docx', expected_defense_time=minutes)
+    student = CustomUser.objects.create(username=f'd{CustomUser.objects.count()}', role='student')
+    submission = Submission.objects.create(task=task, student=student, file='submissions/s.docx')
+    return DefenseQueue.objects.create(
+        submission=submission, teacher=teacher, defense_date=day, defense_time=datetime.time(*start)
+    )
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def count_queries(func):
+    with CaptureQueriesContext(connection) as ctx:
+        func()
+    return len(ctx.captured_queries)
+
+
+class QueuePositionTests(TestCase):
+    """Позиции в очереди считаются в БД: число запросов не зависит от числа записей."""
+
+    WINDOWS = 10
+
+    def seed(self, appointments):
+        teacher = make_teacher(f'teacher{appointments}')
+        windows = [
+            make_window(teacher, day=datetime.date(2026, 1, 12) + datetime.timedelta(days=i))
+            for i in range(self.WINDOWS)
+        ]
+        students = make_students(appointments, prefix=f's{appointments}_')
+        # bulk_create мимо счётчика booked: здесь важны только позиции
+        Appointment.objects.bulk_create(
+            Appointment(schedule=windows[i % self.WINDOWS], student=student)
+            for i, student in enumerate(students)
+        )
+        return teacher, windows
+
+    def test_constant_queries_at_10_100_1000(self):
+        counts = {}
+        for size in (10, 100, 1000):
+            with self.subTest(appointments=size):
+                teacher, windows = self.seed(size)
+                client = client_for(teacher)
+                schedules = count_queries(lambda: self.assertEqual(
+                    client.get('/api/teacher-schedules/').status_code, 200
+                ))
+                appointments = count_queries(lambda: self.assertEqual(
+                    client.get('/api/appointments/?page_size=500').status_code, 200
+                ))
+                queue = count_queries(lambda: self.assertEqual(
+                    client.get(f'/api/teacher-schedules/{windows[0].pk}/appointments/').status_code, 200
+                ))
+                counts[size] = (schedules, appointments, queue)
+        self.assertEqual(counts[10], counts[100])
+        self.assertEqual(counts[10], counts[1000])
+        # окна + записи одним prefetch; страница записей; окно + его очередь
+        self.assertEqual(counts[1000], (2, 1, 3))
+
+    def test_positions_follow_signup_order(self):
+        teacher, windows = self.seed(30)
+        data = client_for(teacher).get('/api/teacher-schedules/').json()['results']
+        for window in data:
+            positions = [a['position'] for a in window['appointments']]
+            self.assertEqual(positions, list(range(1, len(positions) + 1)))
+        expected = list(
+            windows[0].appointments.order_by('created_at', 'id').values_list('id', flat=True)
+        )
+        queue = client_for(teacher).get(f'/api/teacher-schedules/{windows[0].pk}/appointments/').json()
+        self.assertEqual([a['id'] for a in queue], expected)
+        self.assertEqual([a['position'] for a in queue], list(range(1, len(expected) + 1)))
+
+    def test_student_sees_position_in_full_window(self):
+        teacher, windows = self.seed(30)
+        last = windows[0].appointments.order_by('-created_at', '-id').first()
+        data = client_for(last.student).get('/api/appointments/').json()['results']
+        self.assertEqual([a['position'] for a in data], [windows[0].appointments.count()])
+
+
+class ListQueryCountTests(TestCase):
+    """Списки отдаются за фиксированное число запросов, без N+1 по вложенным пользователям."""
+
+    def seed(self, size):
+        teacher = make_teacher(f'teacher{size}')
+        students = make_students(size, prefix=f's{size}_')
+        courses = Course.objects.bulk_create(
+            Course(title=f'Курс {i}', teacher=teacher) for i in range(size)
+        )
+        topic = Topic.objects.create(course=courses[0], title='Тема')
+        task = Task.objects.create(topic=topic, title='Лабораторная', file='tasks/lab.docx')
+        Submission.objects.bulk_create(
+            Submission(task=task, student=student, file='submissions/lab.docx',
+                       course=courses[0], teacher=teacher)
+            for student in students
+        )
+        windows = [
+            make_window(teacher, day=datetime.date(2026, 2, 2) + datetime.timedelta(days=i))
+            for i in range(size)
+        ]
+        Appointment.objects.bulk_create(
+            Appointment(schedule=windows[i], student=student) for i, student in enumerate(students)
+        )
+        return teacher
+
+    URLS = (
+        '/api/courses/?page_size=500',
+        '/api/submissions/?page_size=500',
+        '/api/users/?page_size=500',
+        '/api/teacher-schedules/?page_size=500',
+        '/api/appointments/?page_size=500',
+    )
+
+    def test_constant_queries(self):
+        counts = {}
+        for size in (10, 100):
+            client = client_for(self.seed(size))
+            counts[size] = {
+                url: count_queries(lambda: self.assertEqual(client.get(url).status_code, 200))
+                for url in self.URLS
+            }
+        self.assertEqual(counts[10], counts[100])
+        self.assertEqual(counts[100], dict(zip(self.URLS, (1, 1, 1, 2, 1))))
+
+    def test_sparse_fieldsets(self):
+        client = client_for(self.seed(3))
+        url = '/api/teacher-schedules/?page_size=500&fields=id,date,unknown'
+        with CaptureQueriesContext(connection) as queries:
+            windows = client.get(url).json()['results']
+        self.assertEqual([set(w) for w in windows], [{'id', 'date'}] * 3)
+        # без appointments записи окон не подгружаются вовсе
+        self.assertEqual(len(queries), 1)
+
+        # вложенные сериализаторы отдаются целиком
+        course = client.get('/api/courses/?fields=id,teacher').json()['results'][0]
+        self.assertEqual(set(course), {'id', 'teacher'})
+        self.assertIn('username', course['teacher'])
+        detail = client.get(f"/api/courses/{course['id']}/?fields=title").json()
+        self.assertEqual(set(detail), {'title'})
+
+    def test_users_list_hides_private_fields(self):
+        teacher = self.seed(3)
+        CustomUser.objects.filter(pk=teacher.pk).update(is_superuser=True)
+        user = client_for(teacher).get('/api/users/').json()['results'][0]
+        self.assertEqual(set(user), {
+            'id', 'username', 'email', 'first_name', 'last_name', 'phone', 'role', 'date_joined',
+        })
+
+    def test_profile_update_keeps_role_and_flags(self):
+        student = make_students(1)[0]
+        response = client_for(student).patch(f'/api/users/{student.pk}/', {
+            'first_name': 'Анна', 'role': 'teacher', 'is_superuser': True, 'password': 'x',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['first_name'], 'Анна')
+        student.refresh_from_db()
+        self.assertEqual((student.first_name, student.role, student.is_superuser), ('Анна', 'student', False))
+        self.assertEqual(student.password, '')
+
+
+class ScheduleUpdateTests(TestCase):
+
+    def test_response_shows_new_capacity(self):
+        teacher = make_teacher()
+        window = make_window(teacher)
+        Appointment.objects.create(schedule=window, student=make_students(1)[0])
+        response = client_for(teacher).patch(
+            f'/api/teacher-schedules/{window.pk}/', {'end_time': '10:00'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            (data['duration_minutes'], data['max_slots'], data['appointments_count'], data['available_slots']),
+            (60, 4, 1, 3)
+        )
+        self.assertEqual(len(data['appointments']), 1)
+
+
+class BookingCounterTests(TestCase):
+
+    def setUp(self):
+        self.teacher = make_teacher()
+        # 9:00–10:00 — четыре места
+        self.window = make_window(self.teacher, end=(10, 0))
+        self.students = make_students(5)
+
+    def test_full_save_keeps_booked(self):
+        stale = TeacherSchedule.objects.get(pk=self.window.pk)
+        book_appointment(self.window, self.students[0])
+        stale.title = 'Защита лабораторных'
+        stale.save()
+        self.window.refresh_from_db()
+        self.assertEqual((self.window.title, self.window.booked), ('Защита лабораторных', 1))
+
+    def test_window_cannot_shrink_below_booked(self):
+        for student in self.students[:3]:
+            book_appointment(self.window, student)
+        client = client_for(self.teacher)
+        url = f'/api/teacher-schedules/{self.window.pk}/'
+        self.assertEqual(client.patch(url, {'end_time': '09:30'}, format='json').status_code, 400)
+        self.assertEqual(client.patch(url, {'end_time': '09:45'}, format='json').status_code, 200)
+        self.window.refresh_from_db()
+        self.assertEqual((self.window.capacity, self.window.booked), (3, 3))
+
+    def test_repeated_create_returns_existing(self):
+        client = client_for(self.students[0])
+        first = client.post('/api/appointments/', {'schedule': self.window.pk}, format='json')
+        second = client.post('/api/appointments/', {'schedule': self.window.pk}, format='json')
+        self.assertEqual((first.status_code, second.status_code), (201, 200))
+        self.assertEqual(first.json()['id'], second.json()['id'])
+        self.window.refresh_from_db()
+        self.assertEqual(self.window.booked, 1)
+
+
+def make_recurrence(teacher, start_date, weekdays=range(7), **kwargs):
+    kwargs.setdefault('start_time', datetime.time(9, 0))
+    kwargs.setdefault('end_time', datetime.time(10, 0))
+    return ScheduleRecurrence.objects.create(
+        teacher=teacher, start_date=start_date, weekdays=list(weekdays), **kwargs
+    )
+
+
+class RecurrenceTests(TestCase):
+
+    def setUp(self):
+        self.teacher = make_teacher()
+        # пн и ср раз в две недели со среды 14.01.2026: недели считаются
+        # от понедельника 12.01, 28.01 исключена, последняя дата — 09.02
+        self.rec = make_recurrence(
+            self.teacher, datetime.date(2026, 1, 14), weekdays=[0, 2], interval=2,
+            until=datetime.date(2026, 2, 9), exdates=['2026-01-28'],
+        )
+
+    def days(self, *days):
+        return [datetime.date(2026, month, day) for month, day in days]
+
+    def test_occurrences(self):
+        occurrences = list(self.rec.iter_occurrences(datetime.date(2026, 1, 1), datetime.date(2026, 3, 1)))
+        self.assertEqual(occurrences, self.days((1, 14), (1, 26), (2, 9)))
+        # до start_date, нечётная неделя, исключение, после until
+        for day in self.days((1, 12), (1, 19), (1, 21), (1, 28), (2, 11), (2, 23)):
+            with self.subTest(day=day):
+                self.assertFalse(self.rec.occurs_on(day))
+
+    def test_materialize_returns_existing(self):
+        day = datetime.date(2026, 1, 26)
+        schedule = materialize_occurrence(self.rec, day)
+        self.assertEqual((schedule.recurrence, schedule.date, schedule.capacity), (self.rec, day, 4))
+        self.assertEqual(materialize_occurrence(self.rec, day).pk, schedule.pk)
+        with self.assertRaises(ValidationError):
+            materialize_occurrence(self.rec, datetime.date(2026, 1, 19))
+
+    def test_materialize_race(self):
+        day = datetime.date(2026, 1, 26)
+        existing = materialize_occurrence(self.rec, day)
+        # параллельный запрос не увидел окно и упирается в уникальность
+        with mock.patch('django.db.models.query.QuerySet.first', return_value=None):
+            self.assertEqual(materialize_occurrence(self.rec, day).pk, existing.pk)
+        self.assertEqual(TeacherSchedule.objects.filter(recurrence=self.rec).count(), 1)
+
+    def test_expand_keeps_booked_date_after_exclusion(self):
+        booked_day, free_day = self.days((1, 26), (2, 9))
+        schedule = materialize_occurrence(self.rec, booked_day)
+        book_appointment(schedule, make_students(1)[0])
+        self.rec.exdates += [booked_day.isoformat(), free_day.isoformat()]
+        self.rec.save()
+
+        items = expand_occurrences([self.rec], datetime.date(2026, 1, 1), datetime.date(2026, 3, 1))
+        self.assertEqual(
+            [(i['date'], i['schedule'], i['available_slots']) for i in items],
+            [(datetime.date(2026, 1, 14), None, 4), (booked_day, schedule.pk, 3)],
+        )
+
+    @override_settings(SCHEDULE_RECURRENCE_HORIZON_DAYS=2)
+    def test_teacher_windows_merge_stored_and_virtual(self):
+        day = datetime.date(2026, 1, 12)
+        next_day = day + datetime.timedelta(days=1)
+        teacher = make_teacher('daily')
+        daily = make_recurrence(teacher, day)
+        materialize_occurrence(daily, day)
+        make_window(teacher, day=next_day, start=(10, 0), end=(11, 0))
+
+        windows = [(d, s.hour) for d, s, _ in _iter_teacher_windows(teacher, day)]
+        self.assertEqual(windows, [
+            (day, 9), (next_day, 9), (next_day, 10), (day + datetime.timedelta(days=2), 9),
+        ])
+
+    def test_nearest_slot_in_unmaterialised_occurrence(self):
+        today = datetime.date.today()
+
+        def day(n):
+            return today + datetime.timedelta(days=n)
+
+        rec = make_recurrence(self.teacher, day(1), exdates=[day(1).isoformat()])
+        self.assertEqual(find_nearest_defense_slot(self.teacher, 15), (day(2), datetime.time(9, 0)))
+        # занятое вхождение пропускается, следующее берётся из шаблона
+        materialize_occurrence(rec, day(2))
+        make_defense(self.teacher, day(2), (9, 0), 60)
+        self.assertEqual(find_nearest_defense_slot(self.teacher, 15), (day(3), datetime.time(9, 0)))
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBookingTests(TransactionTestCase):
+    """Параллельные записи в реальных транзакциях (SQLite пишет по одному — только PostgreSQL)."""
+
+    def book_in_threads(self, window, students):
+        barrier = threading.Barrier(len(students))
+        results = []
+
+        def book(student):
+            try:
+                barrier.wait()
+                results.append(book_appointment(window, student)[1])
+            except ValidationError:
+                results.append('full')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(student,)) for student in students]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_no_overbooking(self):
+        window = make_window(make_teacher(), end=(10, 15))
+        results = self.book_in_threads(window, make_students(20))
+        window.refresh_from_db()
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(results.count('full'), 15)
+        self.assertEqual((window.booked, window.appointments.count()), (5, 5))
+
+    def test_same_student_booked_once(self):
+        window = make_window(make_teacher(), end=(10, 15))
+        student = make_students(1)[0]
+        results = self.book_in_threads(window, [student] * 8)
+        window.refresh_from_db()
+        self.assertEqual(sorted(results), [False] * 7 + [True])
+        self.assertEqual((window.booked, window.appointments.count()), (1, 1))
+
+
+class AdmissionBatchTests(TestCase):
+
+    def test_conflicting_row_does_not_fail_batch(self):
+        window = make_window(make_teacher(), end=(10, 0))
+        students = make_students(3)
+        racer = Appointment(schedule=window, student=students[1])
+        real_filter = Appointment.objects.filter
+
+        def filter_then_race(*args, **kwargs):
+            # пачка уже сверилась с БД, а студента тем временем записали мимо очереди
+            qs = real_filter(*args, **kwargs)
+            list(qs)
+            if racer.pk is None:
+                Appointment.objects.bulk_create([racer])
+            return qs
+
+        batch = [(f't{i}', window.pk, student.pk) for i, student in enumerate(students)]
+        with mock.patch.object(Appointment.objects, 'filter', side_effect=filter_then_race):
+            results = LocalAdmissionQueue()._admit(batch)
+
+        self.assertEqual([results[t]['status'] for t, _, _ in batch], ['booked', 'duplicate', 'booked'])
+        self.assertEqual((results['t0']['position'], results['t2']['position']), (1, 2))
+        self.assertEqual(results['t1']['appointment'], racer.pk)
+        window.refresh_from_db()
+        self.assertEqual(window.booked, 2)
+        self.assertEqual(window.appointments.count(), 3)
+
+
+class BulkImportTests(TestCase):
+
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.client = client_for(self.teacher)
+        make_window(self.teacher, start=(12, 0), end=(13, 0))
+
+    def post(self, rows):
+        return self.client.post('/api/teacher-schedules/bulk/', rows, format='json')
+
+    def test_creates_windows(self):
+        response = self.post([
+            {'date': '2026-01-12', 'start_time': '09:00', 'end_time': '10:00'},
+            {'date': '2026-01-13', 'start_time': '09:00', 'end_time': '10:00'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(TeacherSchedule.objects.get(pk=response.json()['ids'][0]).capacity, 4)
+
+    def test_row_numbers_are_integers(self):
+        response = self.post([
+            {'date': '2026-01-12', 'start_time': '09:00', 'end_time': '10:00'},
+            {'date': '2026-01-12', 'start_time': '11:00', 'end_time': '10:00'},
+            {'date': 'завтра', 'start_time': '09:00', 'end_time': '10:00'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['row'] for e in response.json()['rows']], [2, 3])
+
+    def test_overlaps_reported_by_row(self):
+        response = self.post([
+            {'date': '2026-01-12', 'start_time': '09:00', 'end_time': '10:00'},
+            {'date': '2026-01-12', 'start_time': '09:30', 'end_time': '10:30'},
+            {'date': '2026-01-12', 'start_time': '12:30', 'end_time': '14:00'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['rows'], [
+            {'row': 1, 'errors': ['Окно пересекается со строкой 2.']},
+            {'row': 3, 'errors': [f'Окно пересекается с окном id={TeacherSchedule.objects.get().pk}.']},
+        ])
+
+    def test_empty_payload_rejected(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        upload = SimpleUploadedFile('windows.csv', b'title,date,start_time,end_time\n')
+        response = self.client.post('/api/teacher-schedules/bulk/', {'file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/api/tasks/bulk/', [], format='json').status_code, 400)
+
+
+class CourseSearchTests(TestCase):
+    """?search= — на PostgreSQL полнотекстовый, на SQLite запасной icontains."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_teacher()
+        Course.objects.bulk_create([
+            Course(teacher=cls.teacher, title='Базы данных',
+                   description='Проектирование баз и программирование запросов'),
+            Course(teacher=cls.teacher, title='Программирование на Python',
+                   description='Основы языка и алгоритмы'),
+            Course(teacher=cls.teacher, title='История', description='Древний мир'),
+        ])
+
+    def titles(self, query, **params):
+        response = client_for(self.teacher).get('/api/courses/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [course['title'] for course in response.json()['results']]
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(
+            self.titles('программирование'), ['Программирование на Python', 'Базы данных']
+        )
+
+    def test_all_words_required(self):
+        self.assertEqual(self.titles('программирование запросов'), ['Базы данных'])
+        self.assertEqual(self.titles('древний алгоритмы'), [])
+
+    def test_explicit_ordering_wins(self):
+        self.assertEqual(
+            self.titles('программирование', ordering='title'),
+            ['Базы данных', 'Программирование на Python']
+        )
+
+    def test_blank_query_is_ignored(self):
+        self.assertEqual(len(self.titles('  ')), 3)
+
+    @skipUnless(connection.vendor == 'postgresql', 'морфология и префиксы — только PostgreSQL')
+    def test_word_forms_and_prefix(self):
+        self.assertEqual(self.titles('программированию')[0], 'Программирование на Python')
+        self.assertIn('Базы данных', self.titles('баз'))
+
+    @skipUnless(connection.vendor == 'postgresql', 'search_vector заполняет триггер PostgreSQL')
+    def test_vector_follows_title_change(self):
+        course = Course.objects.get(title='История')
+        course.title = 'История вычислительной техники'
+        course.save()
+        self.assertIn(course.title, self.titles('вычислительная'))
+
+
+class MyCoursesTests(TestCase):
+
+    def test_pages_follow_next(self):
+        teacher = make_teacher()
+        Course.objects.bulk_create(Course(title=f'Курс {i}', teacher=teacher) for i in range(7))
+        Course.objects.create(title='Чужой курс', teacher=make_teacher('other'))
+        client = client_for(teacher)
+        titles, url = [], '/api/courses/me/?page_size=3'
+        while url:
+            data = client.get(url).json()
+            titles += [course['title'] for course in data['results']]
+            url = data['next']
+        self.assertEqual(sorted(titles), sorted(f'Курс {i}' for i in range(7)))
+
+    def test_student_gets_empty_page(self):
+        response = client_for(make_students(1)[0]).get('/api/courses/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'next': None, 'previous': None, 'results': []})
+
+
+class SubmissionOwnerTests(TestCase):
+    """Денормализованные Submission.course/teacher и входящие преподавателя."""
+
+    def setUp(self):
+        self.teacher, self.other = make_teacher(), make_teacher('other')
+        self.course = Course.objects.create(title='Анализ данных', teacher=self.teacher)
+        self.other_course = Course.objects.create(title='Статистика', teacher=self.other)
+        self.topic = Topic.objects.create(course=self.course, title='Кластеризация')
+        self.other_topic = Topic.objects.create(course=self.other_course, title='Регрессия')
+        self.task = Task.objects.create(topic=self.topic, title='k-средних', file='tasks/lab.docx')
+        self.other_task = Task.objects.create(topic=self.other_topic, title='МНК', file='tasks/lab.docx')
+        self.students = make_students(3)
+        self.submission = self.submit(self.task, self.students[0])
+
+    def submit(self, task, student, status='waiting_for_check'):
+        return Submission.objects.create(
+            task=task, student=student, file='submissions/lab.docx', status=status
+        )
+
+    def assert_owner(self, course, teacher):
+        self.submission.refresh_from_db()
+        self.assertEqual(
+            (self.submission.course_id, self.submission.teacher_id), (course.pk, teacher.pk)
+        )
+
+    def test_filled_on_create(self):
+        self.assert_owner(self.course, self.teacher)
+
+    def test_task_moved_to_other_topic(self):
+        self.task.topic = self.other_topic
+        self.task.save()
+        self.assert_owner(self.other_course, self.other)
+
+    def test_topic_moved_to_other_course(self):
+        self.topic.course = self.other_course
+        self.topic.save()
+        self.assert_owner(self.other_course, self.other)
+
+    def test_course_handed_to_other_teacher(self):
+        self.course.teacher = self.other
+        self.course.save()
+        self.assert_owner(self.course, self.other)
+
+    def test_task_changed_with_update_fields(self):
+        submission = Submission.objects.get(pk=self.submission.pk)
+        submission.task = self.other_task
+        submission.save(update_fields=['task'])
+        self.assert_owner(self.other_course, self.other)
+
+        # без смены задачи владелец не пересчитывается: только сам UPDATE
+        submission.status = 'approved'
+        with self.assertNumQueries(1):
+            submission.save(update_fields=['status'])
+
+    def test_inbox_filters_and_orders(self):
+        second = self.submit(self.task, self.students[1])
+        approved = self.submit(self.task, self.students[2], status='approved')
+        self.submit(self.other_task, self.students[0])
+        # вторая сдача пришла раньше первой
+        Submission.objects.filter(pk=second.pk).update(
+            created_at=self.submission.created_at - datetime.timedelta(hours=1)
+        )
+        client = client_for(self.teacher)
+
+        def inbox(query=''):
+            response = client.get(f'/api/submissions/inbox/{query}')
+            self.assertEqual(response.status_code, 200)
+            return [item['id'] for item in response.json()['results']]
+
+        self.assertEqual(inbox(), [second.pk, self.submission.pk])
+        self.assertEqual(inbox('?status=approved'), [approved.pk])
+        self.assertEqual(inbox(f'?course={self.other_course.pk}'), [])
+        self.assertEqual(client_for(self.students[0]).get('/api/submissions/inbox/').status_code, 403)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'планы запросов — только PostgreSQL')
+class QueryPlanTests(TestCase):
+
+    def test_hot_queries_use_indexes(self):
+        # наполнение, ANALYZE и EXPLAIN — те же, что в manage.py check_query_plans
+        out = StringIO()
+        try:
+            call_command('check_query_plans', stdout=out)
+        except CommandError as e:
+            self.fail(f"{e}\n{out.getvalue()}")
+
+
+class UploadTests(TestCase):
+    """Потоковый multipart и докачка кусками во временном MEDIA_ROOT."""
+
+    data = bytes(range(256)) * 40 + b'tail'
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.uploads = os.path.join(media, '.uploads')
+        override = override_settings(
+            MEDIA_ROOT=media, UPLOAD_TEMP_DIR=self.uploads, FILE_UPLOAD_TEMP_DIR=self.uploads,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        teacher = make_teacher()
+        topic = Topic.objects.create(course=Course.objects.create(title='Курс', teacher=teacher), title='Тема')
+        self.task = Task.objects.create(topic=topic, title='Лабораторная', file='tasks/lab.docx')
+        self.student = make_students(1)[0]
+        self.client = client_for(self.student)
+
+    def left(self):
+        return sorted(os.listdir(self.uploads)) if os.path.isdir(self.uploads) else []
+
+    def start(self, size=None, checksum=''):
+        response = self.client.post('/api/uploads/', {
+            'filename': 'work.bin', 'size': size or len(self.data), 'checksum': checksum,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def put(self, upload_id, start, end, body=None):
+        body = self.data[start:end + 1] if body is None else body
+        return self.client.generic(
+            'PUT', f'/api/uploads/{upload_id}/', body, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.data)}',
+        )
+
+    def test_multipart_goes_to_disk(self):
+        response = self.client.post('/api/submissions/', {
+            'task': self.task.pk, 'file': SimpleUploadedFile('work.bin', self.data),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        with Submission.objects.get(pk=response.json()['id']).file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.data)
+        self.assertEqual(self.left(), [])
+
+    @override_settings(UPLOAD_MAX_SIZE=1000)
+    def test_size_limit(self):
+        response = self.client.post('/api/submissions/', {
+            'task': self.task.pk, 'file': SimpleUploadedFile('work.bin', self.data),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 413)
+        response = self.client.post('/api/uploads/', {'filename': 'a.bin', 'size': 1001}, format='json')
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_chunked_upload_attaches_file(self):
+        upload_id = self.start(checksum=hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(self.put(upload_id, 0, 4095).json()['received'], 4096)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').json()['received'], 4096)
+        done = self.put(upload_id, 4096, len(self.data) - 1).json()
+        self.assertTrue(done['completed'])
+        self.assertEqual(done['sha256'], hashlib.sha256(self.data).hexdigest())
+
+        response = self.client.post('/api/submissions/', {'task': self.task.pk, 'upload': upload_id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        with Submission.objects.get(pk=response.json()['id']).file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.data)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(self.left(), [])
+        # одну загрузку нельзя прикрепить дважды
+        response = self.client.post('/api/submissions/', {'task': self.task.pk, 'upload': upload_id}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_out_of_order_chunk_conflicts(self):
+        upload_id = self.start()
+        self.put(upload_id, 0, 1023)
+        for start, end in ((2048, 3071), (0, 1023)):
+            response = self.put(upload_id, start, end)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()['received'], 1024)
+        self.assertEqual(self.put(upload_id, 1024, 1029, b'short').status_code, 400)
+        self.assertEqual(self.put(upload_id, 1024, 2047).json()['received'], 2048)
+
+    def test_checksum_mismatch_drops_upload(self):
+        upload_id = self.start(checksum='0' * 64)
+        response = self.put(upload_id, 0, len(self.data) - 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('checksum', response.json())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(self.left(), [])
+
+    def test_other_user_cannot_touch_upload(self):
+        upload_id = self.start()
+        other = client_for(make_students(1, prefix='other')[0])
+        self.assertEqual(other.get(f'/api/uploads/{upload_id}/').status_code, 404)
+        response = other.generic(
+            'PUT', f'/api/uploads/{upload_id}/', self.data[:10], content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-9/{len(self.data)}',
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_cleanup_removes_stale_uploads(self):
+        stale, fresh = self.start(), self.start()
+        UploadSession.objects.filter(pk=stale).update(
+            updated_at=datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        )
+        orphan = os.path.join(self.uploads, 'tmpabc.upload')
+        open(orphan, 'wb').close()
+        old = time.time() - 48 * 3600
+        os.utime(orphan, (old, old))
+
+        out = StringIO()
+        call_command('cleanup_uploads', stdout=out)
+        self.assertEqual([str(pk) for pk in UploadSession.objects.values_list('pk', flat=True)], [fresh])
+        self.assertEqual(self.left(), [f'{fresh}.part'])
+
+
+def docx_bytes(body):
+    """Минимальный .docx: только word/document.xml с телом body."""
+    xml = (
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{body}</w:body></w:document>'
+    )
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        zf.writestr('word/document.xml', xml)
+    return buf.getvalue()
+
+
+class IngestTests(SimpleTestCase):
+
+    docx = docx_bytes(
+        '<w:p><w:r><w:t>Метод k-средних</w:t></w:r><w:r><w:t> делит выборку</w:t></w:r></w:p>'
+        '<w:p/>'
+        '<w:p><w:r><w:t>Центроид</w:t><w:tab/><w:t>кластера</w:t><w:br/><w:t>пересчитывается</w:t></w:r></w:p>'
+    )
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_docx_paragraphs(self):
+        for source in (self.write('lab.docx', self.docx), SimpleUploadedFile('lab.docx', self.docx)):
+            with self.subTest(source=type(source).__name__):
+                doc = parse_document(source)
+                self.assertEqual(
+                    doc.paragraphs, ['Метод k-средних делит выборку', 'Центроид\tкластера\nпересчитывается']
+                )
+                self.assertEqual(doc.word_count, 7)
+                self.assertEqual(doc.text, '\n'.join(doc.paragraphs))
+                self.assertEqual(list(doc.iter_tokens())[:3], ['метод', 'k', 'средних'])
+
+    def test_text_file(self):
+        data = 'Первый абзац.\n\n  Второй   абзац  \n'.encode('utf-8')
+        for source in (self.write('notes.txt', data), SimpleUploadedFile('notes.txt', data)):
+            with self.subTest(source=type(source).__name__):
+                doc = parse_document(source)
+                self.assertEqual(doc.paragraphs, ['Первый абзац.', 'Второй   абзац'])
+                self.assertEqual(doc.word_count, 4)
+
+    def test_name_overrides_extension(self):
+        doc = parse_document(SimpleUploadedFile('upload.bin', self.docx), name='lab.docx')
+        self.assertEqual(doc.word_count, 7)
+        self.assertIs(parse_document(doc), doc)
+
+    def test_broken_docx(self):
+        for data in (b'not a zip', self.docx_without_body()):
+            with self.subTest(data=data[:10]):
+                with self.assertRaises(DocumentError):
+                    parse_document(SimpleUploadedFile('lab.docx', data))
+
+    @staticmethod
+    def docx_without_body():
+        buf = BytesIO()
+        with zipfile.ZipFile(buf, 'w') as zf:
+            zf.writestr('word/styles.xml', '<styles/>')
+        return buf.getvalue()
+
+    def test_check_file_basic(self):
+        path = self.write('lab.docx', self.docx)
+        self.assertTrue(check_file_basic(path, 7, ['k-средних', 'ЦЕНТРОИД']))
+        self.assertFalse(check_file_basic(path, 8, []))
+        self.assertFalse(check_file_basic(path, 1, ['дендрограмма']))
+        text = self.write('notes.txt', 'центроид кластера'.encode('utf-8'))
+        self.assertTrue(check_file_basic(text, 2, ['центроид']))
+        self.assertTrue(check_file_basic(ParsedDocument(['центроид']), 1, []))
+
+    def test_check_file_basic_unreadable(self):
+        broken = self.write('lab.docx', b'not a zip')
+        missing = os.path.join(self.dir, 'missing.txt')
+        for source in (broken, missing):
+            with self.subTest(source=os.path.basename(source)):
+                self.assertFalse(check_file_basic(source, 1, []))
+                self.assertTrue(check_file_basic(source, 0, []))
+
+
+def at(hour, minute=0):
+    return datetime.datetime(2026, 1, 12, hour, minute)
+
+
+class EarliestGapTests(SimpleTestCase):
+    """_earliest_gap на слитых интервалах: starts/ends отсортированы."""
+
+    delta = datetime.timedelta(minutes=15)
+
+    def gap(self, busy, window=(at(9), at(10)), delta=None):
+        starts = [start for start, _ in busy]
+        ends = [end for _, end in busy]
+        return _earliest_gap(starts, ends, *window, delta or self.delta)
+
+    def test_free_window_starts_at_opening(self):
+        self.assertEqual(self.gap([]), at(9))
+
+    def test_gap_that_fits_exactly(self):
+        self.assertEqual(self.gap([(at(9), at(9, 30)), (at(9, 45), at(10))]), at(9, 30))
+
+    def test_too_small_gap_is_skipped(self):
+        busy = [(at(9), at(9, 20)), (at(9, 30), at(9, 40))]
+        self.assertEqual(self.gap(busy), at(9, 40))
+
+    def test_busy_before_window_start(self):
+        self.assertEqual(self.gap([(at(8), at(9, 10))]), at(9, 10))
+        self.assertEqual(self.gap([(at(8), at(8, 30))]), at(9))
+
+    def test_no_room_left(self):
+        self.assertIsNone(self.gap([(at(9), at(9, 50))]))
+        self.assertEqual(self.gap([(at(9), at(9, 45))]), at(9, 45))
+
+
+class NearestDefenseSlotTests(TestCase):
+
+    def test_overlapping_defenses_of_different_length(self):
+        teacher = make_teacher()
+        today = datetime.date.today()
+        tomorrow = today + datetime.timedelta(days=1)
+        make_window(teacher, day=today, end=(10, 0))
+        make_window(teacher, day=tomorrow, end=(10, 0))
+        # 9:00–9:30 и 9:10–9:50 пересекаются: занято до 9:50
+        make_defense(teacher, today, (9, 0), 30)
+        make_defense(teacher, today, (9, 10), 40)
+
+        self.assertEqual(find_nearest_defense_slot(teacher, 10), (today, datetime.time(9, 50)))
+        # 15 минут сегодня не влезают — окно занято, поиск уходит на завтра
+        self.assertEqual(find_nearest_defense_slot(teacher, 15), (tomorrow, datetime.time(9, 0)))
+        self.assertIsNone(find_nearest_defense_slot(teacher, 90))
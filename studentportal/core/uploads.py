@@ -0,0 +1,251 @@
+"""
+Потоковая загрузка файлов.
+
+1. StreamingUploadHandler — обработчик Django для обычных multipart-запросов.
+   Пишет файл сразу на диск в UPLOAD_TEMP_DIR, без буфера в памяти, по пути
+   считает SHA-256 (file.sha256) и обрывает загрузку больше UPLOAD_MAX_SIZE.
+   Каталог лежит внутри MEDIA_ROOT, поэтому FileField.save() переносит файл
+   os.rename-ом, а не копирует.
+2. UploadSession — докачиваемая загрузка кусками:
+     POST   /api/uploads/      {filename, size[, checksum]} -> id
+     PUT    /api/uploads/<id>/ тело куска + Content-Range: bytes start-end/total
+     GET    /api/uploads/<id>/ сколько уже принято (с какого байта продолжать)
+     DELETE /api/uploads/<id>/ отменить
+   Куски дописываются в <id>.part. Готовый файл прикрепляется к сдаче или
+   проверке документа полем upload=<id> — тоже переносом, без копии.
+"""
+import datetime
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.generics import get_object_or_404
+
+from .models import UploadSession
+
+READ_BLOCK = 64 * 1024
+# сколько кусок может «висеть» на записи, прежде чем его место отдадут повтору
+CHUNK_LEASE = datetime.timedelta(minutes=10)
+
+_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Файл слишком большой."
+    default_code = 'upload_too_large'
+
+
+class UploadConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Кусок не совпадает с уже принятыми данными."
+    default_code = 'upload_conflict'
+
+    def __init__(self, received):
+        super().__init__()
+        # с этого байта клиенту нужно продолжить
+        self.received = received
+
+
+def max_upload_size():
+    return getattr(settings, 'UPLOAD_MAX_SIZE', 256 * 1024 * 1024)
+
+
+def upload_dir():
+    path = settings.UPLOAD_TEMP_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(READ_BLOCK), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class StreamingUploadHandler(TemporaryFileUploadHandler):
+    """Загрузка сразу во временный файл с SHA-256 и лимитом размера."""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # заведомо слишком большой запрос отклоняем, не читая тело
+        # (запас на заголовки multipart и остальные поля формы)
+        if content_length and content_length > max_upload_size() + 1024 * 1024:
+            raise UploadTooLarge()
+
+    def new_file(self, *args, **kwargs):
+        upload_dir()
+        super().new_file(*args, **kwargs)
+        self.sha = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > max_upload_size():
+            # NamedTemporaryFile удаляется при закрытии
+            self.file.close()
+            raise UploadTooLarge()
+        self.sha.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.sha.hexdigest()
+        return file
+
+
+class CompletedUpload(File):
+    """
+    Завершённая UploadSession как файл Django. temporary_file_path() даёт
+    FileSystemStorage перенести .part на место, как TemporaryUploadedFile.
+    """
+
+    def __init__(self, session):
+        super().__init__(open(session.part_path, 'rb'), name=session.filename)
+        self.session = session
+        self.size = session.size
+        self.sha256 = session.sha256
+
+    def temporary_file_path(self):
+        return self.session.part_path
+
+    def release(self):
+        """Закрывает файл и удаляет сессию (вместе с .part, если его не перенесли)."""
+        self.close()
+        self.session.delete()
+
+
+def claim_upload(user, upload_id):
+    try:
+        session = UploadSession.objects.get(pk=upload_id, user=user, completed=True)
+    except UploadSession.DoesNotExist:
+        raise ValidationError({'upload': "Загрузка не найдена или ещё не завершена."})
+    return CompletedUpload(session)
+
+
+def create_session(user, filename, size, checksum=''):
+    if size > max_upload_size():
+        raise UploadTooLarge()
+    session = UploadSession.objects.create(
+        user=user, filename=os.path.basename(filename), size=size, checksum=checksum.lower()
+    )
+    upload_dir()
+    open(session.part_path, 'wb').close()
+    return session
+
+
+# SHA-256 незавершённых сессий этого процесса: {id: (принято байт, hasher)}.
+# Если следующий кусок попал в другой воркер или после рестарта, хэш
+# досчитывается одним чтением .part при завершении.
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+MAX_HASHERS = 256
+
+
+def _take_hasher(session_id, offset):
+    with _hashers_lock:
+        entry = _hashers.pop(session_id, None)
+    if offset == 0:
+        return hashlib.sha256()
+    if entry is not None and entry[0] == offset:
+        return entry[1]
+    return None
+
+
+def _keep_hasher(session_id, offset, hasher):
+    if hasher is None:
+        return
+    with _hashers_lock:
+        _hashers[session_id] = (offset, hasher)
+        while len(_hashers) > MAX_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def parse_content_range(header, content_length):
+    match = _RANGE_RE.match(header or '')
+    if match is None:
+        raise ValidationError({'Content-Range': "Ожидается заголовок вида bytes start-end/total."})
+    start, end, total = map(int, match.groups())
+    if end < start or end + 1 - start != content_length:
+        raise ValidationError({'Content-Range': "Диапазон не совпадает с длиной тела запроса."})
+    return start, end, total
+
+
+def append_chunk(user, upload_id, stream, content_range, content_length):
+    """
+    Дописывает кусок в .part. Куски принимаются строго по порядку: start должен
+    совпадать с уже принятым числом байт, иначе 409 с актуальным received.
+    """
+    max_chunk = getattr(settings, 'UPLOAD_CHUNK_MAX_SIZE', 16 * 1024 * 1024)
+    if content_length > max_chunk:
+        raise UploadTooLarge(f"Кусок больше {max_chunk} байт.")
+    start, end, total = parse_content_range(content_range, content_length)
+
+    session = get_object_or_404(UploadSession, user=user, pk=upload_id)
+    if total != session.size or end >= session.size:
+        raise ValidationError({'Content-Range': f"Размер файла — {session.size} байт."})
+
+    # берём аренду на запись куска коротким UPDATE-ом, а не держим транзакцию
+    # открытой, пока тело запроса идёт по сети: второй PUT того же места
+    # (повтор, другой воркер) получит 409
+    now = timezone.now()
+    claimed = UploadSession.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+        pk=session.pk, received=start, completed=False,
+    ).update(locked_until=now + CHUNK_LEASE)
+    if not claimed:
+        session.refresh_from_db(fields=['received'])
+        raise UploadConflict(session.received)
+
+    hasher = _take_hasher(session.pk, start)
+    written = 0
+    try:
+        with open(session.part_path, 'r+b') as fh:
+            fh.seek(start)
+            try:
+                while written < content_length:
+                    block = stream.read(min(READ_BLOCK, content_length - written))
+                    if not block:
+                        break
+                    fh.write(block)
+                    if hasher is not None:
+                        hasher.update(block)
+                    written += len(block)
+            finally:
+                if written != content_length:
+                    # оборванный кусок не должен остаться в файле
+                    fh.truncate(start)
+    finally:
+        received = end + 1 if written == content_length else start
+        UploadSession.objects.filter(pk=session.pk).update(
+            received=received, locked_until=None, updated_at=timezone.now()
+        )
+    if written != content_length:
+        raise ValidationError({'detail': "Кусок получен не полностью, повторите его."})
+
+    session.received = received
+    if session.received < session.size:
+        _keep_hasher(session.pk, session.received, hasher)
+        return session
+    return _complete(session, hasher)
+
+
+def _complete(session, hasher):
+    digest = hasher.hexdigest() if hasher is not None else file_sha256(session.part_path)
+    if session.checksum and session.checksum != digest:
+        session.delete()
+        raise ValidationError({'checksum': "Контрольная сумма не совпала, загрузите файл заново."})
+    session.sha256 = digest
+    session.completed = True
+    session.save(update_fields=['sha256', 'completed', 'updated_at'])
+    return session
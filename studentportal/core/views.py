@@ -1,26 +1,36 @@
-from rest_framework import viewsets, permissions, status, filters
+from datetime import date, timedelta
+
+from rest_framework import viewsets, permissions, status, filters, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch, Q
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.exceptions import PermissionDenied
-from .filters import CourseFilter
+from .filters import CourseFilter, TeacherScheduleFilter
+from .search import FullTextSearchFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.exceptions import PermissionDenied, ValidationError
-from datetime import datetime, date
 from .models import Appointment
 from .serializers import AppointmentSerializer, AppointmentInfoSerializer
 from .models import (
     Course, Task, TeacherSchedule,
-    Submission, DefenseQueue, Topic
+    Submission, DefenseQueue, Topic, ScheduleRecurrence, UploadSession
 )
 from .serializers import (
-    UserSerializer, CourseSerializer, TaskSerializer,
-    TeacherScheduleSerializer, SubmissionSerializer, DefenseQueueSerializer, RegisterSerializer, TopicSerializer
+    UserPublicSerializer, UserProfileSerializer, CourseSerializer, TaskSerializer,
+    TeacherScheduleSerializer, SubmissionSerializer, DefenseQueueSerializer, RegisterSerializer, TopicSerializer,
+    ScheduleRecurrenceSerializer, OccurrenceSerializer, UploadSessionSerializer, requested_fields
 )
+from .admission import get_admission_queue, get_ticket
+from .bulk import RowErrors, import_schedules, import_tasks, read_rows
+from .uploads import UploadConflict, append_chunk, create_session
 from .services import (
-    check_file_basic, find_nearest_defense_slot, calculate_max_students_per_day
+    check_file_basic, find_nearest_defense_slot, calculate_max_students_per_day,
+    book_appointment, expand_occurrences, materialize_occurrence, recurrence_horizon
 )
 
 User = get_user_model()
@@ -34,7 +44,7 @@ class IsAdminOrReadOnly(permissions.BasePermission):
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
-    serializer_class = UserSerializer
+    serializer_class = UserPublicSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_permissions(self):
@@ -45,7 +55,9 @@ class UserViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'create':
             return RegisterSerializer
-        return UserSerializer
+        if self.action in ('update', 'partial_update'):
+            return UserProfileSerializer
+        return UserPublicSerializer
     
     @action(detail=False, methods=['GET'])
     def me(self, request):
@@ -58,19 +70,21 @@ class CourseViewSet(viewsets.ModelViewSet):
     GET    /api/courses/me/       — личный кабинет преподавателя: только его курсы
     POST   /api/courses/          — создать курс (только teacher)
     """
-    queryset = Course.objects.all()
+    queryset = Course.objects.select_related('teacher')
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     filter_backends = [
         DjangoFilterBackend,
-        filters.SearchFilter,
         filters.OrderingFilter,
+        # после OrderingFilter: без ?ordering= сортирует по релевантности
+        FullTextSearchFilter,
     ]
     filterset_class = CourseFilter
     search_fields = ['title', 'description']
-    ordering_fields = ['title', 'hours', 'date']
-    ordering = ['-date']
+    ordering_fields = ['title', 'hours', 'date', 'id']
+    # id в конце — уникальная позиция для курсорной пагинации (индекс course_date_id_idx)
+    ordering = ['-date', '-id']
 
     def perform_create(self, serializer):
         if self.request.user.role != 'teacher':
@@ -83,11 +97,10 @@ class CourseViewSet(viewsets.ModelViewSet):
         /api/courses/me/ — возвращает только курсы, где teacher == request.user.
         Применяет фильтры / поиск / пагинацию так же, как и обычный list.
         """
-        if request.user.role != 'teacher':
-            # можно возвращать пустой список или 403, на ваше усмотрение
-            return Response([], status=200)
-
         qs = self.get_queryset().filter(teacher=request.user)
+        if request.user.role != 'teacher':
+            # не преподаватель — пустая страница той же формы, что и у list
+            qs = qs.none()
         qs = self.filter_queryset(qs)
 
         page = self.paginate_queryset(qs)
@@ -102,14 +115,34 @@ class CourseViewSet(viewsets.ModelViewSet):
 class TeacherScheduleViewSet(viewsets.ModelViewSet):
     queryset = (
         TeacherSchedule.objects
-        .all()
-        .prefetch_related('appointments__student')  # чтобы избежать N+1 на вложенных студентах
+        .select_related('teacher')
+        # чтобы избежать N+1 на вложенных студентах и позициях в очереди
+        .prefetch_related(Prefetch(
+            'appointments',
+            queryset=Appointment.objects.with_position().select_related('student'),
+        ))
     )
     serializer_class = TeacherScheduleSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    filter_backends = [
+        DjangoFilterBackend,
+        filters.OrderingFilter,
+    ]
+    filterset_class = TeacherScheduleFilter
+    ordering_fields = [
+        'date', 'start_time', 'duration_minutes',
+        'max_slots', 'appointments_count', 'available_slots',
+    ]
+    ordering = ['date', 'start_time']
+
     def get_queryset(self):
-        qs = super().get_queryset()
+        # вместимость считается в БД: ?has_free_slots=true, ?ordering=-available_slots
+        qs = super().get_queryset().with_capacity()
+        fields = requested_fields(self.request)
+        if fields is not None and 'appointments' not in fields:
+            # ?fields= без appointments — записи не нужны вовсе
+            qs = qs.prefetch_related(None)
         if self.request.user.role == 'teacher':
             return qs.filter(teacher=self.request.user)
         return qs
@@ -119,13 +152,36 @@ class TeacherScheduleViewSet(viewsets.ModelViewSet):
             raise PermissionError("Только преподаватель может создать расписание.")
         serializer.save(teacher=self.request.user)
 
+    def perform_update(self, serializer):
+        serializer.save()
+        # аннотации with_capacity() у объекта остались от старых времён окна:
+        # перечитываем, чтобы ответ показывал новую вместимость
+        serializer.instance = self.get_queryset().get(pk=serializer.instance.pk)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Массовое создание окон: JSON-список или файл CSV/XLSX в поле file
+        (колонки title, date, start_time, end_time). Всё или ничего.
+        """
+        if request.user.role != 'teacher':
+            raise PermissionDenied("Только преподаватель может создать расписание.")
+        try:
+            created = import_schedules(request.user, read_rows(request))
+        except RowErrors as e:
+            return Response({'rows': e.rows}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {'created': len(created), 'ids': [obj.pk for obj in created]},
+            status=status.HTTP_201_CREATED
+        )
+
     @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def appointments(self, request, pk=None):
         """
         Список всех записей (очереди) для конкретного окна.
         """
         schedule = self.get_object()
-        qs = schedule.appointments.select_related('student')
+        qs = schedule.appointments.with_position().select_related('student')
         serializer = AppointmentSerializer(qs, many=True)
         return Response(serializer.data)
 
@@ -137,29 +193,43 @@ class TeacherScheduleViewSet(viewsets.ModelViewSet):
         if request.user.role != 'student':
             raise PermissionDenied("Только студент может записаться.")
         schedule = self.get_object()
-        # проверка наличия свободных мест
-        slot_minutes = 15
-        start_dt = datetime.combine(date.today(), schedule.start_time)
-        end_dt   = datetime.combine(date.today(), schedule.end_time)
-        total_min = (end_dt - start_dt).total_seconds() / 60
-        max_slots = int(total_min // slot_minutes)
-        if schedule.appointments.count() >= max_slots:
-            raise ValidationError("В этом окне нет свободных мест.")
-        # создаём запись (или возвращаем ошибку, если уже есть)
-        appt, created = Appointment.objects.get_or_create(
-            schedule=schedule,
-            student=request.user
-        )
-        if not created:
-            return Response(
-                {"detail": "Вы уже записаны на это окно."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        if getattr(settings, 'APPOINTMENT_ADMISSION_QUEUE', False):
+            # режим открытия окна: заявка встаёт в очередь, позицию выдаёт единый писатель
+            admission = get_admission_queue()
+            ticket = admission.submit(schedule.pk, request.user.pk)
+            data = admission.wait(ticket, getattr(settings, 'APPOINTMENT_ADMISSION_WAIT', 2.0))
+            return self.ticket_response(ticket, data)
+        # место резервируется атомарно, повторный запрос вернёт ту же запись
+        try:
+            appt, created = book_appointment(schedule, request.user)
+        except DjangoValidationError as e:
+            raise ValidationError(e.messages)
         return Response(
             AppointmentSerializer(appt).data,
-            status=status.HTTP_201_CREATED
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
         )
 
+    @action(detail=False, methods=['get'], url_path=r'signup-tickets/(?P<ticket>[0-9a-f-]+)')
+    def signup_ticket(self, request, ticket=None):
+        """
+        Результат заявки, поставленной в очередь signup (если она не успела
+        обработаться за время ожидания запроса).
+        """
+        data = get_ticket(ticket)
+        if data is None or data['student'] != request.user.pk:
+            return Response({"detail": "Заявка не найдена."}, status=status.HTTP_404_NOT_FOUND)
+        return self.ticket_response(ticket, data)
+
+    def ticket_response(self, ticket, data):
+        statuses = {
+            'queued': status.HTTP_202_ACCEPTED,
+            'booked': status.HTTP_201_CREATED,
+            'duplicate': status.HTTP_200_OK,
+            'full': status.HTTP_400_BAD_REQUEST,
+            'error': status.HTTP_400_BAD_REQUEST,
+        }
+        return Response({'ticket': ticket, **data}, status=statuses[data['status']])
+
     @action(detail=True, methods=['delete'], permission_classes=[permissions.IsAuthenticated])
     def cancel_signup(self, request, pk=None):
         """
@@ -176,10 +246,85 @@ class TeacherScheduleViewSet(viewsets.ModelViewSet):
         appt.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+def parse_date_param(data, name, default=None):
+    value = data.get(name) or default
+    if value is None:
+        raise ValidationError({name: "Это поле обязательно."})
+    try:
+        return serializers.DateField().to_internal_value(value)
+    except ValidationError as e:
+        raise ValidationError({name: e.detail})
+
+
+class ScheduleRecurrenceViewSet(viewsets.ModelViewSet):
+    """
+    Повторяющиеся окна преподавателя. Вхождения не хранятся:
+    GET occurrences/ разворачивает их на запрошенный период,
+    POST <id>/signup/ создаёт окно на дату только при записи.
+    """
+    queryset = ScheduleRecurrence.objects.select_related('teacher')
+    serializer_class = ScheduleRecurrenceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.request.user.role == 'teacher':
+            return qs.filter(teacher=self.request.user)
+        return qs
+
+    def perform_create(self, serializer):
+        if self.request.user.role != 'teacher':
+            raise PermissionDenied("Только преподаватель может создать расписание.")
+        serializer.save(teacher=self.request.user)
+
+    @action(detail=False, methods=['get'])
+    def occurrences(self, request):
+        """
+        ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD[&teacher=<id>] — окна по шаблонам
+        за период (по умолчанию четыре недели от сегодня).
+        """
+        date_from = parse_date_param(request.query_params, 'date_from', date.today())
+        date_to = parse_date_param(request.query_params, 'date_to', date_from + timedelta(days=27))
+        if date_to < date_from or (date_to - date_from).days > recurrence_horizon():
+            raise ValidationError({'date': f"Период должен быть не длиннее {recurrence_horizon()} дней."})
+
+        qs = self.get_queryset().filter(
+            Q(until__isnull=True) | Q(until__gte=date_from), start_date__lte=date_to
+        )
+        teacher = request.query_params.get('teacher')
+        if teacher:
+            qs = qs.filter(teacher_id=teacher)
+        items = expand_occurrences(qs, date_from, date_to)
+        return Response(OccurrenceSerializer(items, many=True).data)
+
+    @action(detail=True, methods=['post'])
+    def signup(self, request, pk=None):
+        """
+        Записаться на вхождение шаблона: {"date": "YYYY-MM-DD"}.
+        """
+        if request.user.role != 'student':
+            raise PermissionDenied("Только студент может записаться.")
+        recurrence = self.get_object()
+        day = parse_date_param(request.data, 'date')
+        try:
+            schedule = materialize_occurrence(recurrence, day)
+            appt, created = book_appointment(schedule, request.user)
+        except DjangoValidationError as e:
+            raise ValidationError(e.messages)
+        return Response(
+            {'schedule': schedule.pk, **AppointmentSerializer(appt).data},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+
 class TaskViewSet(viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
+    filterset_fields = ['topic', 'topic__course']
+    search_fields = ['title', 'description']
+
     def get_queryset(self):
         return super().get_queryset()
 
@@ -190,10 +335,30 @@ class TaskViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("Нельзя создавать задачи не в своих темах.")
         serializer.save()
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Массовое создание задач без файлов: JSON-список или CSV/XLSX
+        (колонки topic, title, description, min_words, expected_defense_time).
+        """
+        if request.user.role != 'teacher':
+            raise PermissionDenied("Только преподаватель может создавать задачи.")
+        try:
+            created = import_tasks(request.user, read_rows(request))
+        except RowErrors as e:
+            return Response({'rows': e.rows}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {'created': len(created), 'ids': [obj.pk for obj in created]},
+            status=status.HTTP_201_CREATED
+        )
+
 
 class TopicViewSet(viewsets.ModelViewSet):
     queryset = Topic.objects.all()        
     serializer_class = TopicSerializer
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
+    filterset_fields = ['course']
+    search_fields = ['title', 'description']
 
     def get_queryset(self):
         return super().get_queryset()
@@ -210,7 +375,8 @@ class SubmissionViewSet(viewsets.ModelViewSet):
     """
     - Студенты могут создавать свои Submission (файл) — при создании автоматически ставится статус 'waiting_for_check'.
     - Студенты видят только свои Submission.
-    - Преподаватели видят все Submission по курсам, которые они ведут, со статусом 'waiting_for_check'.
+    - Преподаватели видят все Submission по курсам, которые они ведут;
+      ждущие проверки — в /api/submissions/inbox/.
     - Преподаватели могут обновлять статус (например, на 'approved' или 'rejected').
     """
     serializer_class = SubmissionSerializer
@@ -218,7 +384,7 @@ class SubmissionViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        qs = Submission.objects.all()
+        qs = Submission.objects.select_related('student')
 
         # если передан ?task=ID — сразу отфильтруем по нему
         task_id = self.request.query_params.get('task')
@@ -230,8 +396,9 @@ class SubmissionViewSet(viewsets.ModelViewSet):
             return qs.filter(student=user)
 
         # преподаватель видит только сабмишны к своим курсам
+        # (teacher — денормализованный task.topic.course.teacher, без JOIN-ов)
         if user.role == 'teacher':
-            return qs.filter(task__topic__course__teacher=user)
+            return qs.filter(teacher=user)
 
         # остальные не видят ничего
         return Submission.objects.none()
@@ -242,6 +409,32 @@ class SubmissionViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("Только студенты могут отправлять Submission.")
         serializer.save(student=user, status='waiting_for_check')
 
+    @action(detail=False, methods=['get'])
+    def inbox(self, request):
+        """
+        GET /api/submissions/inbox/?status=waiting_for_check[&course=ID][&task=ID]
+        Входящие преподавателя, старые первыми. Для статуса по умолчанию
+        это один проход по частичному индексу submission_inbox_idx.
+        """
+        if request.user.role != 'teacher':
+            raise PermissionDenied("Входящие доступны только преподавателю.")
+
+        qs = self.get_queryset().filter(
+            status=request.query_params.get('status', 'waiting_for_check')
+        )
+        course_id = request.query_params.get('course')
+        if course_id is not None:
+            qs = qs.filter(course_id=course_id)
+        qs = qs.order_by('created_at', 'id')
+
+        page = self.paginate_queryset(qs)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(qs, many=True)
+        return Response(serializer.data)
+
 
 class DefenseQueueViewSet(viewsets.ModelViewSet):
     queryset = DefenseQueue.objects.all()
@@ -286,12 +479,33 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.role == 'student':
             # студент видит только свою очередь
-            return user.appointments.select_related('schedule')
+            # (окна в выборке неполные, поэтому позиция считается подзапросом)
+            return (
+                user.appointments.with_position(partial=True)
+                .select_related('schedule', 'student')
+            )
         if user.role == 'teacher':
             # преподаватель — всех, кто записался на его расписания
-            return Appointment.objects.filter(schedule__teacher=user)
-        # остальным (напр. админам) — всё
-        return super().get_queryset()
+            qs = Appointment.objects.filter(schedule__teacher=user)
+        else:
+            # остальным (напр. админам) — всё
+            qs = super().get_queryset()
+        # ROW_NUMBER() верен только на полных окнах: в detail-роутах выборка
+        # сужается до одной записи, а на следующих страницах курсор отсекает
+        # начало окон — там позиция считается подзапросом
+        partial = self.action != 'list' or self.paginator.cursor_query_param in self.request.query_params
+        return qs.with_position(partial=partial).select_related('student')
+
+    def create(self, request, *args, **kwargs):
+        # повторная запись в то же окно — 200 с существующей записью, как в signup
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        created = self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+        return Response(
+            serializer.data, headers=headers,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -299,20 +513,50 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("Только студент может записаться в очередь.")
         schedule_id = self.request.data.get('schedule')
         schedule = get_object_or_404(TeacherSchedule, id=schedule_id)
-        # проверка на свободные места (валидируется ещё в clean(), но лучше заранее)
-        slot_minutes = 15
-        duration = (
-            datetime.combine(date.today(), schedule.end_time)
-            - datetime.combine(date.today(), schedule.start_time)
-        ).total_seconds() / 60
-        max_slots = int(duration // slot_minutes)
-        if schedule.appointments.count() >= max_slots:
-            raise ValidationError("В очереди нет свободных мест.")
-        # сохраняем, привязывая текущего пользователя
-        serializer.save(student=user)
+        # проверка мест и создание — одной транзакцией (см. book_appointment)
+        try:
+            serializer.instance, created = book_appointment(schedule, user)
+        except DjangoValidationError as e:
+            raise ValidationError(e.messages)
+        return created
 
     def perform_destroy(self, instance):
         # студент может выйти только из своей очереди
         if instance.student != self.request.user:
             raise PermissionDenied("Нельзя убрать чужую запись.")
-        instance.delete()
\ No newline at end of file
+        instance.delete()
+
+class UploadSessionViewSet(viewsets.mixins.CreateModelMixin,
+                           viewsets.mixins.RetrieveModelMixin,
+                           viewsets.mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    POST   /api/uploads/      — начать загрузку: {filename, size[, checksum]}
+    PUT    /api/uploads/<id>/ — очередной кусок (тело + Content-Range)
+    GET    /api/uploads/<id>/ — сколько принято, с какого байта продолжать
+    DELETE /api/uploads/<id>/ — отменить загрузку
+    Готовый файл передаётся как upload=<id> в /api/submissions/ или /api/doc-review/.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = create_session(
+            self.request.user, data['filename'], data['size'], data.get('checksum', '')
+        )
+
+    def update(self, request, pk=None):
+        # тело не разбирается парсерами DRF, а читается потоком прямо в .part
+        try:
+            session = append_chunk(
+                request.user, pk, request.stream,
+                request.META.get('HTTP_CONTENT_RANGE'),
+                int(request.META.get('CONTENT_LENGTH') or 0),
+            )
+        except UploadConflict as e:
+            return Response({'detail': e.detail, 'received': e.received}, status=e.status_code)
+        return Response(self.get_serializer(session).data)
@@ -1,3 +1,5 @@
 from django.contrib import admin
 
-# Register your models here.
+from neurocheck.models import DocumentReviewJob
+
+admin.site.register(DocumentReviewJob)
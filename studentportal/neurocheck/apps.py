@@ -1,6 +1,33 @@
+import atexit
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class NeurocheckConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'neurocheck'
+
+    def ready(self):
+        # стоп-слова, регулярки и MorphAnalyzer: сразу при старте процесса
+        # или лениво при первом запросе (NEUROCHECK_NLP_PRELOAD = False)
+        # (ошибка загрузки не должна ронять процесс — тогда повторим при первом запросе)
+        if getattr(settings, 'NEUROCHECK_NLP_PRELOAD', True):
+            from .nlp import get_resources
+            try:
+                get_resources()
+            except Exception as e:
+                logger.warning("Не удалось загрузить NLP-ресурсы при старте: %s", e)
+
+        from .extract_keywords import lemma_cache, load_lemma_dict, save_lemma_dict
+        lemma_cache.maxsize = getattr(settings, 'NEUROCHECK_LEMMA_CACHE_SIZE', lemma_cache.maxsize)
+
+        # необязательный словарь лемм на диске: прогреваем кэш при старте
+        # и дописываем выученные леммы при остановке процесса
+        lemma_dict = getattr(settings, 'NEUROCHECK_LEMMA_DICT', None)
+        if lemma_dict:
+            load_lemma_dict(lemma_dict)
+            atexit.register(save_lemma_dict, lemma_dict)
@@ -0,0 +1,82 @@
+"""
+Кэш результатов проверки документов по содержимому файла.
+
+Ключи строятся из SHA-256 загруженных байтов и PROMPT_VERSION:
+  - артефакты (текст, сжатое резюме, ключевые слова) от темы не зависят;
+  - готовый ответ фронтенду дополнительно привязан к теме;
+  - резюме отдельных кусков текста — по SHA-256 самого куска, так что
+    повторная загрузка с парой исправленных абзацев сжимает только их.
+Хранилище — алиас DOC_REVIEW_CACHE из settings.CACHES, так что бэкенд,
+TTL и вытеснение настраиваются там же, где и весь остальной кэш Django.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+# увеличивайте при изменении промптов, чтобы не отдавать старые ответы
+PROMPT_VERSION = 3
+
+
+def _cache():
+    return caches[getattr(settings, 'DOC_REVIEW_CACHE', 'default')]
+
+
+def file_digest(f):
+    """SHA-256 файла: принимает путь или загруженный файл Django (читает по чанкам)."""
+    # core.uploads уже посчитал хэш, пока принимал файл
+    if getattr(f, 'sha256', None):
+        return f.sha256
+    sha = hashlib.sha256()
+    if isinstance(f, str):
+        with open(f, 'rb') as fh:
+            for block in iter(lambda: fh.read(64 * 1024), b''):
+                sha.update(block)
+    else:
+        for chunk in f.chunks():
+            sha.update(chunk)
+        f.seek(0)
+    return sha.hexdigest()
+
+
+def _artefacts_key(digest):
+    return f"doc-review:v{PROMPT_VERSION}:artefacts:{digest}"
+
+
+def _result_key(digest, topic):
+    topic_hash = hashlib.sha256(topic.strip().lower().encode('utf-8')).hexdigest()[:16]
+    return f"doc-review:v{PROMPT_VERSION}:result:{digest}:{topic_hash}"
+
+
+def _chunk_key(chunk_digest):
+    return f"doc-review:v{PROMPT_VERSION}:chunk:{chunk_digest}"
+
+
+def chunk_digest(chunk):
+    return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+
+
+def get_chunk_summaries(digests):
+    """{digest: резюме} для тех кусков, что уже есть в кэше (одним get_many)."""
+    found = _cache().get_many([_chunk_key(d) for d in digests])
+    return {d: found[_chunk_key(d)] for d in digests if _chunk_key(d) in found}
+
+
+def set_chunk_summaries(summaries):
+    _cache().set_many({_chunk_key(d): summary for d, summary in summaries.items()})
+
+
+def get_artefacts(digest):
+    return _cache().get(_artefacts_key(digest))
+
+
+def set_artefacts(digest, artefacts):
+    _cache().set(_artefacts_key(digest), artefacts)
+
+
+def get_result(digest, topic):
+    return _cache().get(_result_key(digest, topic))
+
+
+def set_result(digest, topic, result):
+    _cache().set(_result_key(digest, topic), result)
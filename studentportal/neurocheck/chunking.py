@@ -0,0 +1,125 @@
+"""
+Нарезка текста на куски для промптов LLM с бюджетом в токенах модели.
+
+Куски собираются из целых абзацев; абзац, который сам не влезает в бюджет,
+режется по предложениям, предложение — по словам. Пополам режутся только
+слова длиннее всего бюджета (base64, ссылки). Размер считает токенайзер
+из DOC_REVIEW_TOKENIZER (путь к функции text -> int, например обёртке над
+GigaChat.tokens_count); по умолчанию — approx_tokens, локальная оценка
+без обращения к API.
+
+Границы кусков определяются содержимым (content-defined chunking): набрав
+3/4 бюджета, кусок заканчивается на абзаце или предложении, хэш
+которого попал под порог. Правка в одном месте документа сдвигает только
+соседние границы, остальные куски остаются байт-в-байт прежними, и их
+резюме берутся из кэша (см. services.summarise_chunks).
+"""
+import hashlib
+import math
+import re
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?…])\s+')
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+
+def approx_tokens(text):
+    """
+    Оценка числа токенов BPE-словаря: токен на каждые 4 символа слова
+    (но не меньше одного на слово) и по токену на знак препинания.
+    Русский текст так выходит скорее с запасом — лучше лишний кусок,
+    чем промпт, обрезанный моделью.
+    """
+    return sum(math.ceil(len(tok) / 4) for tok in _TOKEN_RE.findall(text))
+
+
+def get_tokenizer():
+    path = getattr(settings, 'DOC_REVIEW_TOKENIZER', None)
+    return import_string(path) if path else approx_tokens
+
+
+def chunk_budget():
+    return getattr(settings, 'DOC_REVIEW_CHUNK_TOKENS', 2000)
+
+
+def _split_long_word(word, n, budget):
+    step = max(1, len(word) * budget // n)
+    return [word[i:i + step] for i in range(0, len(word), step)]
+
+
+def _split_words(text, budget, count):
+    pieces, current, size = [], [], 0
+    for word in text.split():
+        n = count(word)
+        if n > budget:
+            if current:
+                pieces.append((' '.join(current), size))
+                current, size = [], 0
+            pieces.extend((part, count(part)) for part in _split_long_word(word, n, budget))
+            continue
+        if current and size + n > budget:
+            pieces.append((' '.join(current), size))
+            current, size = [], 0
+        current.append(word)
+        size += n
+    if current:
+        pieces.append((' '.join(current), size))
+    return pieces
+
+
+def _units(paragraph, budget, count):
+    """
+    Абзац целиком или его части — предложения, в крайнем случае группы слов —
+    вместе с размером в токенах.
+    """
+    n = count(paragraph)
+    if n <= budget:
+        return [(paragraph, n)]
+    units = []
+    for sentence in _SENTENCE_RE.split(paragraph):
+        n = count(sentence)
+        if n <= budget:
+            units.append((sentence, n))
+        else:
+            units.extend(_split_words(sentence, budget, count))
+    return units
+
+
+def _is_boundary(unit, n, budget):
+    """
+    Заканчивается ли кусок на этой единице. Решает только её текст, а
+    вероятность пропорциональна её размеру: в среднем граница находится
+    через 1/8 бюджета после минимума, т.е. кусок ~7/8 бюджета.
+    """
+    h = int.from_bytes(hashlib.blake2b(unit.encode('utf-8'), digest_size=8).digest(), 'big')
+    return h < 2 ** 64 * min(1, 8 * n / budget)
+
+
+def chunk_text(text, budget=None, count=None):
+    """
+    Упаковывает абзацы (или их части) в куски не больше budget токенов,
+    заканчивая кусок на границе, выбранной по содержимому (см. _is_boundary),
+    либо принудительно, когда следующая единица не влезает.
+    Абзацы внутри куска разделяются переводом строки.
+    """
+    budget = budget or chunk_budget()
+    count = count or get_tokenizer()
+    chunks, current, size = [], [], 0
+    for paragraph in text.split('\n'):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        for unit, n in _units(paragraph, budget, count):
+            if current and size + n > budget:
+                chunks.append('\n'.join(current))
+                current, size = [], 0
+            current.append(unit)
+            size += n
+            if size >= budget * 3 // 4 and _is_boundary(unit, n, budget):
+                chunks.append('\n'.join(current))
+                current, size = [], 0
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
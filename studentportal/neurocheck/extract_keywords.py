@@ -1,96 +1,222 @@
-import inspect
-
-def _getargspec(func):
-    """Возвращаем ровно (args, varargs, varkw, defaults)."""
-    full = inspect.getfullargspec(func)
-    return (full.args, full.varargs, full.varkw, full.defaults)
-
-inspect.getargspec = _getargspec
-
+import json
+import os
 import re
 import string
-from collections import defaultdict, Counter
+import threading
+import time
+from collections import defaultdict, OrderedDict
+from itertools import compress
+import numpy as np
 from docx import Document
-import nltk
-import pymorphy2
-
-# При первом запуске, если ещё не скачали стоп-слова:
-# nltk.download('stopwords')
-
-from nltk.corpus import stopwords
 
-morph = pymorphy2.MorphAnalyzer()
+try:
+    from .nlp import get_resources
+except ImportError:  # запуск как скрипта: python extract_keywords.py
+    from nlp import get_resources
 
 def load_docx_text(path):
     doc = Document(path)
     return "\n".join(p.text for p in doc.paragraphs)
 
 def rake_extract(text, stop_words):
-    sentences = re.split(r'[.!?]+\s*', text)
-    phrases = []
-    for sent in sentences:
-        tokens = re.findall(r'\b\w+\b', sent.lower())
-        phrase = []
-        for w in tokens:
-            if w in stop_words or w.isdigit() or len(w) == 1:
-                if phrase:
-                    phrases.append(phrase); phrase = []
-            else:
-                phrase.append(w)
-        if phrase:
-            phrases.append(phrase)
-
-    freq = defaultdict(int)
-    degree = defaultdict(int)
-    for phrase in phrases:
-        deg = len(phrase) - 1
-        for word in phrase:
-            freq[word] += 1
-            degree[word] += deg
-    for word in freq:
-        degree[word] += freq[word]
-
-    word_score = {w: degree[w] / freq[w] for w in freq}
-    phrase_score = defaultdict(float)
-    for phrase in phrases:
-        score = sum(word_score[w] for w in phrase)
-        phrase_score[" ".join(phrase)] += score
-
-    return phrase_score, freq
+    """
+    RAKE на массивах: один проход скомпилированной регуляркой, слова -> целые id,
+    частоты/степени/счета фраз через np.bincount. Результат совпадает
+    с прежней реализацией, включая порядок ключей (важен для max() по равным счетам).
+    """
+    tokens = get_resources().rake_re.findall(text.lower())
+    if not tokens:
+        return {}, {}
+
+    # id для каждого различного токена (включая стоп-слова и концы предложений);
+    # dict.fromkeys и map работают на C и сохраняют порядок первого появления
+    vocab = list(dict.fromkeys(tokens))
+    index = {t: i for i, t in enumerate(vocab)}
+    ids = np.fromiter(map(index.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+    # разрывы фраз: концы предложений, стоп-слова, числа, однобуквенные слова
+    is_break = np.fromiter(
+        (t[0] in '.!?' or t in stop_words or t.isdigit() or len(t) == 1 for t in vocab),
+        dtype=bool, count=len(vocab)
+    )
+    breaks = is_break[ids]
+    keep = ~breaks
+    if not keep.any():
+        return {}, {}
+
+    # номер фразы для каждого оставшегося слова: между разрывами — одна фраза
+    phrase_of = np.cumsum(breaks)[keep]
+    _, phrase_of = np.unique(phrase_of, return_inverse=True)
+    word_ids = ids[keep]
+
+    # слова фраз нумеруем заново в порядке первого появления
+    uniq, first = np.unique(word_ids, return_index=True)
+    order = uniq[np.argsort(first)]
+    remap = np.empty(len(vocab), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    word_ids = remap[word_ids]
+    words = [vocab[i] for i in order.tolist()]
+
+    # частота и степень слова: степень = сумма (длина фразы - 1) по вхождениям + частота
+    phrase_len = np.bincount(phrase_of)
+    freq = np.bincount(word_ids, minlength=len(words))
+    degree = np.bincount(word_ids, weights=phrase_len[phrase_of] - 1, minlength=len(words)) + freq
+    word_score = degree / freq
+
+    # счёт фразы = сумма счетов слов; одинаковые фразы складываются
+    per_phrase = np.bincount(phrase_of, weights=word_score[word_ids])
+    kept_tokens = list(compress(tokens, keep.tolist()))
+    ends = np.cumsum(phrase_len).tolist()
+    phrase_score = {}
+    start = 0
+    for end, score in zip(ends, per_phrase.tolist()):
+        key = " ".join(kept_tokens[start:end])
+        phrase_score[key] = phrase_score.get(key, 0.0) + score
+        start = end
+
+    word_freq = dict(zip(words, freq.tolist()))
+    return phrase_score, word_freq
+
+
+def top_k(scores, k):
+    """
+    k лучших пар (ключ, значение) по убыванию значения через частичный отбор
+    (np.partition); при равенстве раньше идёт ключ, вставленный раньше —
+    как у Counter.most_common и max().
+    """
+    if not scores or k <= 0:
+        return []
+    keys = list(scores)
+    values = np.fromiter(scores.values(), dtype=np.float64, count=len(keys))
+    if k < len(keys):
+        kth = np.partition(values, len(keys) - k)[len(keys) - k]
+        candidates = np.flatnonzero(values >= kth)
+    else:
+        candidates = np.arange(len(keys))
+    order = candidates[np.argsort(-values[candidates], kind='stable')][:k]
+    return [(keys[i], scores[keys[i]]) for i in order]
 
 def clean_punct(s: str) -> str:
     return s.translate(str.maketrans('', '', string.punctuation))
 
-def lemmatize(word: str) -> str:
-    return morph.parse(word)[0].normal_form
+class LemmaCache:
+    """
+    Ограниченный LRU-кэш лемм, общий для всего процесса (потокобезопасный).
+    Разбор pymorphy2 — самое дорогое место извлечения ключевых слов,
+    а словарь студенческих работ быстро повторяется.
+    """
+
+    def __init__(self, maxsize=100_000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, word):
+        with self._lock:
+            lemma = self._data.get(word)
+            if lemma is not None:
+                self._data.move_to_end(word)
+            return lemma
+
+    def put(self, word, lemma):
+        with self._lock:
+            self._data[word] = lemma
+            self._data.move_to_end(word)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
 
-def get_keywords_and_topic(docx_path, top_n=10):
-    # nltk.download('stopwords')
-    text = load_docx_text(docx_path)
-    custom = {"шаг","k","к","и","а","но","в","об","о","рисунок","её","ей"}
-    stop_words = set(stopwords.words('russian')) | custom
+    def update(self, mapping):
+        for word, lemma in mapping.items():
+            self.put(word, lemma)
 
-    phrase_score, word_freq = rake_extract(text, stop_words)
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def __len__(self):
+        return len(self._data)
+
+
+lemma_cache = LemmaCache()
+
+
+def lemmatize(word: str) -> str:
+    lemma = lemma_cache.get(word)
+    if lemma is None:
+        lemma = get_resources().morph.parse(word)[0].normal_form
+        lemma_cache.put(word, lemma)
+    return lemma
+
+
+def lemmatize_many(words):
+    """
+    Лемматизирует список токенов целиком: каждое различное слово
+    разбирается не больше одного раза, порядок сохраняется.
+    """
+    lemmas = {}
+    for w in words:
+        if w not in lemmas:
+            lemmas[w] = lemmatize(w)
+    return [lemmas[w] for w in words]
+
+
+def load_lemma_dict(path):
+    """Прогревает кэш словарём лемм, сохранённым save_lemma_dict()."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            lemma_cache.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+
+def save_lemma_dict(path):
+    """Атомарно сохраняет текущий кэш лемм на диск (JSON)."""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(lemma_cache.items()), f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def get_keywords_and_topic(document, top_n=10):
+    """
+    document — путь к .docx или уже разобранный документ
+    (любой объект с атрибутом text, например core.ingest.ParsedDocument).
+    """
+    text = document.text if hasattr(document, 'text') else load_docx_text(document)
+    res = get_resources()
+
+    phrase_score, word_freq = rake_extract(text, res.stop_words)
 
     lemma_freq = defaultdict(int)
-    for w, f in word_freq.items():
-        lemma_freq[lemmatize(w)] += f
+    words = list(word_freq)
+    for w, lemma in zip(words, lemmatize_many(words)):
+        lemma_freq[lemma] += word_freq[w]
 
-    top_words = Counter(lemma_freq).most_common(top_n)
+    top_words = top_k(lemma_freq, top_n)
 
-    raw_topic, _ = max(phrase_score.items(), key=lambda x: x[1])
-    tokens = re.findall(r'\b\w+\b', raw_topic.lower())
-    lemma_topic = " ".join(lemmatize(t) for t in tokens)
+    best = top_k(phrase_score, 1)
+    raw_topic = best[0][0] if best else ""
+    tokens = res.token_re.findall(raw_topic.lower())
+    lemma_topic = " ".join(lemmatize_many(tokens))
 
     return top_words, lemma_topic
 
 if __name__ == "__main__":
     import sys
     if len(sys.argv) < 2:
-        print("Использование: python extract_keywords.py <путь_к_файлу.docx>")
+        print("Использование: python extract_keywords.py <путь_к_файлу.docx> [--bench]")
         sys.exit(1)
 
     path = sys.argv[1]
+
+    if "--bench" in sys.argv:
+        # сравнение холодного и прогретого кэша лемм, слов/сек
+        words = re.findall(r'\b\w+\b', load_docx_text(path).lower())
+        for label in ("cold", "warm"):
+            started = time.perf_counter()
+            lemmatize_many(words)
+            elapsed = time.perf_counter() - started
+            print(f"{label}: {len(words) / elapsed:,.0f} words/sec ({len(words)} words)")
+        sys.exit(0)
+
     keywords, topic = get_keywords_and_topic(path, top_n=10)
 
     print("Тема документа:", topic)
@@ -0,0 +1,204 @@
+"""
+Запуск фоновых проверок документов.
+
+Бэкенд выбирается настройкой DOC_REVIEW_JOB_BACKEND:
+  - 'thread' — общий для процесса пул потоков (по умолчанию);
+  - 'sync'   — выполнение сразу в вызывающем потоке (для тестов и отладки).
+
+Очередь пула живёт только в памяти процесса: после перезапуска его задания
+остаются в pending/running навсегда. Поэтому процесс, пока задание стоит
+в его очереди или выполняется, раз в треть DOC_REVIEW_JOB_TIMEOUT обновляет
+ему updated_at (heartbeat). Задание без отметки дольше DOC_REVIEW_JOB_TIMEOUT
+секунд — значит, его процесса больше нет — помечается failed
+(expire_stale_jobs) при опросе статуса и перед постановкой новых.
+"""
+import datetime
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from .models import DocumentReviewJob
+from .resilience import BUSY_RETRY_AFTER, LLMBusy
+from .services import review_document
+
+logger = logging.getLogger(__name__)
+
+
+def job_timeout():
+    return getattr(settings, 'DOC_REVIEW_JOB_TIMEOUT', 15 * 60)
+
+
+# задания, живые в этом процессе (в очереди пула или в работе)
+_alive = set()
+_alive_lock = threading.Lock()
+_heartbeat = None
+
+
+def touch_alive_jobs():
+    """Отметка «процесс жив» для своих заданий. Возвращает число обновлённых."""
+    with _alive_lock:
+        ids = list(_alive)
+    if not ids:
+        return 0
+    return DocumentReviewJob.objects.filter(pk__in=ids, status__in=ACTIVE_STATUSES).update(
+        updated_at=timezone.now()
+    )
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(job_timeout() / 3)
+        close_old_connections()
+        try:
+            touch_alive_jobs()
+        except Exception:
+            logger.exception("Не удалось обновить отметку заданий проверки")
+        finally:
+            close_old_connections()
+
+
+def track_job(job_id):
+    global _heartbeat
+    with _alive_lock:
+        _alive.add(job_id)
+        if _heartbeat is None or not _heartbeat.is_alive():
+            _heartbeat = threading.Thread(
+                target=_heartbeat_loop, name='doc-review-heartbeat', daemon=True
+            )
+            _heartbeat.start()
+
+
+def untrack_job(job_id):
+    with _alive_lock:
+        _alive.discard(job_id)
+
+
+def run_job(job_id):
+    track_job(job_id)
+    try:
+        return _run_job(job_id)
+    finally:
+        untrack_job(job_id)
+
+
+def _run_job(job_id):
+    # берём задание условным UPDATE: просроченное (expire_stale_jobs) уже не запустится
+    claimed = DocumentReviewJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', updated_at=timezone.now()
+    )
+    job = DocumentReviewJob.objects.get(pk=job_id)
+    if not claimed:
+        return job
+    try:
+        job.result = review_document(job.file.path, job.topic)
+        job.status = 'done'
+    except APIException as e:
+        job.error = e.detail
+        job.status = 'failed'
+    except Exception as e:
+        job.error = f"Ошибка при проверке документа: {e}"
+        job.status = 'failed'
+    finally:
+        # загруженный файл нужен только на время проверки
+        if job.file:
+            job.file.delete(save=False)
+    # только если задание всё ещё наше: просроченное уже отдано клиенту как failed
+    finished = DocumentReviewJob.objects.filter(pk=job.pk, status='running').update(
+        status=job.status, result=job.result, error=job.error, file='', updated_at=timezone.now()
+    )
+    if not finished:
+        job.refresh_from_db()
+    return job
+
+
+class SyncJobBackend:
+    def submit(self, job_id):
+        run_job(job_id)
+
+
+class ThreadJobBackend:
+    def __init__(self, max_workers):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='doc-review'
+        )
+
+    def submit(self, job_id):
+        # пока задание ждёт в очереди пула, heartbeat не даст счесть его потерянным
+        track_job(job_id)
+        self.executor.submit(self._run, job_id)
+
+    @staticmethod
+    def _run(job_id):
+        close_old_connections()
+        try:
+            run_job(job_id)
+        finally:
+            close_old_connections()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = getattr(settings, 'DOC_REVIEW_JOB_BACKEND', 'thread')
+                if name == 'sync':
+                    _backend = SyncJobBackend()
+                else:
+                    workers = getattr(settings, 'DOC_REVIEW_JOB_WORKERS', 2)
+                    _backend = ThreadJobBackend(workers)
+    return _backend
+
+
+ACTIVE_STATUSES = ('pending', 'running')
+STALE_JOB_ERROR = "Проверка не завершилась вовремя (сервер перезапускался?), отправьте документ заново."
+
+
+def stale_before():
+    return timezone.now() - datetime.timedelta(seconds=job_timeout())
+
+
+def expire_stale_jobs(queryset=None):
+    """
+    Помечает failed задания в pending/running без отметки heartbeat дольше
+    DOC_REVIEW_JOB_TIMEOUT, и удаляет их файлы. Возвращает число заданий.
+    """
+    qs = DocumentReviewJob.objects.all() if queryset is None else queryset
+    expired = 0
+    for job in qs.filter(status__in=ACTIVE_STATUSES, updated_at__lt=stale_before()):
+        # условие на status/updated_at: задание, которое воркер всё же
+        # успел взять или закончить, не трогаем
+        updated = DocumentReviewJob.objects.filter(
+            pk=job.pk, status=job.status, updated_at=job.updated_at
+        ).update(status='failed', error=STALE_JOB_ERROR, file='', updated_at=timezone.now())
+        if updated:
+            if job.file:
+                job.file.storage.delete(job.file.name)
+            expired += 1
+    return expired
+
+
+def enqueue_review(user, uploaded_file, topic):
+    # очередь пула потоков не ограничена — ограничиваем число незавершённых заданий
+    limit = getattr(settings, 'DOC_REVIEW_MAX_PENDING_JOBS', 100)
+    if limit:
+        # потерянные задания место в лимите не занимают
+        expire_stale_jobs()
+        if DocumentReviewJob.objects.filter(status__in=ACTIVE_STATUSES).count() >= limit:
+            raise LLMBusy(BUSY_RETRY_AFTER)
+    job = DocumentReviewJob(user=user, topic=topic)
+    job.file.save(uploaded_file.name, uploaded_file, save=False)
+    job.save()
+    # воркер должен увидеть запись, поэтому отправляем после коммита
+    transaction.on_commit(lambda: get_backend().submit(job.pk))
+    return job
@@ -0,0 +1,188 @@
+"""
+Обёртки над LLM-клиентом для проверки документов.
+
+DOC_REVIEW_LLM_BACKEND выбирает клиента:
+  - 'gigachat' — настоящий GigaChat (по умолчанию);
+  - 'fake'     — локальная заглушка без сети с настраиваемой задержкой,
+                 чтобы мерить пайплайн и гонять его в тестах.
+
+Клиент GigaChat один на процесс (SharedGigaChat): соединения и токен OAuth
+переиспользуются всеми запросами и потоками, а не создаются на каждую проверку.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from django.conf import settings
+from rest_framework.exceptions import APIException
+
+from gigachat import GigaChat
+
+from . import resilience
+
+
+class FakeLLM:
+    """
+    Повторяет интерфейс GigaChat.chat(): возвращает объект с choices[0].message.content.
+    Резюме — первые summary_chars символов присланного текста, на вопрос
+    о соответствии теме всегда отвечает true.
+    """
+
+    def __init__(self, delay=0.0, summary_chars=300):
+        self.delay = delay
+        self.summary_chars = summary_chars
+        self.calls = 0
+
+    def chat(self, prompt):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if 'ответь одним словом true' in prompt:
+            content = 'true'
+        else:
+            body = prompt.split('\n', 1)[-1]
+            content = body[:self.summary_chars]
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+        )
+
+
+class SharedGigaChat:
+    """
+    Общий клиент GigaChat. Внутри — httpx.Client с пулом keep-alive
+    соединений, так что TLS-рукопожатие происходит раз на соединение,
+    а не на каждую проверку. Токен OAuth обновляется заранее, за
+    GIGACHAT_TOKEN_REFRESH_MARGIN секунд до истечения, под блокировкой —
+    один обмен на все потоки. Сама библиотека меняет токен только после
+    401, то есть каждое истечение стоило бы лишнего неудачного запроса.
+    """
+
+    def __init__(self, giga, refresh_margin=60):
+        self.giga = giga
+        self.refresh_margin = refresh_margin
+        self.expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _token_fresh(self):
+        return time.time() < self.expires_at - self.refresh_margin
+
+    def ensure_token(self):
+        if self._token_fresh():
+            return
+        with self._lock:
+            if self._token_fresh():
+                return
+            started = time.perf_counter()
+            token = self.giga.get_token()
+            expires_at = token.expires_at or 0
+            if expires_at > 10 ** 11:
+                # GigaChat отдаёт время в миллисекундах
+                expires_at /= 1000
+            # токен GigaChat живёт 30 минут, если срок не пришёл
+            self.expires_at = expires_at or time.time() + 30 * 60
+            _record('token', (time.perf_counter() - started) * 1000)
+
+    def chat(self, prompt):
+        self.ensure_token()
+        started = time.perf_counter()
+        try:
+            return self.giga.chat(prompt)
+        finally:
+            _record('request', (time.perf_counter() - started) * 1000)
+
+    def close(self):
+        self.giga.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    'clients_created': 0,
+    'token_refreshes': 0,
+    'token_ms': 0.0,
+    'requests': 0,
+    'request_ms': 0.0,
+}
+
+
+def _record(kind, elapsed_ms):
+    with _stats_lock:
+        if kind == 'token':
+            _stats['token_refreshes'] += 1
+            _stats['token_ms'] += elapsed_ms
+        else:
+            _stats['requests'] += 1
+            _stats['request_ms'] += elapsed_ms
+
+
+def stats():
+    """Счётчики общего клиента для /api/doc-review/health/."""
+    with _stats_lock:
+        data = dict(_stats)
+    requests, request_ms = data['requests'], data.pop('request_ms')
+    data['avg_request_ms'] = round(request_ms / requests, 1) if requests else None
+    # время обмена токенов в пересчёте на запрос — накладные расходы авторизации
+    data['token_overhead_ms'] = round(data['token_ms'] / requests, 2) if requests else None
+    data['token_ms'] = round(data['token_ms'], 1)
+    client = _client
+    data['token_expires_in'] = round(client.expires_at - time.time()) if client and client.expires_at else None
+    return data
+
+
+def get_shared_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                creds = getattr(settings, 'GIGACHAT_CREDENTIALS', None)
+                if not creds:
+                    raise APIException("Не задана настройка GIGACHAT_CREDENTIALS")
+                giga = GigaChat(
+                    credentials=creds,
+                    verify_ssl_certs=getattr(settings, 'GIGACHAT_VERIFY_SSL', True),
+                    # None — адреса по умолчанию из библиотеки
+                    base_url=getattr(settings, 'GIGACHAT_BASE_URL', None),
+                    auth_url=getattr(settings, 'GIGACHAT_AUTH_URL', None),
+                    timeout=getattr(settings, 'GIGACHAT_TIMEOUT', None),
+                )
+                _client = SharedGigaChat(
+                    giga, refresh_margin=getattr(settings, 'GIGACHAT_TOKEN_REFRESH_MARGIN', 60)
+                )
+                with _stats_lock:
+                    _stats['clients_created'] += 1
+    return _client
+
+
+def reset_client():
+    """Закрывает общий клиент (после смены настроек, в тестах)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+@contextmanager
+def get_llm():
+    backend = getattr(settings, 'DOC_REVIEW_LLM_BACKEND', 'gigachat')
+    if backend == 'fake':
+        yield FakeLLM(delay=getattr(settings, 'DOC_REVIEW_FAKE_LLM_DELAY', 0.0))
+        return
+    # общий клиент не закрывается по выходу: им пользуются следующие проверки
+    yield get_shared_client()
+
+
+def chat_text(giga, prompt, retries=None, backoff=None):
+    """
+    Один запрос к LLM через resilience.call: автомат, ограничитель частоты
+    и повторы транзиентных сбоев с джиттером. Возвращает текст ответа.
+    """
+    if retries is None:
+        retries = getattr(settings, 'DOC_REVIEW_LLM_RETRIES', 2)
+    if backoff is None:
+        backoff = getattr(settings, 'DOC_REVIEW_LLM_BACKOFF', 0.5)
+    return resilience.call(
+        lambda: giga.chat(prompt).choices[0].message.content, retries, backoff
+    )
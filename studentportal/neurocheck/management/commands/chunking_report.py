@@ -0,0 +1,67 @@
+"""
+Сколько запросов к LLM на первом уровне сжатия уходит на документы.
+
+    python manage.py chunking_report [файлы ...] [--chars 3000]
+
+Без аргументов берёт все .docx и .txt из MEDIA_ROOT (сданные работы).
+Для каждого файла печатает число кусков при старой нарезке по --chars
+символов и при нарезке chunk_text по DOC_REVIEW_CHUNK_TOKENS токенов.
+Следующие уровни зависят от длины ответов модели и здесь не считаются.
+"""
+import math
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.ingest import DocumentError, parse_document
+from neurocheck.chunking import chunk_budget, chunk_text, get_tokenizer
+
+
+class Command(BaseCommand):
+    help = "Сравнивает число кусков при нарезке по символам и по токенам."
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="Файлы .docx/.txt; по умолчанию — MEDIA_ROOT")
+        parser.add_argument('--chars', type=int, default=3000, help="Размер куска старой нарезки")
+
+    def _files(self, paths):
+        if paths:
+            yield from paths
+            return
+        for root, dirs, files in os.walk(settings.MEDIA_ROOT):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in sorted(files):
+                if name.lower().endswith(('.docx', '.txt')):
+                    yield os.path.join(root, name)
+
+    def handle(self, *args, **options):
+        count = get_tokenizer()
+        self.stdout.write(f"Бюджет куска: {chunk_budget()} токенов, старая нарезка: {options['chars']} символов")
+        total_old = total_new = files = 0
+        for path in self._files(options['paths']):
+            try:
+                text = parse_document(path).text
+            except (DocumentError, OSError) as e:
+                self.stderr.write(f"{path}: {e}")
+                continue
+            if not text.strip():
+                continue
+            # как считал старый compress_text: текст до порога не сжимался вовсе
+            old = math.ceil(len(text) / options['chars']) if len(text) > options['chars'] else 0
+            chunks = chunk_text(text, count=count)
+            new = len(chunks) if len(chunks) > 1 else 0
+            self.stdout.write(
+                f"{path}: {len(text)} символов, {count(text)} токенов — "
+                f"кусков было {old}, стало {new}"
+            )
+            total_old += old
+            total_new += new
+            files += 1
+        if files:
+            saved = total_old - total_new
+            share = saved / total_old * 100 if total_old else 0
+            self.stdout.write(
+                f"Файлов: {files}, запросов на первом уровне: {total_old} -> {total_new} "
+                f"(сэкономлено {saved}, {share:.0f}%)"
+            )
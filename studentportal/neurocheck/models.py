@@ -1,3 +1,36 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class DocumentReviewJob(models.Model):
+    """
+    Фоновая проверка документа: POST /api/doc-review/?async=1 создаёт задание,
+    воркер заполняет result, фронтенд опрашивает GET /api/doc-review/<id>/.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='review_jobs'
+    )
+    topic = models.CharField(max_length=255)
+    file = models.FileField(upload_to='doc_reviews/', blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    result = models.JSONField(null=True, blank=True)
+    error = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Review job {self.id} ({self.status})"
@@ -0,0 +1,108 @@
+"""
+Реестр NLP-ресурсов, загружаемых один раз на процесс:
+стоп-слова (frozenset), скомпилированные регулярки и MorphAnalyzer.
+
+Загрузка — либо при старте в NeurocheckConfig.ready() (NEUROCHECK_NLP_PRELOAD),
+либо лениво при первом обращении к get_resources(). Модуль не зависит
+от Django, чтобы extract_keywords.py можно было запускать как скрипт.
+"""
+import inspect
+import re
+import ssl
+import threading
+import time
+
+
+def _getargspec(func):
+    """Возвращаем ровно (args, varargs, varkw, defaults)."""
+    full = inspect.getfullargspec(func)
+    return (full.args, full.varargs, full.varkw, full.defaults)
+
+
+# pymorphy2 вызывает inspect.getargspec, которого нет в Python 3.11+
+if not hasattr(inspect, 'getargspec'):
+    inspect.getargspec = _getargspec
+
+CUSTOM_STOP_WORDS = {"шаг", "k", "к", "и", "а", "но", "в", "об", "о", "рисунок", "её", "ей"}
+
+
+class NLPResources:
+    def __init__(self, stop_words, morph):
+        self.stop_words = frozenset(stop_words)
+        self.morph = morph
+        self.sentence_re = re.compile(r'[.!?]+\s*')
+        self.token_re = re.compile(r'\b\w+\b')
+        # слова и концы предложений за один проход (для RAKE)
+        self.rake_re = re.compile(r'\w+|[.!?]+')
+
+
+def _ensure_stopwords():
+    import nltk
+    from nltk.data import find
+
+    try:
+        find('corpora/stopwords')
+    except LookupError:
+        # на macOS/других может потребоваться отключить проверку SSL для загрузки
+        try:
+            _create_unverified_https_context = ssl._create_unverified_context
+        except AttributeError:
+            pass
+        else:
+            ssl._create_default_https_context = _create_unverified_https_context
+        nltk.download('stopwords', quiet=True)
+
+
+def _load():
+    import pymorphy2
+    from nltk.corpus import stopwords
+
+    _ensure_stopwords()
+    return NLPResources(
+        stop_words=set(stopwords.words('russian')) | CUSTOM_STOP_WORDS,
+        morph=pymorphy2.MorphAnalyzer(),
+    )
+
+
+_resources = None
+_lock = threading.Lock()
+_stats = {
+    'ready': False,
+    'load_ms': None,
+    'cold_request_ms': None,
+    'warm_request_ms': None,
+    'warm_requests': 0,
+}
+
+
+def get_resources():
+    global _resources
+    if _resources is None:
+        with _lock:
+            if _resources is None:
+                started = time.perf_counter()
+                _resources = _load()
+                _stats['load_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                _stats['ready'] = True
+    return _resources
+
+
+def is_ready():
+    return _resources is not None
+
+
+def record_request(elapsed_ms):
+    """Запоминает время NLP-этапа запроса: первый — холодный, дальше — среднее по тёплым."""
+    with _lock:
+        if _stats['cold_request_ms'] is None:
+            _stats['cold_request_ms'] = round(elapsed_ms, 1)
+            return
+        n = _stats['warm_requests']
+        prev = _stats['warm_request_ms'] or 0.0
+        _stats['warm_request_ms'] = round((prev * n + elapsed_ms) / (n + 1), 1)
+        _stats['warm_requests'] = n + 1
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
@@ -0,0 +1,292 @@
+"""
+Защита проверки документов от деградации GigaChat.
+
+Каждый запрос к LLM (llm.chat_text -> call) проходит:
+  1. автомат (CircuitBreaker): после DOC_REVIEW_BREAKER_FAILURES запросов
+     подряд, не прошедших и с повторами, запросы DOC_REVIEW_BREAKER_COOLDOWN
+     секунд сразу получают 503, не дожидаясь таймаутов; потом один пробный
+     запрос решает, закрыть ли автомат;
+  2. ограничитель частоты (TokenBucket): DOC_REVIEW_LLM_RATE запросов в секунду
+     с запасом DOC_REVIEW_LLM_BURST; если токена ждать дольше
+     DOC_REVIEW_LLM_RATE_WAIT секунд — 429;
+  3. ограниченные повторы сбоев сети и 429/5xx с паузой со случайным
+     джиттером, чтобы воркеры не повторяли запросы хором.
+Синхронная проверка целиком занимает место в admission(): сверх
+DOC_REVIEW_MAX_INFLIGHT одновременных проверок на процесс — сразу 429,
+а не очередь из воркеров, ждущих GigaChat.
+
+Состояние автомата и ведра хранится в кэше DOC_REVIEW_GUARD_CACHE: с общим
+бэкендом (Redis/Memcached) оно общее для всех воркеров, с LocMemCache — на
+процесс. 429 и 503 отдаются с Retry-After (DRF берёт его из exc.wait, как у
+Throttled).
+"""
+import math
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import httpx
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from gigachat.api.utils import ResponseError
+from gigachat.exceptions import AuthenticationError
+
+# сколько живёт блокировка состояния в кэше, если её владелец упал
+LOCK_TTL = 2
+# Retry-After для отказа admission: типичная проверка идёт несколько секунд
+BUSY_RETRY_AFTER = 5
+
+
+class LLMBusy(APIException):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_detail = "Сейчас слишком много проверок, повторите позже."
+    default_code = 'llm_busy'
+
+    def __init__(self, wait, detail=None):
+        super().__init__(detail)
+        self.wait = max(1, math.ceil(wait))
+
+
+class LLMUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Сервис проверки временно недоступен, повторите позже."
+    default_code = 'llm_unavailable'
+
+    def __init__(self, wait, detail=None):
+        super().__init__(detail)
+        self.wait = max(1, math.ceil(wait))
+
+
+class LLMError(APIException):
+    """GigaChat отклонил запрос (4xx) — повтор не поможет."""
+    status_code = status.HTTP_502_BAD_GATEWAY
+    default_detail = "Ошибка GigaChat API."
+    default_code = 'llm_error'
+
+
+def _cache():
+    return caches[getattr(settings, 'DOC_REVIEW_GUARD_CACHE', 'default')]
+
+
+@contextmanager
+def _locked(key):
+    """
+    Короткая блокировка через cache.add (атомарен во всех бэкендах Django):
+    чтение-изменение-запись состояния не перетирают друг друга между воркерами.
+    """
+    cache, lock_key, token = _cache(), f"{key}:lock", uuid.uuid4().hex
+    deadline = time.monotonic() + LOCK_TTL
+    while not cache.add(lock_key, token, LOCK_TTL):
+        if time.monotonic() > deadline:
+            # владелец пропал — блокировка вот-вот истечёт сама
+            break
+        time.sleep(0.005)
+    try:
+        yield cache
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def _status_code(exc):
+    # ResponseError(url, status_code, content, headers)
+    return exc.args[1] if len(exc.args) > 1 else None
+
+
+def is_transient(exc):
+    """Сбой на стороне провайдера или сети, который имеет смысл повторить."""
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, ResponseError) and not isinstance(exc, AuthenticationError):
+        code = _status_code(exc)
+        return code is None or code == 429 or code >= 500
+    return False
+
+
+class TokenBucket:
+    """
+    Ведро на rate запросов в секунду с запасом burst. Токен можно занять
+    вперёд (баланс уходит в минус) — тогда вызывающий ждёт свою очередь,
+    но не дольше max_wait, иначе 429.
+    """
+
+    def __init__(self, key, rate, burst, max_wait):
+        self.key = key
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+
+    def take(self):
+        if not self.rate:
+            return
+        with _locked(self.key) as cache:
+            now = time.time()
+            tokens, updated = cache.get(self.key) or (self.burst, now)
+            tokens = min(self.burst, tokens + (now - updated) * self.rate) - 1
+            wait = -tokens / self.rate if tokens < 0 else 0.0
+            if wait > self.max_wait:
+                raise LLMBusy(wait, "Превышен лимит запросов к GigaChat, повторите позже.")
+            cache.set(self.key, (tokens, now), None)
+        if wait:
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    closed -> (failures сбоев подряд) -> open на cooldown секунд -> half-open:
+    пропускается один пробный запрос, успех закрывает автомат, сбой снова
+    открывает. Пока ничего не ломалось, состояния в кэше нет и проверка —
+    один cache.get без блокировки.
+    """
+
+    def __init__(self, key, failures, cooldown):
+        self.key = key
+        self.failures = failures
+        self.cooldown = cooldown
+
+    def retry_after(self):
+        """Сколько секунд автомат ещё открыт (0 — запросы идут)."""
+        state = _cache().get(self.key)
+        if not state:
+            return 0
+        return max(0.0, state['open_until'] - time.time())
+
+    def before_call(self):
+        if not self.failures or not _cache().get(self.key):
+            return
+        with _locked(self.key) as cache:
+            state = cache.get(self.key)
+            if not state or not state['open_until']:
+                return
+            now = time.time()
+            if now < state['open_until']:
+                raise LLMUnavailable(state['open_until'] - now)
+            if now < state['probe_until']:
+                # пробный запрос уже идёт в другом потоке или воркере
+                raise LLMUnavailable(state['probe_until'] - now)
+            state['probe_until'] = now + self.cooldown
+            cache.set(self.key, state, None)
+
+    def record_success(self):
+        if self.failures and _cache().get(self.key):
+            _cache().delete(self.key)
+
+    def record_failure(self):
+        """Учитывает сбой; возвращает, через сколько секунд повторять."""
+        if not self.failures:
+            return 0
+        with _locked(self.key) as cache:
+            now = time.time()
+            state = cache.get(self.key) or {'failures': 0, 'open_until': 0, 'probe_until': 0}
+            state['failures'] += 1
+            # сбой пробного запроса (автомат уже открывался) открывает его сразу
+            if state['open_until'] or state['failures'] >= self.failures:
+                state['open_until'] = now + self.cooldown
+                state['probe_until'] = 0
+            cache.set(self.key, state, None)
+            return max(0.0, state['open_until'] - now)
+
+
+def get_breaker():
+    return CircuitBreaker(
+        'doc-review:llm:breaker',
+        failures=getattr(settings, 'DOC_REVIEW_BREAKER_FAILURES', 5),
+        cooldown=getattr(settings, 'DOC_REVIEW_BREAKER_COOLDOWN', 30),
+    )
+
+
+def get_bucket():
+    return TokenBucket(
+        'doc-review:llm:bucket',
+        rate=getattr(settings, 'DOC_REVIEW_LLM_RATE', 0),
+        burst=getattr(settings, 'DOC_REVIEW_LLM_BURST', 10),
+        max_wait=getattr(settings, 'DOC_REVIEW_LLM_RATE_WAIT', 5),
+    )
+
+
+def retry_delay(attempt, backoff, exc=None):
+    """
+    Пауза перед повтором: случайная в [0, backoff * 2^attempt] (full jitter),
+    но не меньше Retry-After, если провайдер его прислал. Не больше
+    DOC_REVIEW_LLM_BACKOFF_MAX секунд в любом случае.
+    """
+    limit = getattr(settings, 'DOC_REVIEW_LLM_BACKOFF_MAX', 8)
+    delay = random.uniform(0, backoff * (2 ** attempt))
+    headers = exc.args[3] if isinstance(exc, ResponseError) and len(exc.args) > 3 else None
+    try:
+        delay = max(delay, float(headers.get('retry-after')))
+    except (AttributeError, TypeError, ValueError):
+        pass
+    return min(delay, limit)
+
+
+def call(fn, retries, backoff):
+    """
+    Выполняет запрос к LLM fn() через автомат и ограничитель частоты,
+    повторяя транзиентные сбои не больше retries раз. Автомат считает сбоем
+    весь запрос, исчерпавший повторы, а не каждую попытку.
+    """
+    breaker, bucket = get_breaker(), get_bucket()
+    attempt = 0
+    while True:
+        breaker.before_call()
+        bucket.take()
+        try:
+            result = fn()
+        except Exception as exc:
+            if not is_transient(exc):
+                # 4xx, ответ не той формы, сбой в самой библиотеке — повтор не поможет,
+                # но наружу уходит 502, а не необработанная ошибка сервера
+                raise LLMError(f"Ошибка GigaChat API: {exc}") from exc
+            if attempt >= retries:
+                opened_for = breaker.record_failure()
+                raise LLMUnavailable(opened_for or backoff * (2 ** attempt)) from exc
+            time.sleep(retry_delay(attempt, backoff, exc))
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+_inflight = None
+_inflight_lock = threading.Lock()
+
+
+def _semaphore():
+    global _inflight
+    if _inflight is None:
+        with _inflight_lock:
+            if _inflight is None:
+                _inflight = threading.BoundedSemaphore(getattr(settings, 'DOC_REVIEW_MAX_INFLIGHT', 8))
+    return _inflight
+
+
+def raise_if_open():
+    """Не принимать работу, которую открытый автомат всё равно отклонит."""
+    wait = get_breaker().retry_after()
+    if wait:
+        raise LLMUnavailable(wait)
+
+
+@contextmanager
+def admission():
+    """
+    Место для синхронной проверки. Лишние запросы не ждут в очереди,
+    а сразу получают 429 с Retry-After.
+    """
+    raise_if_open()
+    if not getattr(settings, 'DOC_REVIEW_MAX_INFLIGHT', 8):
+        yield
+        return
+    semaphore = _semaphore()
+    if not semaphore.acquire(blocking=False):
+        raise LLMBusy(BUSY_RETRY_AFTER)
+    try:
+        yield
+    finally:
+        semaphore.release()
@@ -1,7 +1,20 @@
 from rest_framework import serializers
 
-class DocumentSerializer(serializers.Serializer):
-    file = serializers.FileField()
+from core.serializers import SparseFieldsetsMixin, UploadFieldMixin
+
+from .models import DocumentReviewJob
+
+class DocumentSerializer(UploadFieldMixin, serializers.Serializer):
+    file = serializers.FileField(required=False)
+    # id завершённой докачиваемой загрузки (/api/uploads/) вместо file
+    upload = serializers.UUIDField(required=False)
+
+
+class DocumentReviewJobSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = DocumentReviewJob
+        fields = ('id', 'topic', 'status', 'result', 'error', 'created_at', 'updated_at')
+        read_only_fields = fields
 
 
 
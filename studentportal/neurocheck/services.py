@@ -0,0 +1,226 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from core.ingest import DocumentError, parse_document
+
+from . import cache as review_cache, nlp
+from .chunking import chunk_text
+from .extract_keywords import get_keywords_and_topic
+from .llm import chat_text, get_llm
+
+
+MIN_WORDS = 100
+
+
+def load_document(source):
+    """Разбирает .docx один раз; ошибки чтения превращаются в ошибку валидации."""
+    try:
+        return parse_document(source, name='upload.docx')
+    except DocumentError as e:
+        raise ValidationError({'file': str(e)})
+
+
+def summarise_chunks(chunks, giga, stats=None):
+    """
+    Резюме кусков в исходном порядке. Куски, которые уже сжимались (в этом
+    или прошлых документах), берутся из кэша по хэшу; остальные сжимаются
+    параллельно, не больше DOC_REVIEW_LLM_CONCURRENCY запросов одновременно.
+    В stats копятся счётчики chunks/cached.
+    """
+    concurrency = getattr(settings, 'DOC_REVIEW_LLM_CONCURRENCY', 4)
+
+    def summarise(chunk):
+        # без номера части: резюме куска не должно зависеть от его места в документе
+        prompt = (
+            "Сожми следующий текст до краткого содержательного резюме, "
+            "сообщи только основные идеи:\n" + chunk
+        )
+        return chat_text(giga, prompt)
+
+    digests = [review_cache.chunk_digest(chunk) for chunk in chunks]
+    summaries = review_cache.get_chunk_summaries(digests)
+    if stats is not None:
+        stats['chunks'] += len(chunks)
+        stats['cached'] += sum(1 for d in digests if d in summaries)
+
+    # одинаковые куски сжимаем один раз
+    missing = {d: chunk for d, chunk in zip(digests, chunks) if d not in summaries}
+    if missing:
+        items = list(missing.items())
+        if concurrency <= 1 or len(items) == 1:
+            fresh = [summarise(chunk) for _, chunk in items]
+        else:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(items))) as pool:
+                # map сохраняет порядок кусков независимо от порядка ответов
+                fresh = list(pool.map(summarise, [chunk for _, chunk in items]))
+        fresh = dict(zip(missing, fresh))
+        review_cache.set_chunk_summaries(fresh)
+        summaries.update(fresh)
+    return [summaries[d] for d in digests]
+
+
+def compress_text(text, giga, depth=0, stats=None):
+    """
+    Map-reduce сжатие: текст режется на куски по DOC_REVIEW_CHUNK_TOKENS
+    токенов по границам абзацев и предложений, куски сжимаются параллельно,
+    затем резюме упаковываются так же и сжимаются снова, пока результат не
+    уложится в один кусок или не будет достигнута глубина DOC_REVIEW_MAX_DEPTH.
+    """
+    chunks = chunk_text(text)
+    if len(chunks) <= 1:
+        return text
+    combined = "\n".join(summarise_chunks(chunks, giga, stats))
+    if depth + 1 >= getattr(settings, 'DOC_REVIEW_MAX_DEPTH', 3):
+        return combined
+    return compress_text(combined, giga, depth + 1, stats)
+
+
+def chunk_cache_report(stats):
+    """
+    Доля кусков, резюме которых взяты из кэша; None — сжимать не пришлось
+    (короткий текст или резюме всего документа уже в кэше).
+    """
+    ratio = round(stats['cached'] / stats['chunks'], 2) if stats['chunks'] else None
+    return {**stats, 'hit_ratio': ratio}
+
+
+def get_cached_result(digest, topic):
+    """
+    Готовый ответ из кэша. chunk_cache в нём от первой проверки, а сейчас
+    ничего не сжималось — отдаём как для документа, сжатие которого в кэше.
+    """
+    cached = review_cache.get_result(digest, topic)
+    if cached is not None:
+        cached['chunk_cache'] = chunk_cache_report({'chunks': 0, 'cached': 0})
+    return cached
+
+
+_TRUE_WORDS = {'true', 'да', 'yes', 'соответствует'}
+_FALSE_WORDS = {'false', 'нет', 'no'}
+_WORD_RE = re.compile(r'\w+')
+
+OFF_TOPIC_EVALUATION = (
+    "Содержание работы не соответствует теме «{topic}», "
+    "поэтому подробная оценка не проводилась."
+)
+
+
+def parse_verdict(text):
+    """
+    Ответ модели на вопрос true/false. Одним словом она отвечает не всегда:
+    бывает «True.», «**false**», «Да, соответствует», «Не соответствует» —
+    решает первое узнаваемое слово или «не соответствует». Нераспознанный
+    ответ — проверка не пройдена.
+    """
+    words = _WORD_RE.findall(text.lower())
+    for i, word in enumerate(words):
+        # «не» само по себе не ответ: «не только соответствует, но и…»
+        if word == 'не' and words[i + 1:i + 2] == ['соответствует']:
+            return False
+        if word in _TRUE_WORDS:
+            return True
+        if word in _FALSE_WORDS:
+            return False
+    return False
+
+
+def evaluate(giga, topic, compressed):
+    """
+    Развёрнутая оценка и проверка соответствия теме по резюме.
+    Запросы независимы и идут параллельно. С DOC_REVIEW_SKIP_EVAL_OFF_TOPIC
+    сначала задаётся дешёвый вопрос true/false, и для работы не по теме
+    оценка не запрашивается вовсе. Возвращает (evaluation, passed).
+    """
+    eval_prompt = (
+        f"Оцени работу студента по теме '{topic}'.\n"
+        f"Вот резюме его текста:\n{compressed}\n"
+        "Дай подробный развёрнутый ответ без JSON. Дай более человечный ответ"
+    )
+    pass_prompt = (
+        f"Тема документа: '{topic}'.\n"
+        f"Краткое содержание документа:\n{compressed}\n"
+        "На основе указанной темы и содержания, "
+        "ответь одним словом true, если содержание соответствует теме, иначе false."
+    )
+
+    if getattr(settings, 'DOC_REVIEW_SKIP_EVAL_OFF_TOPIC', False):
+        if not parse_verdict(chat_text(giga, pass_prompt)):
+            return OFF_TOPIC_EVALUATION.format(topic=topic), False
+        return chat_text(giga, eval_prompt).strip(), True
+
+    if getattr(settings, 'DOC_REVIEW_LLM_CONCURRENCY', 4) <= 1:
+        return chat_text(giga, eval_prompt).strip(), parse_verdict(chat_text(giga, pass_prompt))
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        # короткий вопрос — в фоне, длинная оценка — в текущем потоке
+        verdict = pool.submit(chat_text, giga, pass_prompt)
+        evaluation = chat_text(giga, eval_prompt).strip()
+        return evaluation, parse_verdict(verdict.result())
+
+
+def review_document(source, topic, digest=None):
+    """
+    Полный цикл проверки .docx: подсчёт слов, ключевые слова, сжатие
+    и оценка в GigaChat (см. evaluate). Возвращает словарь для ответа фронтенду.
+    source — путь или загруженный файл; документ разбирается один раз.
+    Ошибки валидации и GigaChat поднимаются как исключения DRF.
+    Повторная загрузка того же файла отдаётся из кэша (см. cache.py), у
+    исправленного заново сжимаются только изменившиеся куски — сколько
+    кусков взято из кэша, видно в chunk_cache ответа.
+    """
+    if digest is None:
+        digest = review_cache.file_digest(source)
+    cached = get_cached_result(digest, topic)
+    if cached is not None:
+        return cached
+    artefacts = review_cache.get_artefacts(digest) or {}
+
+    # 1) извлечение полного текста и подсчёт слов
+    document = None
+    if 'full_text' not in artefacts:
+        document = load_document(source)
+        artefacts['full_text'] = document.text
+        artefacts['word_count'] = document.word_count
+    full_text = artefacts['full_text']
+    word_count = artefacts.get('word_count') or len(full_text.split())
+    # проверка: минимум 100 слов
+    if word_count < MIN_WORDS:
+        raise ValidationError({
+            'file': f'Документ должен содержать минимум {MIN_WORDS} слов, найдено {word_count}.'
+        })
+
+    # 2) извлечение ключевых слов и темы из документа
+    if 'keywords' not in artefacts:
+        started = time.perf_counter()
+        top_words, extracted_topic = get_keywords_and_topic(
+            document or load_document(source), top_n=5
+        )
+        nlp.record_request((time.perf_counter() - started) * 1000)
+        artefacts['keywords'] = [{"keyword": w, "count": c} for w, c in top_words]
+        artefacts['extracted_topic'] = extracted_topic
+    keywords_data = artefacts['keywords']
+    extracted_topic = artefacts['extracted_topic']
+
+    # 3) запросы к LLM
+    # сбои GigaChat приходят из resilience уже как 429/502/503 с Retry-After
+    chunk_stats = {'chunks': 0, 'cached': 0}
+    with get_llm() as giga:
+        if 'compressed' not in artefacts:
+            artefacts['compressed'] = compress_text(full_text, giga, stats=chunk_stats)
+            review_cache.set_artefacts(digest, artefacts)
+        compressed = artefacts['compressed']
+        evaluation, passed = evaluate(giga, topic, compressed)
+
+    result = {
+        "evaluation": evaluation,
+        "keywords": keywords_data,
+        "extracted_topic": extracted_topic,
+        "word_count": word_count,
+        "passed": passed,
+        "chunk_cache": chunk_cache_report(chunk_stats),
+    }
+    review_cache.set_result(digest, topic, result)
+    return result
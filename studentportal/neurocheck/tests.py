@@ -1,3 +1,887 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+import ssl
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+import httpx
+from gigachat.exceptions import ResponseError
+
+from core.models import CustomUser
+
+from . import cache as review_cache, extract_keywords, jobs, llm, nlp, services
+from .chunking import approx_tokens, chunk_text, get_tokenizer
+from .extract_keywords import LemmaCache, lemma_cache, load_docx_text, rake_extract, top_k
+from .jobs import (
+    STALE_JOB_ERROR, expire_stale_jobs, run_job, touch_alive_jobs, track_job, untrack_job,
+)
+from .models import DocumentReviewJob
+from .nlp import get_resources
+from . import resilience
+from .resilience import LLMBusy, LLMError, LLMUnavailable
+
+LAB_DOCX = os.path.join(os.path.dirname(__file__), 'lab.docx')
+WORD_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+
+def lab_docx_upload(name='lab.docx'):
+    with open(LAB_DOCX, 'rb') as fh:
+        return SimpleUploadedFile(name, fh.read())
+
+
+class ReviewTestMixin:
+    """
+    Временный MEDIA_ROOT вместо media/ проекта, заглушка LLM без сети,
+    фоновые задания сразу в запросе и пустые кэши проверок.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for alias in ('doc-review', 'llm-guard'):
+            caches[alias].clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        uploads = os.path.join(media, '.uploads')
+        os.makedirs(uploads)
+        override = override_settings(
+            MEDIA_ROOT=media, UPLOAD_TEMP_DIR=uploads, FILE_UPLOAD_TEMP_DIR=uploads,
+            DOC_REVIEW_LLM_BACKEND='fake', DOC_REVIEW_JOB_BACKEND='sync',
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+@override_settings(DOC_REVIEW_JOB_TIMEOUT=60)
+class ReviewJobTests(ReviewTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create(username='student', role='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_job(self, status='pending', age=0):
+        job = DocumentReviewJob(user=self.user, topic='Кластеризация', status=status)
+        job.file.save('lab.docx', ContentFile(b'docx'), save=False)
+        job.save()
+        DocumentReviewJob.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now() - datetime.timedelta(seconds=age)
+        )
+        return job
+
+    def test_async_review_completes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/doc-review/?async=1', {'file': lab_docx_upload(), 'topic': 'Кластеризация'}
+            )
+        self.assertEqual(response.status_code, 202)
+        data = self.client.get(f"/api/doc-review/{response.json()['id']}/").json()
+        self.assertEqual(data['status'], 'done')
+        self.assertLessEqual({'evaluation', 'keywords', 'passed'}, set(data['result']))
+
+    def test_lost_job_fails_on_poll(self):
+        for status in ('pending', 'running'):
+            with self.subTest(status=status):
+                job = self.make_job(status, age=120)
+                path = job.file.path
+                data = self.client.get(f'/api/doc-review/{job.pk}/').json()
+                self.assertEqual(data['status'], 'failed')
+                self.assertEqual(data['error'], STALE_JOB_ERROR)
+                self.assertFalse(os.path.exists(path))
+
+    def test_fresh_job_is_left_alone(self):
+        job = self.make_job('running', age=10)
+        self.assertEqual(expire_stale_jobs(), 0)
+        self.assertEqual(self.client.get(f'/api/doc-review/{job.pk}/').json()['status'], 'running')
+
+    def test_expired_job_is_not_started(self):
+        job = self.make_job('pending', age=120)
+        self.assertEqual(expire_stale_jobs(), 1)
+        self.assertEqual(run_job(job.pk).status, 'failed')
+
+    def test_job_of_live_process_is_not_expired(self):
+        # ждёт в очереди пула дольше таймаута, но процесс жив и отмечает его
+        job = self.make_job('pending', age=120)
+        track_job(job.pk)
+        self.addCleanup(untrack_job, job.pk)
+        self.assertEqual(touch_alive_jobs(), 1)
+        self.assertEqual(expire_stale_jobs(), 0)
+        self.assertEqual(DocumentReviewJob.objects.get(pk=job.pk).status, 'pending')
+
+    def test_expired_during_run_is_not_overwritten(self):
+        job = self.make_job('pending')
+
+        def review(path, topic):
+            DocumentReviewJob.objects.filter(pk=job.pk).update(status='failed', error=STALE_JOB_ERROR)
+            return {'passed': True}
+
+        with mock.patch.object(jobs, 'review_document', side_effect=review):
+            self.assertEqual(run_job(job.pk).status, 'failed')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.result), ('failed', STALE_JOB_ERROR, None))
+        self.assertEqual(jobs._alive, set())
+
+    @override_settings(DOC_REVIEW_MAX_PENDING_JOBS=1)
+    def test_lost_jobs_do_not_hold_queue_limit(self):
+        self.make_job('running', age=120)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/doc-review/?async=1', {'file': lab_docx_upload(), 'topic': 'Кластеризация'}
+            )
+        self.assertEqual(response.status_code, 202)
+        self.make_job('pending')
+        response = self.client.post(
+            '/api/doc-review/?async=1', {'file': lab_docx_upload(), 'topic': 'Кластеризация'}
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class ReviewCacheTests(ReviewTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='student', role='student'))
+        self.giga = llm.FakeLLM()
+        patcher = mock.patch.object(services, 'get_llm', lambda: nullcontext(self.giga))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with open(LAB_DOCX, 'rb') as fh:
+            self.digest = hashlib.sha256(fh.read()).hexdigest()
+
+    def review(self, topic='Кластеризация'):
+        response = self.client.post('/api/doc-review/', {'file': lab_docx_upload(), 'topic': topic})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_repeat_upload_skips_llm(self):
+        first = self.review()
+        self.assertGreater(self.giga.calls, 0)
+        self.giga.calls = 0
+        second = self.review()
+        self.assertEqual(self.giga.calls, 0)
+        # ничего не сжималось: статистика кусков не от первой проверки
+        self.assertGreater(first['chunk_cache']['chunks'], 0)
+        self.assertEqual(second.pop('chunk_cache'), {'chunks': 0, 'cached': 0, 'hit_ratio': None})
+        first.pop('chunk_cache')
+        self.assertEqual(second, first)
+
+    @override_settings(DOC_REVIEW_CHUNK_TOKENS=200, DOC_REVIEW_LLM_BACKOFF=0, DOC_REVIEW_LLM_RATE=0)
+    def test_edited_document_resummarises_changed_chunks(self):
+        paragraphs = [
+            f'Абзац {i} о кластеризации. ' + ' '.join(f'слово{i}x{j}' for j in range(30)) + '.'
+            for i in range(30)
+        ]
+        edited = list(paragraphs)
+        edited[12] = edited[12].replace('слово12x5', 'исправлено')
+        path = os.path.join(settings.MEDIA_ROOT, 'lab.docx')
+
+        def review(paragraphs):
+            body = ''.join(f'<w:p><w:r><w:t>{p}</w:t></w:r></w:p>' for p in paragraphs)
+            xml = f'<w:document xmlns:w="{WORD_NS}"><w:body>{body}</w:body></w:document>'
+            with zipfile.ZipFile(path, 'w') as zf:
+                zf.writestr('word/document.xml', xml)
+            self.giga = StubLLM()
+            return services.review_document(path, 'Кластеризация'), self.giga.calls
+
+        before, after = chunk_text('\n'.join(paragraphs)), chunk_text('\n'.join(edited))
+        changed = len(set(after) - set(before))
+        self.assertEqual(changed, 1)
+
+        first, first_calls = review(paragraphs)
+        self.assertEqual(first['chunk_cache'], {'chunks': len(before), 'cached': 0, 'hit_ratio': 0.0})
+        eval_calls = first_calls - len(before)
+
+        second, second_calls = review(edited)
+        self.assertEqual(second_calls, changed + eval_calls)
+        cached = len(after) - changed
+        self.assertEqual(second['chunk_cache'], {
+            'chunks': len(after), 'cached': cached, 'hit_ratio': round(cached / len(after), 2),
+        })
+
+    def test_result_key_depends_on_topic_and_prompt_version(self):
+        self.review()
+        first_calls = self.giga.calls
+        self.assertIsNotNone(review_cache.get_result(self.digest, ' кластеризация '))
+        self.assertIsNone(review_cache.get_result(self.digest, 'Регрессия'))
+        with mock.patch.object(review_cache, 'PROMPT_VERSION', review_cache.PROMPT_VERSION + 1):
+            self.assertIsNone(review_cache.get_result(self.digest, 'Кластеризация'))
+            self.assertIsNone(review_cache.get_artefacts(self.digest))
+        # другая тема: сжатие документа берётся из кэша, заново только оценка
+        self.giga.calls = 0
+        self.review('Регрессия')
+        self.assertTrue(0 < self.giga.calls < first_calls)
+
+    def test_digest_taken_from_upload_handler(self):
+        with mock.patch.object(review_cache, 'hashlib', wraps=hashlib) as spy:
+            self.review()
+        # хэш файла посчитал core.uploads при приёме, cache.py хэширует только тему
+        self.assertTrue(spy.sha256.called)
+        self.assertNotIn(mock.call(), spy.sha256.call_args_list)
+        self.assertIsNotNone(review_cache.get_result(self.digest, 'Кластеризация'))
+
+    def test_file_digest_of_path_and_plain_upload(self):
+        self.assertEqual(review_cache.file_digest(LAB_DOCX), self.digest)
+        upload = lab_docx_upload()
+        self.assertEqual(review_cache.file_digest(upload), self.digest)
+        self.assertEqual(upload.read(4), b'PK\x03\x04')
+
+
+def count_words(text):
+    """Токенайзер для DOC_REVIEW_TOKENIZER в тестах: токен — слово."""
+    return len(text.split())
+
+
+class ChunkingTests(SimpleTestCase):
+
+    sentences = [f'Предложение номер {i} про центроиды кластеров.' for i in range(40)]
+
+    def test_chunks_fit_budget(self):
+        text = load_docx_text(LAB_DOCX)
+        for budget in (40, 200, 2000):
+            with self.subTest(budget=budget):
+                chunks = chunk_text(text, budget=budget)
+                self.assertLessEqual(max(approx_tokens(c) for c in chunks), budget)
+                self.assertEqual(' '.join(' '.join(chunks).split()), ' '.join(text.split()))
+
+    def test_long_paragraph_split_on_sentences(self):
+        chunks = chunk_text(' '.join(self.sentences), budget=30)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual('\n'.join(chunks).split('\n'), self.sentences)
+
+    def test_long_sentence_split_on_words(self):
+        words = [f'слово{i}' for i in range(100)]
+        chunks = chunk_text(' '.join(words), budget=20)
+        self.assertLessEqual(max(approx_tokens(c) for c in chunks), 20)
+        self.assertEqual(' '.join(chunks).split(), words)
+
+    def test_over_budget_word_is_sliced(self):
+        word = 'A' * 400
+        chunks = chunk_text(f'начало {word} конец', budget=20)
+        self.assertLessEqual(max(approx_tokens(c) for c in chunks), 20)
+        self.assertEqual(''.join(''.join(chunks).split()), f'начало{word}конец')
+
+    @override_settings(DOC_REVIEW_TOKENIZER='neurocheck.tests.count_words')
+    def test_custom_tokenizer(self):
+        self.assertIs(get_tokenizer(), count_words)
+        chunks = chunk_text(' '.join(self.sentences), budget=12)
+        # по словам предложение — 6 токенов, approx_tokens насчитал бы 12
+        self.assertLessEqual(max(count_words(c) for c in chunks), 12)
+        self.assertGreater(max(approx_tokens(c) for c in chunks), 12)
+
+
+class StubLLM:
+    """
+    Клиент с интерфейсом GigaChat.chat(): резюме — первые 20 символов куска.
+    Считает вызовы и максимум одновременных запросов; fail — сколько раз
+    подряд отвечать 503 на кусок, начинающийся с этой строки.
+    """
+
+    def __init__(self, delay=0.0, fail=None, echo=False):
+        self.delay = delay
+        self.fail = dict(fail or {})
+        self.echo = echo
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def chat(self, prompt):
+        body = prompt.split('\n', 1)[-1]
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            failing = next((key for key, left in self.fail.items() if left and body.startswith(key)), None)
+            if failing:
+                self.fail[failing] -= 1
+        try:
+            delay = self.delay(body) if callable(self.delay) else self.delay
+            time.sleep(delay)
+            if failing:
+                raise ResponseError('https://stub/chat', 503, b'busy', {})
+            content = body if self.echo else body[:20]
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+@override_settings(DOC_REVIEW_LLM_BACKOFF=0, DOC_REVIEW_LLM_RATE=0)
+class SummariseChunksTests(ReviewTestMixin, TestCase):
+
+    chunks = [f'кусок {i} ' + 'слово ' * 50 for i in range(8)]
+
+    @override_settings(DOC_REVIEW_LLM_CONCURRENCY=3)
+    def test_order_kept_and_concurrency_bounded(self):
+        # первые куски отвечают дольше последних
+        giga = StubLLM(delay=lambda body: 0.05 if body.startswith('кусок 0') else 0.01)
+        summaries = services.summarise_chunks(self.chunks, giga)
+        self.assertEqual(summaries, [chunk[:20] for chunk in self.chunks])
+        self.assertEqual(giga.max_active, 3)
+
+    def test_transient_error_is_retried_per_chunk(self):
+        giga = StubLLM(fail={'кусок 2': 2})
+        summaries = services.summarise_chunks(self.chunks, giga)
+        self.assertEqual(summaries[2], self.chunks[2][:20])
+        self.assertEqual(giga.calls, len(self.chunks) + 2)
+
+    @override_settings(DOC_REVIEW_LLM_RETRIES=1, DOC_REVIEW_BREAKER_FAILURES=0)
+    def test_retries_are_bounded(self):
+        giga = StubLLM(fail={'кусок 2': 5})
+        with self.assertRaises(LLMUnavailable):
+            services.summarise_chunks(self.chunks, giga)
+        self.assertEqual(giga.fail['кусок 2'], 3)
+
+    @override_settings(DOC_REVIEW_MAX_DEPTH=2, DOC_REVIEW_CHUNK_TOKENS=200)
+    def test_tree_reduce_stops_at_max_depth(self):
+        # «резюме» не короче исходника: без предела рекурсия не закончилась бы
+        giga = StubLLM(echo=True)
+        text = '\n'.join(self.chunks * 4)
+        stats = {'chunks': 0, 'cached': 0}
+        services.compress_text(text, giga, stats=stats)
+        first_level = len(chunk_text(text))
+        second_level = len(chunk_text('\n'.join(chunk_text(text))))
+        self.assertEqual(stats['chunks'], first_level + second_level)
+
+    @override_settings(DOC_REVIEW_LLM_CONCURRENCY=1)
+    def test_sequential_without_concurrency(self):
+        giga = StubLLM(delay=0.01)
+        services.summarise_chunks(self.chunks, giga)
+        self.assertEqual((giga.calls, giga.max_active), (len(self.chunks), 1))
+
+
+class NLPRegistryTests(TestCase):
+    """Загрузка реестра при старте или по первому запросу и /health/."""
+
+    def setUp(self):
+        # пустой реестр на время теста; загруженный процессом вернётся после
+        for patcher in (
+            mock.patch.object(nlp, '_resources', None),
+            mock.patch.dict(nlp._stats, {'ready': False, 'load_ms': None}),
+            mock.patch.object(nlp, '_load', wraps=nlp._load),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.config = apps.get_app_config('neurocheck')
+
+    def health(self):
+        return APIClient().get('/api/doc-review/health/')
+
+    @override_settings(NEUROCHECK_NLP_PRELOAD=True)
+    def test_preload_loads_at_startup(self):
+        self.config.ready()
+        self.assertTrue(nlp.is_ready())
+        get_resources()
+        self.assertEqual(nlp._load.call_count, 1)
+        response = self.health()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['ready'])
+
+    @override_settings(NEUROCHECK_NLP_PRELOAD=False)
+    def test_lazy_loads_on_first_request(self):
+        self.config.ready()
+        self.assertFalse(nlp.is_ready())
+        # ленивый режим до первого запроса здоров
+        response = self.health()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['ready'], response.json()['preload']), (False, False))
+        self.assertIs(get_resources(), get_resources())
+        self.assertEqual(nlp._load.call_count, 1)
+
+    @override_settings(NEUROCHECK_NLP_PRELOAD=True)
+    def test_missing_corpus_does_not_break_startup(self):
+        corpus = mock.Mock()
+        corpus.words.side_effect = LookupError('Resource stopwords not found')
+        with mock.patch('nltk.data.find', side_effect=LookupError), \
+                mock.patch('nltk.download') as download, \
+                mock.patch('nltk.corpus.stopwords', corpus), \
+                mock.patch.object(ssl, '_create_default_https_context', ssl._create_default_https_context), \
+                self.assertLogs('neurocheck.apps', 'WARNING'):
+            self.config.ready()
+        download.assert_called_once_with('stopwords', quiet=True)
+        self.assertFalse(nlp.is_ready())
+        self.assertEqual(self.health().status_code, 503)
+        # корпус появился — ресурсы загрузятся при первом запросе
+        get_resources()
+        self.assertEqual(self.health().status_code, 200)
+
+
+def reference_rake_extract(text, stop_words):
+    """Прежний RAKE на словарях — эталон для rake_extract."""
+    sentences = re.split(r'[.!?]+\s*', text)
+    phrases = []
+    for sent in sentences:
+        tokens = re.findall(r'\b\w+\b', sent.lower())
+        phrase = []
+        for w in tokens:
+            if w in stop_words or w.isdigit() or len(w) == 1:
+                if phrase:
+                    phrases.append(phrase)
+                    phrase = []
+            else:
+                phrase.append(w)
+        if phrase:
+            phrases.append(phrase)
+
+    freq = defaultdict(int)
+    degree = defaultdict(int)
+    for phrase in phrases:
+        deg = len(phrase) - 1
+        for word in phrase:
+            freq[word] += 1
+            degree[word] += deg
+    for word in freq:
+        degree[word] += freq[word]
+    word_score = {w: degree[w] / freq[w] for w in freq}
+
+    phrase_score = defaultdict(float)
+    for phrase in phrases:
+        phrase_score[" ".join(phrase)] += sum(word_score[w] for w in phrase)
+    return phrase_score, freq
+
+
+class RakeEquivalenceTests(TestCase):
+    """rake_extract и top_k на NumPy дают то же, что прежняя реализация."""
+
+    texts = [
+        '',
+        'и в о. 2024! а',
+        'Кластеризация данных. Метод k-средних: кластеризация данных по расстоянию!',
+        'Шаг 1. Выбор числа кластеров k. Шаг 2. Расчёт центроидов; шаг 3 — '
+        'перерасчёт центроидов и расстояний... Итог: центроиды устойчивы?!',
+        # равные счета: порядок должен решаться первым появлением
+        'альфа бета. гамма дельта. бета альфа. дельта гамма.',
+        'Ёлка её ей, рисунок 5 — ёлка! Ёлка и ель, ель и ёлка.',
+    ]
+
+    def setUp(self):
+        self.stop_words = get_resources().stop_words
+
+    def assert_same(self, text):
+        expected_phrases, expected_freq = reference_rake_extract(text, self.stop_words)
+        phrases, freq = rake_extract(text, self.stop_words)
+        self.assertEqual(list(phrases), list(expected_phrases))
+        for phrase, score in expected_phrases.items():
+            self.assertAlmostEqual(phrases[phrase], score, places=9)
+        self.assertEqual(list(freq.items()), list(expected_freq.items()))
+
+        for k in (1, 3, 10, len(expected_freq) + 1):
+            self.assertEqual(top_k(freq, k), Counter(expected_freq).most_common(k))
+        if expected_phrases:
+            best = max(expected_phrases.items(), key=lambda x: x[1])
+            self.assertEqual(top_k(phrases, 1)[0][0], best[0])
+        else:
+            self.assertEqual(top_k(phrases, 1), [])
+
+    def test_fixed_texts(self):
+        for text in self.texts:
+            with self.subTest(text=text[:30]):
+                self.assert_same(text)
+
+    def test_lab_document(self):
+        text = load_docx_text(LAB_DOCX)
+        self.assert_same(text)
+        self.assert_same(text * 5)
+
+    def test_lemma_cache_size_from_settings(self):
+        self.assertEqual(lemma_cache.maxsize, settings.NEUROCHECK_LEMMA_CACHE_SIZE)
+        cache = LemmaCache(maxsize=2)
+        for word in ('кластеры', 'центроиды', 'расстояния'):
+            cache.put(word, word[:-1])
+        self.assertEqual([w for w, _ in cache.items()], ['центроиды', 'расстояния'])
+
+
+class LemmaCacheTests(SimpleTestCase):
+
+    words = ['кластеры', 'кластеров', 'центроиды', 'кластеры', 'расстояния', 'центроиды']
+
+    def setUp(self):
+        # общий кэш процесса не трогаем
+        self.cache = LemmaCache()
+        patcher = mock.patch.object(extract_keywords, 'lemma_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = LemmaCache(maxsize=2)
+        cache.put('кластеры', 'кластер')
+        cache.put('центроиды', 'центроид')
+        self.assertEqual(cache.get('кластеры'), 'кластер')
+        cache.put('расстояния', 'расстояние')
+        self.assertIsNone(cache.get('центроиды'))
+        self.assertEqual(cache.items(), [('кластеры', 'кластер'), ('расстояния', 'расстояние')])
+
+    def test_lemmatize_many_matches_lemmatize(self):
+        morph = get_resources().morph
+        expected = [morph.parse(w)[0].normal_form for w in self.words]
+        with mock.patch.object(morph, 'parse', wraps=morph.parse) as parse:
+            self.assertEqual(extract_keywords.lemmatize_many(self.words), expected)
+        self.assertEqual(parse.call_count, len(set(self.words)))
+        self.assertEqual([extract_keywords.lemmatize(w) for w in self.words], expected)
+
+    def test_lemma_dict_round_trip(self):
+        path = os.path.join(self.dir, 'lemmas.json')
+        self.cache.update({'кластеры': 'кластер', 'центроиды': 'центроид'})
+        extract_keywords.save_lemma_dict(path)
+        self.assertEqual(os.listdir(self.dir), ['lemmas.json'])
+
+        warm = LemmaCache()
+        with mock.patch.object(extract_keywords, 'lemma_cache', warm):
+            extract_keywords.load_lemma_dict(path)
+            with mock.patch.object(get_resources().morph, 'parse') as parse:
+                self.assertEqual(extract_keywords.lemmatize('кластеры'), 'кластер')
+            parse.assert_not_called()
+        self.assertEqual(dict(warm.items()), dict(self.cache.items()))
+
+    def test_missing_or_broken_dict_is_ignored(self):
+        broken = os.path.join(self.dir, 'broken.json')
+        with open(broken, 'w', encoding='utf-8') as f:
+            f.write('{"кластеры": ')
+        for path in (os.path.join(self.dir, 'missing.json'), broken):
+            extract_keywords.load_lemma_dict(path)
+        self.assertEqual(len(self.cache), 0)
+
+
+class FakeGigaChatHandler(BaseHTTPRequestHandler):
+    """OAuth и chat/completions GigaChat по HTTP; счётчики — в server.stats."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.stats['connections'] += 1
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, code, data):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        server = self.server
+        if self.path.endswith('/oauth'):
+            with server.lock:
+                server.stats['oauth'] += 1
+                token = f"token-{server.stats['oauth']}"
+                server.tokens[token] = time.time() + server.ttl
+            return self.send_json(200, {'access_token': token, 'expires_at': int(server.tokens[token] * 1000)})
+        token = (self.headers.get('Authorization') or '').removeprefix('Bearer ')
+        with server.lock:
+            if server.tokens.get(token, 0) < time.time():
+                server.stats['expired'] += 1
+                expired = True
+            else:
+                server.stats['chat'] += 1
+                expired = False
+        if expired:
+            return self.send_json(401, {'status': 401, 'message': 'Token has expired'})
+        prompt = json.loads(raw)['messages'][-1]['content']
+        self.send_json(200, {
+            'choices': [{'message': {'role': 'assistant', 'content': prompt[:20]}, 'index': 0, 'finish_reason': 'stop'}],
+            'created': int(time.time()), 'model': 'GigaChat', 'object': 'chat.completion',
+            'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+        })
+
+
+class SharedClientTests(TestCase):
+    """Общий клиент GigaChat против локального HTTP-сервера с API GigaChat."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGigaChatHandler)
+        cls.server.lock = threading.Lock()
+        thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        thread.start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def setUp(self):
+        self.server.stats = {'oauth': 0, 'chat': 0, 'expired': 0, 'connections': 0}
+        self.server.tokens = {}
+        self.server.ttl = 30 * 60
+        caches['llm-guard'].clear()
+        url = f'http://127.0.0.1:{self.server.server_port}'
+        override = override_settings(
+            DOC_REVIEW_LLM_BACKEND='gigachat', DOC_REVIEW_LLM_RATE=0,
+            GIGACHAT_CREDENTIALS='dGVzdDp0ZXN0', GIGACHAT_VERIFY_SSL=False,
+            GIGACHAT_BASE_URL=f'{url}/api/v1', GIGACHAT_AUTH_URL=f'{url}/api/v2/oauth',
+            GIGACHAT_TOKEN_REFRESH_MARGIN=60,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        llm.reset_client()
+        self.addCleanup(llm.reset_client)
+
+    def ask(self, prompt):
+        with llm.get_llm() as giga:
+            return llm.chat_text(giga, prompt)
+
+    def test_one_token_and_pool_for_many_requests(self):
+        created = llm.stats()['clients_created']
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            answers = list(pool.map(self.ask, [f'вопрос {i}' for i in range(40)]))
+        self.assertEqual(answers, [f'вопрос {i}' for i in range(40)])
+        self.assertEqual(llm.stats()['clients_created'], created + 1)
+        self.assertEqual(self.server.stats['oauth'], 1)
+        self.assertEqual(self.server.stats['chat'], 40)
+        # keep-alive: соединений не больше, чем потоков, плюс одно на OAuth
+        self.assertLessEqual(self.server.stats['connections'], 5)
+
+    def test_token_refreshed_before_expiry(self):
+        self.ask('первый')
+        client = llm.get_shared_client()
+        # до истечения меньше GIGACHAT_TOKEN_REFRESH_MARGIN: пора обновлять
+        client.expires_at = time.time() + 30
+        self.ask('второй')
+        self.assertEqual(self.server.stats['oauth'], 2)
+        self.assertEqual(self.server.stats['expired'], 0)
+        self.assertGreater(client.expires_at, time.time() + 60)
+
+
+class VerdictLLM:
+    """
+    На вопрос true/false отвечает verdict, на остальное — «Оценка».
+    Запоминает промпты и максимум одновременных запросов; с barrier
+    каждый запрос ждёт, пока не придут остальные.
+    """
+
+    def __init__(self, verdict, barrier=None):
+        self.verdict = verdict
+        self.barrier = barrier
+        self.prompts = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def chat(self, prompt):
+        with self.lock:
+            self.prompts.append(prompt)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if self.barrier is not None:
+                self.barrier.wait()
+            content = self.verdict if 'ответь одним словом true' in prompt else 'Оценка'
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class ParseVerdictTests(TestCase):
+
+    def test_answers(self):
+        cases = {
+            'true': True, 'True.': True, '**true**': True, 'Да, соответствует': True,
+            'false': False, 'FALSE': False, 'Не соответствует': False, 'Нет.': False,
+            'Работа не только соответствует теме, но и раскрывает её': True,
+            'Да, но не полностью': True, 'Не уверен, нет': False,
+            '': False, 'затрудняюсь ответить': False,
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertIs(services.parse_verdict(text), expected)
+
+
+@override_settings(DOC_REVIEW_LLM_BACKOFF=0, DOC_REVIEW_LLM_RATE=0)
+class EvaluateTests(ReviewTestMixin, TestCase):
+
+    def test_requests_run_concurrently(self):
+        # оба запроса должны встретиться у барьера, иначе он сломается по таймауту
+        giga = VerdictLLM('True.', barrier=threading.Barrier(2, timeout=5))
+        self.assertEqual(services.evaluate(giga, 'Кластеризация', 'резюме работы'), ('Оценка', True))
+        self.assertEqual((len(giga.prompts), giga.max_active), (2, 2))
+
+    @override_settings(DOC_REVIEW_LLM_CONCURRENCY=1)
+    def test_sequential_without_concurrency(self):
+        giga = VerdictLLM('false')
+        self.assertEqual(services.evaluate(giga, 'Кластеризация', 'резюме работы'), ('Оценка', False))
+        self.assertEqual((len(giga.prompts), giga.max_active), (2, 1))
+
+    @override_settings(DOC_REVIEW_SKIP_EVAL_OFF_TOPIC=True)
+    def test_off_topic_skips_evaluation(self):
+        giga = VerdictLLM('Не соответствует')
+        evaluation, passed = services.evaluate(giga, 'Кластеризация', 'резюме работы')
+        self.assertEqual(evaluation, services.OFF_TOPIC_EVALUATION.format(topic='Кластеризация'))
+        self.assertFalse(passed)
+        self.assertEqual(len(giga.prompts), 1)
+
+        giga = VerdictLLM('true')
+        self.assertEqual(services.evaluate(giga, 'Кластеризация', 'резюме работы'), ('Оценка', True))
+        self.assertEqual(len(giga.prompts), 2)
+
+
+@override_settings(DOC_REVIEW_LLM_BACKOFF=0, DOC_REVIEW_LLM_RATE=0)
+class NonTransientErrorTests(ReviewTestMixin, TestCase):
+
+    def test_unexpected_error_becomes_llm_error(self):
+        for exc in (KeyError('choices'), ResponseError('https://stub/chat', 400, b'bad', {})):
+            with self.subTest(exc=type(exc).__name__):
+                calls = []
+
+                def fn():
+                    calls.append(1)
+                    raise exc
+
+                with self.assertRaises(LLMError) as ctx:
+                    resilience.call(fn, retries=2, backoff=0)
+                self.assertIs(ctx.exception.__cause__, exc)
+                self.assertEqual(len(calls), 1)
+        # не транзиентные сбои не открывают автомат
+        self.assertEqual(resilience.get_breaker().retry_after(), 0)
+
+    def test_review_answers_502(self):
+        user = CustomUser.objects.create(username='student', role='student')
+        client = APIClient()
+        client.force_authenticate(user)
+        with mock.patch('neurocheck.llm.FakeLLM.chat', side_effect=ValueError('bad payload')):
+            response = client.post('/api/doc-review/', {'file': lab_docx_upload(), 'topic': 'Кластеризация'})
+        self.assertEqual(response.status_code, 502)
+
+
+@override_settings(
+    DOC_REVIEW_GUARD_CACHE='llm-guard', DOC_REVIEW_BREAKER_FAILURES=2, DOC_REVIEW_BREAKER_COOLDOWN=30,
+    DOC_REVIEW_LLM_BACKOFF=0, DOC_REVIEW_LLM_RATE=0,
+)
+class ResilienceTests(ReviewTestMixin, TestCase):
+    """Автомат, ограничитель частоты и admission на замороженных часах."""
+
+    def setUp(self):
+        super().setUp()
+        self.now = 1_000_000.0
+        patcher = mock.patch.object(resilience.time, 'time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = resilience.get_breaker()
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create(username='student', role='student'))
+
+    def post(self, query=''):
+        return self.client.post(
+            f'/api/doc-review/{query}', {'file': lab_docx_upload(), 'topic': 'Кластеризация'}
+        )
+
+    def failing_call(self, attempts):
+        def fn():
+            attempts.append(1)
+            raise httpx.ConnectError('connection refused')
+        return resilience.call(fn, retries=2, backoff=0)
+
+    def open_breaker(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+
+    def test_breaker_counts_exhausted_calls(self):
+        attempts = []
+        with self.assertRaises(LLMUnavailable):
+            self.failing_call(attempts)
+        # три попытки одного запроса — один сбой, автомат ещё закрыт
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(caches['llm-guard'].get(self.breaker.key)['failures'], 1)
+        self.assertEqual(self.breaker.retry_after(), 0)
+
+        with self.assertRaises(LLMUnavailable) as ctx:
+            self.failing_call(attempts)
+        self.assertEqual((len(attempts), ctx.exception.wait), (6, 30))
+
+        # открытый автомат отвечает сразу, не трогая GigaChat
+        self.now += 10
+        with self.assertRaises(LLMUnavailable) as ctx:
+            self.failing_call(attempts)
+        self.assertEqual((len(attempts), ctx.exception.wait), (6, 20))
+        response = self.post()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '20')
+
+    def test_single_probe_closes_breaker(self):
+        self.open_breaker()
+        self.now += 31
+        calls = []
+
+        def probe():
+            # пока идёт пробный запрос, остальные получают 503
+            with self.assertRaises(LLMUnavailable):
+                resilience.call(calls.append, retries=0, backoff=0)
+            return 'ok'
+
+        self.assertEqual(resilience.call(probe, retries=0, backoff=0), 'ok')
+        self.assertEqual(calls, [])
+        self.assertIsNone(caches['llm-guard'].get(self.breaker.key))
+        self.assertEqual(resilience.call(lambda: 'ok', retries=0, backoff=0), 'ok')
+
+    def test_failed_probe_reopens(self):
+        self.open_breaker()
+        self.now += 31
+        with self.assertRaises(LLMUnavailable):
+            resilience.call(mock.Mock(side_effect=httpx.ReadTimeout('timeout')), retries=0, backoff=0)
+        self.assertEqual(self.breaker.retry_after(), 30)
+
+    @override_settings(DOC_REVIEW_LLM_RATE=1, DOC_REVIEW_LLM_BURST=2, DOC_REVIEW_LLM_RATE_WAIT=1.5)
+    def test_bucket_rejects_long_wait(self):
+        bucket = resilience.get_bucket()
+        with mock.patch.object(resilience.time, 'sleep') as sleep:
+            bucket.take()
+            bucket.take()
+            sleep.assert_not_called()
+            # запас кончился: следующий ждёт секунду, после него — уже две
+            bucket.take()
+            sleep.assert_called_once_with(1.0)
+            with self.assertRaises(LLMBusy) as ctx:
+                bucket.take()
+            self.assertEqual((ctx.exception.status_code, ctx.exception.wait), (429, 2))
+            # за две секунды ведро набрало два токена — ждать не нужно
+            self.now += 2
+            bucket.take()
+        self.assertEqual(sleep.call_count, 1)
+
+    @override_settings(DOC_REVIEW_MAX_INFLIGHT=2)
+    def test_admission_limits_inflight(self):
+        with mock.patch.object(resilience, '_inflight', None):
+            with resilience.admission(), resilience.admission():
+                with self.assertRaises(LLMBusy):
+                    with resilience.admission():
+                        pass
+                response = self.post()
+                self.assertEqual(response.status_code, 429)
+                self.assertEqual(response['Retry-After'], str(resilience.BUSY_RETRY_AFTER))
+            self.assertEqual(self.post().status_code, 200)
+
+    def test_async_rejected_while_open(self):
+        self.open_breaker()
+        response = self.post('?async=1')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertFalse(DocumentReviewJob.objects.exists())
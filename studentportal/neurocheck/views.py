@@ -1,20 +1,19 @@
-import tempfile
-import json
-import nltk
-from nltk.data import find
 from django.conf import settings
+from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
-from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.exceptions import ValidationError
 
-from gigachat import GigaChat
-from gigachat.api.utils import ResponseError
-from docx import Document as DocxDocument
+from core.uploads import CompletedUpload
 
-from .serializers import DocumentSerializer
-from .extract_keywords import get_keywords_and_topic
+from . import cache as review_cache, llm, nlp, resilience
+from .jobs import enqueue_review, expire_stale_jobs
+from .models import DocumentReviewJob
+from .serializers import DocumentSerializer, DocumentReviewJobSerializer
+from .services import get_cached_result, review_document
 
 
 class DocumentReviewViewSet(viewsets.GenericViewSet,
@@ -28,39 +27,26 @@ class DocumentReviewViewSet(viewsets.GenericViewSet,
       - извлечённую тему,
       - общее количество слов в документе,
       - boolean passed.
+
+    Вместо file можно передать upload=<id> докачиваемой загрузки (/api/uploads/).
+
+    POST /api/doc-review/?async=1
+    То же самое, но в фоне: сразу возвращает id задания (202),
+    результат забирается через GET /api/doc-review/<id>/.
+
+    Когда GigaChat недоступен или проверок слишком много, отвечает
+    503/429 с Retry-After (см. resilience.py).
     """
-    parser_classes = [MultiPartParser, FormParser]
+    parser_classes = [MultiPartParser, FormParser, JSONParser]
     permission_classes = [IsAuthenticated]
     serializer_class = DocumentSerializer
-    
-    MAX_CHARS = 3000  # порог для части текста при сжатии
-
-    def extract_full_text(self, path):
-        doc = DocxDocument(path)
-        full_text = []
-        for para in doc.paragraphs:
-            text = para.text.strip()
-            if text:
-                full_text.append(text)
-        return "\n".join(full_text)
-
-    def compress_text(self, text, giga):
-        if len(text) <= self.MAX_CHARS:
-            return text
-        chunks = [text[i:i + self.MAX_CHARS] for i in range(0, len(text), self.MAX_CHARS)]
-        compressed = []
-        for idx, chunk in enumerate(chunks, start=1):
-            prompt = (
-                f"Сожми следующий текст до краткого содержательного резюме, "
-                f"сообщи только основные идеи (часть {idx}/{len(chunks)}):\n" + chunk
-            )
-            try:
-                resp = giga.chat(prompt)
-            except ResponseError as e:
-                raise APIException(f"Ошибка при сжатии текста: {e}")
-            compressed.append(resp.choices[0].message.content)
-        combined = "\n".join(compressed)
-        return self.compress_text(combined, giga)
+
+    def get_queryset(self):
+        return DocumentReviewJob.objects.filter(user=self.request.user)
+
+    def is_async(self, request):
+        value = request.query_params.get('async', request.data.get('async', ''))
+        return str(value).lower() in ('1', 'true', 'yes')
 
     def create(self, request, *args, **kwargs):
         # 1) валидация файла
@@ -73,80 +59,57 @@ class DocumentReviewViewSet(viewsets.GenericViewSet,
         if not topic:
             raise ValidationError({'topic': 'Это поле обязательно.'})
 
-        # 3) сохранить файл во временный .docx
-        with tempfile.NamedTemporaryFile(suffix=".docx", delete=False) as tmp:
-            for chunk in uploaded_file.chunks():
-                tmp.write(chunk)
-            tmp_path = tmp.name
-
-        # 4) извлечение полного текста и подсчёт слов
-        full_text = self.extract_full_text(tmp_path)
-        word_count = len(full_text.split())
-       # проверка: минимум 100 слов
-        if word_count < 100:
-            raise ValidationError({
-                'file': f'Документ должен содержать минимум 100 слов, найдено {word_count}.'
-            })
-
-        # 5) проверяем и скачиваем стоп-слова NLTK, если нужно
         try:
-            find('corpora/stopwords')
-        except LookupError:
-            # на macOS/других может потребоваться отключить проверку SSL для загрузки
-            import ssl
-            try:
-                _create_unverified_https_context = ssl._create_unverified_context
-            except AttributeError:
-                pass
-            else:
-                ssl._create_default_https_context = _create_unverified_https_context
-            nltk.download('stopwords', quiet=True)
-
-        # 6) извлечение ключевых слов и темы из документа) извлечение ключевых слов и темы из документа
-        top_words, extracted_topic = get_keywords_and_topic(tmp_path, top_n=5)
-        keywords_data = [{"keyword": w, "count": c} for w, c in top_words]
-
-        # 7) подготовка к запросам GigaChat
-        creds = getattr(settings, 'GIGACHAT_CREDENTIALS', None)
-        if not creds:
-            raise APIException("Не задана настройка GIGACHAT_CREDENTIALS")
-        verify_ssl = getattr(settings, 'GIGACHAT_VERIFY_SSL', True)
+            return self.review(request, uploaded_file, topic)
+        finally:
+            # докачанный файл (upload=<id>) нужен только на время запроса:
+            # в фоне его уже перенесли в задание, иначе .part удаляется
+            if isinstance(uploaded_file, CompletedUpload):
+                uploaded_file.release()
+
+    def review(self, request, uploaded_file, topic):
+        # 3) фоновый режим: ставим задание в очередь и сразу отвечаем
+        if self.is_async(request):
+            resilience.raise_if_open()
+            job = enqueue_review(request.user, uploaded_file, topic)
+            return Response(
+                DocumentReviewJobSerializer(job).data,
+                status=status.HTTP_202_ACCEPTED
+            )
 
-        try:
-            with GigaChat(credentials=creds, verify_ssl_certs=verify_ssl) as giga:
-                compressed = self.compress_text(full_text, giga)
-
-                # первый запрос: развёрнутая оценка
-                eval_prompt = (
-                    f"Оцени работу студента по теме '{topic}'.\n"
-                    f"Вот резюме его текста:\n{compressed}\n"
-                    "Дай подробный развёрнутый ответ без JSON. Дай более человечный ответ"
-                )
-                resp_eval = giga.chat(eval_prompt)
-                raw_evaluation = resp_eval.choices[0].message.content.strip()
-
-                # второй запрос: проверка соответствия теме
-                pass_prompt = (
-                    f"Тема документа: '{topic}'.\n"
-                    f"Краткое содержание документа:\n{compressed}\n"
-                    "На основе указанной темы и содержания, "
-                    "ответь одним словом true, если содержание соответствует теме, иначе false."
-                )
-                resp_pass = giga.chat(pass_prompt)
-                raw_pass = resp_pass.choices[0].message.content.strip().lower()
-        except ResponseError as e:
-            raise APIException(f"Ошибка GigaChat API: {e}")
-        except Exception as e:
-            raise APIException(f"Ошибка при обращении к GigaChat: {e}")
-
-        # 8) парсинг passed
-        passed = True if raw_pass == 'true' else False
-
-        # 9) возвращаем фронтенду
-        return Response({
-            "evaluation": raw_evaluation,
-            "keywords": keywords_data,
-            "extracted_topic": extracted_topic,
-            "word_count": word_count,
-            "passed": passed,
-        }, status=status.HTTP_200_OK)
+        # 4) тот же файл с той же темой уже проверяли — отдаём из кэша
+        digest = review_cache.file_digest(uploaded_file)
+        cached = get_cached_result(digest, topic)
+        if cached is not None:
+            return Response(cached, status=status.HTTP_200_OK)
+
+        # 5) проверка документа (читается прямо из загрузки) и ответ фронтенду
+        with resilience.admission():
+            result = review_document(uploaded_file, topic, digest=digest)
+        return Response(result, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def health(self, request):
+        """
+        GET /api/doc-review/health/ — готовность NLP-ресурсов, время
+        холодного/тёплого NLP-этапа запроса (мс) и счётчики клиента GigaChat.
+        """
+        data = nlp.stats()
+        data['preload'] = getattr(settings, 'NEUROCHECK_NLP_PRELOAD', True)
+        data['llm'] = llm.stats()
+        data['llm']['circuit_open_for'] = round(resilience.get_breaker().retry_after())
+        # в ленивом режиме ресурсы появляются только после первого запроса
+        ok = data['ready'] or not data['preload']
+        return Response(
+            data,
+            status=status.HTTP_200_OK if ok else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    def retrieve(self, request, pk=None):
+        """
+        GET /api/doc-review/<id>/ — статус фонового задания и результат, когда готов.
+        Задание, потерянное при перезапуске процесса, отдаётся как failed.
+        """
+        expire_stale_jobs(self.get_queryset().filter(pk=pk))
+        job = get_object_or_404(self.get_queryset(), pk=pk)
+        return Response(DocumentReviewJobSerializer(job).data)
@@ -54,9 +54,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 	'rest_framework',
 	'rest_framework_simplejwt',
 	'core',
+	'neurocheck',
 	'corsheaders',
     'django_filters',
 
@@ -74,6 +76,9 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
+    # keyset-курсор: ?cursor=..., ?page_size= (до 500); ответ {next, previous, results}
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 50,
     
 }
 
@@ -180,6 +185,95 @@ env = environ.Env(
 environ.Env.read_env(os.path.join(BASE_DIR, '.env'))
 GIGACHAT_CREDENTIALS = env.str("GIGACHAT_CREDENTIALS")  # или просто строка JWT
 GIGACHAT_VERIFY_SSL = False  # или False, если нужно отключить в dev
+# адреса API и OAuth (None — по умолчанию из библиотеки gigachat), например для локальной заглушки
+GIGACHAT_BASE_URL = env.str("GIGACHAT_BASE_URL", default=None)
+GIGACHAT_AUTH_URL = env.str("GIGACHAT_AUTH_URL", default=None)
+GIGACHAT_TOKEN_REFRESH_MARGIN = 60  # секунд до истечения, когда токен обновляется заранее
+GIGACHAT_TIMEOUT = env.float("GIGACHAT_TIMEOUT", default=30.0)  # секунд на запрос к API
+
+# Фоновые проверки документов: 'thread' — пул потоков в процессе, 'sync' — сразу в запросе
+DOC_REVIEW_JOB_BACKEND = env.str("DOC_REVIEW_JOB_BACKEND", default="thread")
+DOC_REVIEW_JOB_WORKERS = env.int("DOC_REVIEW_JOB_WORKERS", default=2)
+# секунд без изменений, после которых задание в pending/running считается потерянным
+DOC_REVIEW_JOB_TIMEOUT = env.int("DOC_REVIEW_JOB_TIMEOUT", default=15 * 60)
+
+# LLM для проверки документов: 'gigachat' или 'fake' (заглушка без сети)
+DOC_REVIEW_LLM_BACKEND = env.str("DOC_REVIEW_LLM_BACKEND", default="gigachat")
+DOC_REVIEW_FAKE_LLM_DELAY = env.float("DOC_REVIEW_FAKE_LLM_DELAY", default=0.0)
+DOC_REVIEW_LLM_CONCURRENCY = env.int("DOC_REVIEW_LLM_CONCURRENCY", default=4)  # одновременных запросов при сжатии
+DOC_REVIEW_LLM_RETRIES = 2  # повторов запроса при сбое сети или ответе 429/5xx
+DOC_REVIEW_LLM_BACKOFF = 0.5  # секунд: пауза случайная в [0, backoff * 2^попытка]
+DOC_REVIEW_LLM_BACKOFF_MAX = 8  # секунд, потолок паузы (и Retry-After от GigaChat)
+DOC_REVIEW_MAX_DEPTH = 3  # уровней свёртки резюме
+DOC_REVIEW_CHUNK_TOKENS = env.int("DOC_REVIEW_CHUNK_TOKENS", default=2000)  # токенов в куске при сжатии
+# путь к функции text -> int для подсчёта токенов; None — локальная оценка (neurocheck.chunking.approx_tokens)
+DOC_REVIEW_TOKENIZER = env.str("DOC_REVIEW_TOKENIZER", default=None)
+# True — сначала спрашивать true/false и не заказывать развёрнутую оценку работ не по теме
+DOC_REVIEW_SKIP_EVAL_OFF_TOPIC = env.bool("DOC_REVIEW_SKIP_EVAL_OFF_TOPIC", default=False)
+
+# Защита от деградации GigaChat (neurocheck/resilience.py)
+DOC_REVIEW_LLM_RATE = env.float("DOC_REVIEW_LLM_RATE", default=5.0)  # запросов в секунду, 0 — без ограничения
+DOC_REVIEW_LLM_BURST = 10  # запросов сверх средней частоты подряд
+DOC_REVIEW_LLM_RATE_WAIT = 5  # секунд ожидания токена, дальше — 429
+DOC_REVIEW_BREAKER_FAILURES = 5  # запросов подряд, не прошедших и с повторами; дальше 503 сразу (0 — выключено)
+DOC_REVIEW_BREAKER_COOLDOWN = 30  # секунд до пробного запроса
+DOC_REVIEW_MAX_INFLIGHT = env.int("DOC_REVIEW_MAX_INFLIGHT", default=8)  # синхронных проверок на процесс, сверх — 429
+DOC_REVIEW_MAX_PENDING_JOBS = 100  # незавершённых фоновых заданий, сверх — 429
+DOC_REVIEW_GUARD_CACHE = 'llm-guard'
+
+# Кэш проверок по SHA-256 файла: LocMemCache вытесняет по LRU после MAX_ENTRIES,
+# для нескольких воркеров gunicorn можно указать общий бэкенд (Redis/Memcached)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'doc-review': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'doc-review',
+        'TIMEOUT': 60 * 60 * 24 * 7,
+        'OPTIONS': {'MAX_ENTRIES': 500},
+    },
+    # состояние автомата и ограничителя частоты GigaChat; для нескольких воркеров —
+    # общий бэкенд, иначе лимиты действуют на каждый процесс отдельно
+    'llm-guard': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'llm-guard',
+    },
+    # тикеты очереди записи в окна (core.admission): должны пережить пик открытия окна
+    'admission': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'admission',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+DOC_REVIEW_CACHE = 'doc-review'
+
+# JSON-словарь лемм для прогрева кэша pymorphy2 между перезапусками (None — не сохранять)
+NEUROCHECK_LEMMA_DICT = env.str("NEUROCHECK_LEMMA_DICT", default=None)
+# сколько лемм держит LRU-кэш процесса (самые старые вытесняются)
+NEUROCHECK_LEMMA_CACHE_SIZE = env.int("NEUROCHECK_LEMMA_CACHE_SIZE", default=100_000)
+# True — грузить стоп-слова и MorphAnalyzer при старте, False — при первом запросе
+NEUROCHECK_NLP_PRELOAD = env.bool("NEUROCHECK_NLP_PRELOAD", default=True)
+
+# Очередь допуска для signup в окна: заявки обрабатывает один писатель пачками
+APPOINTMENT_ADMISSION_QUEUE = env.bool("APPOINTMENT_ADMISSION_QUEUE", default=False)
+APPOINTMENT_ADMISSION_BACKEND = 'core.admission.LocalAdmissionQueue'
+APPOINTMENT_ADMISSION_CACHE = 'admission'
+APPOINTMENT_ADMISSION_BATCH = 200  # заявок в одном bulk_create
+APPOINTMENT_ADMISSION_BATCH_WAIT = 0.05  # секунд на добор пачки
+APPOINTMENT_ADMISSION_WAIT = 2.0  # сколько signup ждёт результата, потом отдаёт тикет
+
+# Повторяющиеся окна разворачиваются не дальше этого числа дней (поиск слота, список)
+SCHEDULE_RECURRENCE_HORIZON_DAYS = 180
+
+# Загрузки: временные файлы и куски докачки пишутся внутри MEDIA_ROOT, чтобы
+# сохранение в FileField было переносом (os.rename), а не копированием
+UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, '.uploads')
+FILE_UPLOAD_TEMP_DIR = UPLOAD_TEMP_DIR
+FILE_UPLOAD_HANDLERS = ['core.uploads.StreamingUploadHandler']
+UPLOAD_MAX_SIZE = env.int("UPLOAD_MAX_SIZE", default=256 * 1024 * 1024)  # байт на файл
+UPLOAD_CHUNK_MAX_SIZE = 16 * 1024 * 1024  # байт в одном PUT докачки
+UPLOAD_SESSION_TTL_HOURS = 24  # незавершённые загрузки старше удаляет cleanup_uploads
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
@@ -27,7 +27,8 @@ from rest_framework_simplejwt.views import (
 )
 from core.views import (
     UserViewSet, CourseViewSet, TaskViewSet,
-    TeacherScheduleViewSet, SubmissionViewSet, DefenseQueueViewSet, TopicViewSet, AppointmentViewSet
+    TeacherScheduleViewSet, SubmissionViewSet, DefenseQueueViewSet, TopicViewSet, AppointmentViewSet,
+    ScheduleRecurrenceViewSet, UploadSessionViewSet
 )
 from neurocheck.views import DocumentReviewViewSet
 router = DefaultRouter()
@@ -35,11 +36,13 @@ router.register(r'users', UserViewSet)
 router.register(r'courses', CourseViewSet)
 router.register(r'tasks', TaskViewSet)
 router.register(r'teacher-schedules', TeacherScheduleViewSet, basename='teacher-schedule')
+router.register(r'schedule-recurrences', ScheduleRecurrenceViewSet, basename='schedule-recurrence')
 router.register(r'submissions', SubmissionViewSet, basename='submission')
 router.register(r'defense', DefenseQueueViewSet)
 router.register(r'topics', TopicViewSet)
 router.register(r'doc-review', DocumentReviewViewSet, basename='doc-review')
 router.register(r'appointments', AppointmentViewSet)
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
 
 urlpatterns = [
     path('admin/', admin.site.urls),